@@ -0,0 +1,254 @@
+"""
+최종 답변 캐시 (표현만 다른 같은 질문의 Multi-Agent 답변 재사용)
+- 질문 유형(q_type)별로 정규화한 질문을 키로 최종 답변 저장
+  1) 정규화: NFKC + casefold, 구두점 제거, 'hs코드'/'분류'/'알려주세요' 같은 질문 상투어와 끝의 조사 제거
+     ('프로틴 파우더 HS코드', '프로틴파우더 hs 코드는?' → 단어 ('프로틴', '파우더'), 이어 붙이면 '프로틴파우더')
+  2) 정확 일치: 공백 없이 이어 붙인 정규화 질문이 같음 (띄어쓰기 차이)
+  3) 유사 일치: 단어(글자 조각이 아닌 단어 전체) 집합의 Jaccard 유사도가 HS_ANSWER_CACHE_SIMILARITY 이상
+     (기본 1 = 어순만 다른 질문, '여성용 바지' ≠ '남성용 바지', '나이프' ≠ '포크')
+     - 선택: HS_ANSWER_CACHE_RETRIEVAL_SIMILARITY > 0 이면 로컬 검색 결과(상위 사례 ID / 후보 HS 코드 집합)의
+       Jaccard 유사도가 그 이상이고 단어가 하나 이상 같을 때도 일치
+  - 질문의 숫자는 단위(%, kg 등)와 함께 나온 순서대로 정확히 같아야 함
+    ('3923, 3924 중' ≠ '3923, 3926 중', '면 60% 폴리 40%' ≠ '면 40% 폴리 60%')
+- 지시어('그것', '이거', '위', '해당', '이 제품' 등)가 들어 있는 질문은 캐시를 쓰지 않음 (조회/저장 모두)
+  - 가리키는 물품이 세션마다 다를 수 있음 (처리 함수 프롬프트에는 채팅 기록이 들어가지 않으므로 기록 유무는 보지 않음)
+- 항목마다 지식 데이터 버전을 기록하고, 조회 시 현재 버전과 다르면 버림 (분류사례/해설서/관세율표가 바뀌면 무효화)
+- LRU (최대 항목 수) + 유효 시간(TTL), 스레드 안전
+- 적중/미스는 Prometheus 카운터(hs_answer_cache_total{q_type,result})와 현재 span의 answer_cache 속성으로 기록
+
+환경 변수:
+    HS_ANSWER_CACHE_SIZE                 : 최대 항목 수 (기본 256, 0이면 캐시 사용 안 함)
+    HS_ANSWER_CACHE_TTL                  : 항목 유효 시간 (초, 기본 604800 = 7일, 0이면 무제한)
+    HS_ANSWER_CACHE_SIMILARITY           : 유사 일치 단어 집합 유사도 하한 (기본 1 = 같은 단어 집합만)
+    HS_ANSWER_CACHE_RETRIEVAL_SIMILARITY : 검색 결과 유사도 하한 (기본 0 = 사용 안 함)
+    HS_ADMIN_TOKEN                       : 관리 기능(캐시 조회/삭제) 토큰 - 설정하지 않으면 관리 기능 사용 안 함
+                                           (API 서버 X-Admin-Token 헤더, Streamlit ?admin=<토큰>)
+"""
+import hmac
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from term_dictionary import strip_particle
+from tracing import TRACER, set_attributes
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_SIMILARITY = 1.0
+
+# 질문 표현에만 쓰이는 단어 (물품과 무관하므로 키에서 제외)
+QUESTION_WORDS = {
+    'hs', 'hsk', '코드', '품목', '품목분류', '분류', '세번', '번호', '관세', '세율', '알려줘', '알려주세요', '알려',
+    '주세요', '해주세요', '해줘', '뭐야', '뭔가요', '무엇', '무엇인가요', '어떻게', '어디', '되나요', '되는지', '인가요',
+    '입니까', '문의', '질문', '궁금합니다', '찾아줘', '검색', '사례', '분류사례', 'code', 'classification',
+}
+# 질문 표현 어미 (단어 끝에서 제거, 남는 부분이 2자 이상일 때만)
+QUESTION_SUFFIXES = ('해주세요', '해줘요', '해줘', '인가요', '입니까', '되나요', '하나요', '은요', '는요', '인지', '나요')
+# 지시어 (이전 대화의 물품을 가리키는 질문 - 세션마다 뜻이 달라 캐시하지 않음)
+DEMONSTRATIVES = {'그것', '이것', '저것', '그거', '이거', '저거', '그게', '이게', '저게', '위', '위의', '앞', '앞의',
+                  '해당', '이', '그', '저', '방금', '아까', '상기'}
+# 숫자(단위 포함) / 영문 / 그 밖의 글자(한글 등) 단위로 분리 ('hs코드는' → 'hs', '코드는', '면60%' → '면', '60%')
+TOKEN = re.compile(r'\d+(?:\.\d+)?(?:%|퍼센트|kg|mm|cm|ml|g|m|개|매)?|[a-z]+|[^\W\d_a-z]+')
+
+
+def tokenize(query):
+    """질문 → 정규화한 토큰 목록 (질문 상투어/어미/조사 제거 전)"""
+    return TOKEN.findall(unicodedata.normalize('NFKC', query or '').casefold())
+
+
+def canonicalize(query):
+    """
+    질문 → (숫자 튜플, 단어 튜플)
+    - 숫자는 단위와 함께 나온 순서대로, 단어는 질문 상투어를 빼고 나온 순서대로
+    - 예: '프로틴파우더 hs 코드는?' → ((), ('프로틴파우더',)), '면 60% 폴리 40% 바지' → (('60%', '40%'), ('면', '폴리', '바지'))
+    """
+    numbers, words = [], []
+    for token in tokenize(query):
+        if token[0].isdigit():
+            numbers.append(token)
+            continue
+        for suffix in QUESTION_SUFFIXES:
+            if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+                token = token[:-len(suffix)]
+                break
+        token = strip_particle(token)
+        if token not in QUESTION_WORDS:
+            words.append(token)
+    return tuple(numbers), tuple(words)
+
+
+def context_dependent(query):
+    """
+    지시어로 다른 물품을 가리키는 질문인지 (캐시 사용 안 함)
+    Returns:
+        이유 ('demonstrative') 또는 None
+    """
+    for token in tokenize(query):
+        if token in DEMONSTRATIVES or strip_particle(token) in DEMONSTRATIVES:
+            return 'demonstrative'
+    return None
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+class AnswerCache:
+    """크기 제한 LRU 최종 답변 캐시 (Lock으로 보호)"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, similarity=DEFAULT_SIMILARITY,
+                 retrieval_similarity=0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.retrieval_similarity = retrieval_similarity
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (q_type, 숫자 튜플, 이어 붙인 정규화 질문) -> 항목
+        self.counts = {'hit_exact': 0, 'hit_similar': 0, 'miss': 0, 'bypass': 0, 'stale': 0, 'stored': 0, 'purged': 0}
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _expired(self, entry, version, now):
+        return entry['version'] != version or (self.ttl > 0 and now - entry['created_at'] > self.ttl)
+
+    def _record(self, q_type, result):
+        self.counts[result] += 1
+        TRACER.metrics.inc('hs_answer_cache_total', 1, q_type=q_type, result=result)
+
+    def bypass(self, q_type):
+        """캐시를 쓰지 않은 질문 기록 (지시어가 있는 질문)"""
+        with self.lock:
+            self._record(q_type, 'bypass')
+
+    def lookup(self, q_type, query, version, signature=None):
+        """
+        같은/비슷한 질문의 저장된 답변
+        Args:
+            version: 현재 지식 데이터 버전 (저장 시 버전과 다르면 버림)
+            signature: 로컬 검색 결과 집합 (유사 일치 선택 조건, 없으면 단어 유사도만 사용)
+        Returns:
+            {'query', 'answer', 'extra', 'created_at', 'hits', 'match', 'similarity'} 또는 None
+        """
+        if not self.enabled:
+            return None
+        numbers, words = canonicalize(query)
+        canonical, word_set = ''.join(words), set(words)
+        now = time.time()
+        with self.lock:
+            # 데이터 버전이 바뀌었거나 유효 시간이 지난 항목 제거
+            stale = [key for key, entry in self.entries.items() if key[0] == q_type and self._expired(entry, version, now)]
+            for key in stale:
+                del self.entries[key]
+                self._record(q_type, 'stale')
+
+            key = (q_type, numbers, canonical)
+            match, similarity = ('exact', 1.0) if key in self.entries else (None, 0.0)
+            if match is None and canonical:
+                for candidate_key, entry in self.entries.items():
+                    if candidate_key[:2] != (q_type, numbers):
+                        continue
+                    score = jaccard(word_set, entry['words'])
+                    if score < self.similarity:
+                        # 단어가 다르면 검색 결과가 거의 같고 같은 단어가 있을 때만 일치로 봄
+                        if not (self.retrieval_similarity > 0 and signature and entry['signature']
+                                and word_set & entry['words']):
+                            continue
+                        score = jaccard(set(signature), entry['signature'])
+                        if score < self.retrieval_similarity:
+                            continue
+                    if score > similarity:
+                        key, match, similarity = candidate_key, 'similar', score
+
+            if match is None:
+                self._record(q_type, 'miss')
+                set_attributes(answer_cache='miss')
+                return None
+            entry = self.entries[key]
+            self.entries.move_to_end(key)
+            entry['hits'] += 1
+            self._record(q_type, f'hit_{match}')
+            set_attributes(answer_cache=f'hit_{match}', answer_cache_similarity=round(similarity, 3))
+            return {'query': entry['query'], 'answer': entry['answer'], 'extra': entry['extra'],
+                    'created_at': entry['created_at'], 'hits': entry['hits'], 'match': match,
+                    'similarity': similarity}
+
+    def store(self, q_type, query, version, answer, signature=None, extra=None):
+        """답변 저장 (같은 정규화 질문이 있으면 교체, 상한을 넘으면 가장 오래 사용하지 않은 항목 제거)"""
+        if not self.enabled:
+            return
+        numbers, words = canonicalize(query)
+        canonical = ''.join(words)
+        entry = {'query': query, 'canonical': canonical, 'words': set(words), 'version': version,
+                 'signature': set(signature) if signature else None, 'answer': answer, 'extra': extra,
+                 'created_at': time.time(), 'hits': 0}
+        with self.lock:
+            key = (q_type, numbers, canonical)
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.counts['stored'] += 1
+
+    def purge(self, q_type=None, query=None):
+        """
+        항목 삭제 (조건이 없으면 전체)
+        Args:
+            q_type: 이 질문 유형의 항목만
+            query: 이 질문과 정규화 결과가 같은 항목만
+        Returns:
+            삭제한 항목 수
+        """
+        if query:
+            numbers, words = canonicalize(query)
+            target = (numbers, ''.join(words))
+        else:
+            target = None
+        with self.lock:
+            keys = [key for key in self.entries
+                    if (q_type is None or key[0] == q_type) and (target is None or key[1:] == target)]
+            for key in keys:
+                del self.entries[key]
+            self.counts['purged'] += len(keys)
+        return len(keys)
+
+    def list_entries(self):
+        """항목 목록 (관리 화면/엔드포인트용, 답변 본문 제외)"""
+        with self.lock:
+            return [{'q_type': key[0], 'query': entry['query'], 'canonical': entry['canonical'],
+                     'version': entry['version'], 'created_at': entry['created_at'], 'hits': entry['hits']}
+                    for key, entry in self.entries.items()]
+
+    def stats(self):
+        """항목 수, 적중/미스 횟수, 적중률"""
+        with self.lock:
+            hits = self.counts['hit_exact'] + self.counts['hit_similar']
+            total = hits + self.counts['miss']
+            return {'entries': len(self.entries), 'max_entries': self.max_entries, **self.counts,
+                    'hit_rate': hits / total if total else 0.0}
+
+
+def admin_token_ok(token):
+    """관리 기능 토큰 확인 (HS_ADMIN_TOKEN이 없으면 항상 거부)"""
+    expected = os.getenv('HS_ADMIN_TOKEN', '')
+    return bool(expected) and hmac.compare_digest(str(token or ''), expected)
+
+
+def cache_notice(cached):
+    """캐시된 답변 앞에 붙일 안내 문구"""
+    created = time.strftime('%Y-%m-%d %H:%M', time.localtime(cached['created_at']))
+    similar = f", 유사도 {cached['similarity']:.2f}" if cached['match'] == 'similar' else ""
+    return (f"> 💾 이전 질문 \"{cached['query']}\"({created}{similar})에 대한 답변을 재사용했습니다. "
+            f"지식 데이터가 바뀌면 새로 분석합니다.\n\n")
+
+
+ANSWER_CACHE = AnswerCache(
+    int(os.getenv('HS_ANSWER_CACHE_SIZE', DEFAULT_MAX_ENTRIES)),
+    float(os.getenv('HS_ANSWER_CACHE_TTL', DEFAULT_TTL)),
+    float(os.getenv('HS_ANSWER_CACHE_SIMILARITY', DEFAULT_SIMILARITY)),
+    float(os.getenv('HS_ANSWER_CACHE_RETRIEVAL_SIMILARITY', 0)),
+)
@@ -0,0 +1,337 @@
+"""
+HS 품목분류 챗봇 HTTP JSON API 서버 (Streamlit 없이 단독 실행)
+- 질문 유형별 엔드포인트: POST /api/<q_type>  {"query": "..."}
+- HSDataManager는 서버 시작 시 한 번만 로드하여 모든 요청이 공유
+- 고정 크기 워커 풀 + 대기열 상한 초과 시 429 응답 (Retry-After)
+- ?stream=1 또는 Accept: text/event-stream 요청 시 진행 이벤트(progress.py)를 SSE로 전송
+- GET /metrics: q_type/stage별 지연 시간 히스토그램 등 Prometheus 텍스트 형식 지표 (tracing.py)
+- 최종 답변 캐시(answer_cache.py) 적중 시 응답의 'cached'에 재사용한 질문/일치 방식 표시
+- 관리 (X-Admin-Token 헤더 = HS_ADMIN_TOKEN): GET /admin/answer-cache (항목 목록),
+  POST /admin/answer-cache/purge {"q_type": ..., "query": ...} (조건 없으면 전체 삭제),
+  GET /admin/llm-usage (일별 LLM 호출/토큰/지연 시간 합계, model_router.py)
+- 응답의 'usage'에 요청별 LLM 사용량 (호출 수, prompt/output 토큰, LLM 호출 시간 합계)
+
+실행 예:
+    python api_server.py --port 8000 --workers 4 --queue-size 16
+    python api_server.py --fake-llm 1.0      # 가짜 LLM(지연 1초)으로 실행
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from progress import QueueSink, NullSink
+from tracing import span, set_attributes, render_metrics
+from retrieval_cache import RETRIEVAL_CACHE
+from answer_cache import ANSWER_CACHE, admin_token_ok
+from model_router import USAGE_LEDGER, request_usage
+
+# 엔드포인트로 노출하는 질문 유형 ('auto'는 LLM 자동분류 후 처리)
+API_QTYPES = ["auto", "web_search", "hs_classification", "overseas_hs", "hs_manual", "hs_manual_codes", "hs_manual_raw"]
+
+
+def answer_question(q_type, user_input, hs_manager, sink):
+    """질문 유형에 맞는 처리 함수를 호출하여 (실제 q_type, 답변, 답변 캐시 적중 정보 또는 None) 반환"""
+    from utils import QueryPrefetch, classify_question, describe_prefetch
+
+    if q_type != "auto":
+        return dispatch_question(q_type, user_input, hs_manager, sink)
+
+    # 분류 결과와 무관한 로컬 검색은 분류 LLM 호출과 동시에 미리 실행
+    prefetch = QueryPrefetch(user_input, hs_manager).start()
+    try:
+        sink.log_actual("AI", "Starting LLM question classification...", f"prefetching {len(prefetch.futures)} retrievals")
+        with span('classify'):
+            q_type = classify_question(user_input)
+        sink.log_actual("SUCCESS", "LLM classification completed", q_type)
+        set_attributes(q_type=q_type)
+        return dispatch_question(q_type, user_input, hs_manager, sink, prefetch)
+    finally:
+        sink.log_actual("INFO", "Speculative prefetch", describe_prefetch(prefetch.finish()))
+
+
+def dispatch_question(q_type, user_input, hs_manager, sink, prefetch=None):
+    """질문 유형별 처리 함수 호출 (prefetch: AI자동분류 중 미리 검색한 결과, Multi-Agent/해설서 분석은 답변 캐시 사용)"""
+    from utils import (prefetched, answer_with_cache, extract_hs_codes, clean_text, get_hs_explanations,
+                       handle_web_search, handle_hs_classification_cases, handle_overseas_hs,
+                       handle_hs_manual_with_parallel_search, handle_hs_manual_with_user_codes)
+
+    handlers = {
+        "hs_classification": lambda: handle_hs_classification_cases(user_input, "", hs_manager, sink, prefetch),
+        "overseas_hs": lambda: handle_overseas_hs(user_input, "", hs_manager, sink),
+        "hs_manual": lambda: handle_hs_manual_with_parallel_search(user_input, "", hs_manager, sink, prefetch),
+        "hs_manual_codes": lambda: handle_hs_manual_with_user_codes(user_input, "", hs_manager, sink),
+    }
+    sink.log_actual("INFO", "Question type mapped", q_type)
+    if q_type == "web_search":
+        return q_type, handle_web_search(user_input, "", hs_manager), None
+    if q_type in handlers:
+        answer, cached = answer_with_cache(q_type, user_input, hs_manager, handlers[q_type], sink)
+        if cached is not None:
+            cached = {key: cached[key] for key in ('query', 'match', 'similarity', 'created_at')}
+        return q_type, answer, cached
+    if q_type == "hs_manual_raw":
+        hs_codes = prefetched(prefetch, 'hs_codes', lambda: extract_hs_codes(user_input))
+        if not hs_codes:
+            return q_type, "HS 코드를 찾을 수 없습니다. 4자리 HS 코드를 입력해주세요.", None
+        sink.log_actual("SUCCESS", f"Found {len(hs_codes)} HS codes", ", ".join(hs_codes))
+        with span('retrieval.raw_manual', codes=len(hs_codes)):
+            return q_type, clean_text(get_hs_explanations(hs_codes, user_input)), None
+    raise ValueError(f"지원하지 않는 질문 유형: {q_type}")
+
+
+class HSApiApp:
+    """
+    요청 처리 상태를 보관하는 애플리케이션 객체
+    Args:
+        hs_manager: 공유 HSDataManager 인스턴스
+        workers: 동시에 실행할 파이프라인 수
+        queue_size: 워커가 모두 사용 중일 때 대기시킬 최대 요청 수
+        timeout: 요청당 최대 대기 시간 (초, 초과 시 504)
+    """
+
+    def __init__(self, hs_manager, workers=4, queue_size=16, timeout=300):
+        self.hs_manager = hs_manager
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hs-worker")
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.stats_lock = threading.Lock()
+        self.stats = {'accepted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'in_flight': 0}
+
+    def _count(self, key, delta=1):
+        with self.stats_lock:
+            self.stats[key] += delta
+
+    def submit(self, q_type, user_input, events=None):
+        """
+        작업을 워커 풀에 제출
+        Returns:
+            Future 또는 None (대기열이 가득 찬 경우)
+        """
+        if not self.slots.acquire(blocking=False):
+            self._count('rejected')
+            return None
+        self._count('accepted')
+        self._count('in_flight')
+        sink = QueueSink(events) if events is not None else NullSink()
+
+        def job():
+            try:
+                with span('request', q_type=q_type, source='api') as request_span:
+                    actual_type, answer, cached = answer_question(q_type, user_input, self.hs_manager, sink)
+                    usage = request_usage()
+                self._count('completed')
+                return {'q_type': actual_type, 'answer': answer, 'cached': cached, 'usage': usage,
+                        'elapsed': round(request_span.duration, 3)}
+            except Exception:
+                self._count('failed')
+                raise
+            finally:
+                self._count('in_flight', -1)
+                self.slots.release()
+
+        return self.executor.submit(job)
+
+    def health(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        return {'status': 'ok', 'workers': self.workers, 'queue_size': self.queue_size,
+                'corpus_version': self.hs_manager.corpus_version, 'retrieval_cache': RETRIEVAL_CACHE.stats(),
+                'answer_cache': ANSWER_CACHE.stats(), **stats}
+
+
+class HSRequestHandler(BaseHTTPRequestHandler):
+    """API 요청 핸들러 (self.server.app 으로 HSApiApp 접근)"""
+
+    server_version = "HSChatbotAPI/1.0"
+
+    def log_message(self, format, *args):
+        # 요청마다 stderr 로그를 남기지 않음 (부하 테스트 시 병목 방지)
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def _admin_allowed(self):
+        """관리 엔드포인트 토큰 확인 (실패 시 403 응답)"""
+        if admin_token_ok(self.headers.get('X-Admin-Token')):
+            return True
+        self._send_json(403, {'error': 'admin token required (HS_ADMIN_TOKEN)'})
+        return False
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/healthz':
+            self._send_json(200, self.server.app.health())
+        elif path == '/admin/answer-cache':
+            if self._admin_allowed():
+                self._send_json(200, {'stats': ANSWER_CACHE.stats(), 'entries': ANSWER_CACHE.list_entries()})
+        elif path == '/admin/llm-usage':
+            if self._admin_allowed():
+                self._send_json(200, {'today': USAGE_LEDGER.today(), 'days': USAGE_LEDGER.summary()})
+        elif path == '/metrics':
+            body = render_metrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        if parsed.path == '/admin/answer-cache/purge':
+            self._purge_answer_cache()
+            return
+        parts = parsed.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] != 'api' or parts[1] not in API_QTYPES:
+            self._send_json(404, {'error': 'not found', 'endpoints': [f"/api/{q}" for q in API_QTYPES]})
+            return
+        q_type = parts[1]
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            user_input = str(payload.get('query', '')).strip()
+        except (ValueError, AttributeError):
+            self._send_json(400, {'error': 'invalid JSON body'})
+            return
+        if not user_input:
+            self._send_json(400, {'error': "'query' is required"})
+            return
+
+        stream = parse_qs(parsed.query).get('stream', ['0'])[0] == '1' or \
+            'text/event-stream' in self.headers.get('Accept', '')
+        app = self.server.app
+        events = queue.Queue() if stream else None
+        future = app.submit(q_type, user_input, events)
+        if future is None:
+            self._send_json(429, {'error': 'server busy, retry later'}, {'Retry-After': '1'})
+            return
+
+        if stream:
+            self._stream_response(future, events)
+            return
+
+        try:
+            result = future.result(timeout=app.timeout)
+            self._send_json(200, result)
+        except FutureTimeoutError:
+            self._send_json(504, {'error': 'timeout'})
+        except Exception as e:
+            self._send_json(500, {'error': f"{type(e).__name__}: {e}"})
+
+    def _purge_answer_cache(self):
+        """답변 캐시 삭제 (본문의 q_type/query 조건, 없으면 전체)"""
+        if not self._admin_allowed():
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            purged = ANSWER_CACHE.purge(payload.get('q_type') or None, payload.get('query') or None)
+        except (ValueError, AttributeError):
+            self._send_json(400, {'error': 'invalid JSON body'})
+            return
+        self._send_json(200, {'purged': purged, 'stats': ANSWER_CACHE.stats()})
+
+    def _stream_response(self, future, events):
+        """진행 이벤트(log, stage_start, group_result 등)를 SSE로 전송하고 마지막에 result/error 이벤트 전송"""
+        future.add_done_callback(lambda f: events.put(None))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        deadline = time.time() + self.server.app.timeout
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=max(0.1, deadline - time.time()))
+                except queue.Empty:
+                    self._send_event('error', {'error': 'timeout'})
+                    return
+                if event is None:
+                    # 작업 완료 신호
+                    break
+                self._send_event(event.kind, event.to_dict())
+
+            try:
+                self._send_event('result', future.result())
+            except Exception as e:
+                self._send_event('error', {'error': f"{type(e).__name__}: {e}"})
+        except (BrokenPipeError, ConnectionResetError):
+            # 클라이언트가 연결을 끊은 경우 (작업은 워커에서 계속 완료됨)
+            pass
+
+
+def create_server(host='127.0.0.1', port=8000, hs_manager=None, workers=4, queue_size=16, timeout=300):
+    """HSDataManager를 한 번 만들고 HTTP 서버 객체 생성 (데이터는 첫 사용 또는 warm_up() 때 로드)"""
+    if hs_manager is None:
+        from utils import HSDataManager
+        hs_manager = HSDataManager()
+
+    server = ThreadingHTTPServer((host, port), HSRequestHandler)
+    server.daemon_threads = True
+    server.app = HSApiApp(hs_manager, workers, queue_size, timeout)
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HS 품목분류 챗봇 API 서버")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=4, help="동시에 실행할 파이프라인 수")
+    parser.add_argument('--queue-size', type=int, default=16, help="대기열 상한 (초과 시 429)")
+    parser.add_argument('--timeout', type=float, default=300, help="요청당 최대 대기 시간 (초)")
+    parser.add_argument('--fake-llm', type=float, metavar='LATENCY',
+                        help="실제 Gemini 대신 지정한 지연(초)의 가짜 LLM 사용 (부하 테스트용)")
+    parser.add_argument('--reload-interval', type=float, default=60,
+                        help="knowledge 폴더 분류사례 파일 변경 확인 주기 (초, 0이면 끔)")
+    parser.add_argument('--lazy', action='store_true',
+                        help="시작 시 데이터를 미리 로드하지 않고 첫 요청에서 필요한 것만 로드")
+    parser.add_argument('--no-answer-cache', action='store_true',
+                        help="최종 답변 캐시 사용 안 함 (부하 테스트에서 같은 질문을 반복할 때)")
+    args = parser.parse_args(argv)
+
+    if args.no_answer_cache:
+        ANSWER_CACHE.max_entries = 0
+    import utils
+    if args.fake_llm is not None:
+        from fake_llm import FakeLLMClient
+        utils.client = FakeLLMClient(latency=args.fake_llm, sigma=0.2)
+
+    server = create_server(args.host, args.port, None, args.workers, args.queue_size, args.timeout)
+    server.app.hs_manager.start_watcher(args.reload_interval)
+    if not args.lazy:
+        timings = utils.warm_up(server.app.hs_manager)
+        print("Warm-up: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    print(f"Serving on http://{args.host}:{args.port} (workers={args.workers}, queue={args.queue_size})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.app.executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+HS 품목분류 일괄 처리 CLI
+- CSV/JSONL 파일의 물품 설명을 읽어 선택한 파이프라인으로 일괄 분류
+- 결과는 JSONL로 스트리밍 저장, 체크포인트로 중단 후 이어서 실행 가능
+- 종료 시 처리량(rows/min)과 단계별 소요 시간 리포트 (검색, LLM 호출 등 tracing span 기준)
+
+사용 예:
+    python batch_classify.py input.csv -o results.jsonl --pipeline hs_classification --concurrency 2 --rate 30
+    python batch_classify.py input.csv -o results.jsonl --trace traces.jsonl   # span을 JSONL로 함께 기록
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from progress import ListSink, LogEvent
+from tracing import TRACER, span, configure_tracing
+
+# 일괄 처리에서 사용할 수 있는 파이프라인 (q_type 이름과 동일)
+PIPELINES = ["hs_classification", "overseas_hs", "hs_manual"]
+
+# 입력 컬럼 자동 탐지 후보 (앞에서부터 우선)
+TEXT_COLUMN_CANDIDATES = ["description", "product_name", "query", "question", "품명", "물품설명"]
+
+
+class RateLimiter:
+    """분당 최대 시작 건수를 제한하는 간단한 스레드 안전 레이트 리미터"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute and per_minute > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class StageTimer:
+    """단계별 소요 시간을 누적하여 리포트용 통계를 생성"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.samples[stage].append(seconds)
+
+    def summary(self):
+        """단계별 건수/평균/p50/p95/최대 (초)"""
+        result = {}
+        with self.lock:
+            for stage, values in self.samples.items():
+                ordered = sorted(values)
+                n = len(ordered)
+                result[stage] = {
+                    'count': n,
+                    'mean': sum(ordered) / n,
+                    'p50': ordered[int(0.50 * (n - 1))],
+                    'p95': ordered[int(0.95 * (n - 1))],
+                    'max': ordered[-1],
+                }
+        return result
+
+
+class StageTimerExporter:
+    """종료된 span의 소요 시간을 span 이름별로 StageTimer에 누적하는 trace exporter"""
+
+    def __init__(self, timer):
+        self.timer = timer
+
+    def export(self, spans):
+        for s in spans:
+            if s.name != 'request':
+                self.timer.add(s.name, s.duration)
+
+
+def load_rows(path, text_column=None, id_column=None):
+    """
+    CSV 또는 JSONL 파일에서 (row_id, text) 목록을 읽는 함수
+    - text_column 미지정 시 TEXT_COLUMN_CANDIDATES 순서로 자동 탐지
+    - id_column 미지정 시 'id' 컬럼, 없으면 1부터 시작하는 행 번호를 ID로 사용
+    """
+    records = []
+    if path.lower().endswith(('.jsonl', '.ndjson')):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    value = json.loads(line)
+                    records.append(value if isinstance(value, dict) else {'query': str(value)})
+    else:
+        # 엑셀에서 저장한 CSV(BOM 포함)도 처리
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            records = list(csv.DictReader(f))
+
+    if not records:
+        return []
+
+    if text_column is None:
+        text_column = next((c for c in TEXT_COLUMN_CANDIDATES if c in records[0]), None)
+        if text_column is None:
+            raise ValueError(f"입력 컬럼을 찾을 수 없습니다. --column 으로 지정하세요 (컬럼: {list(records[0].keys())})")
+
+    if id_column is None and 'id' in records[0]:
+        id_column = 'id'
+
+    rows = []
+    for idx, record in enumerate(records, 1):
+        text = str(record.get(text_column) or '').strip()
+        if not text:
+            continue
+        row_id = str(record.get(id_column)) if id_column else str(idx)
+        rows.append((row_id, text))
+    return rows
+
+
+def load_checkpoint(path):
+    """체크포인트 파일에서 완료된 row_id 집합 로드"""
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r', encoding='utf-8') as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def run_pipeline(pipeline, text, hs_manager, sink):
+    """선택한 파이프라인으로 한 건 처리 (Streamlit UI 없이 호출)"""
+    from utils import handle_hs_classification_cases, handle_overseas_hs, handle_hs_manual_with_parallel_search
+
+    if pipeline == "hs_classification":
+        return handle_hs_classification_cases(text, "", hs_manager, sink)
+    if pipeline == "overseas_hs":
+        return handle_overseas_hs(text, "", hs_manager, sink)
+    if pipeline == "hs_manual":
+        return handle_hs_manual_with_parallel_search(text, "", hs_manager, sink)
+    raise ValueError(f"지원하지 않는 파이프라인: {pipeline}")
+
+
+def run_batch(input_path, output_path, pipeline, concurrency=1, rate_per_minute=0,
+              text_column=None, id_column=None, checkpoint_path=None, limit=None, trace_path=None):
+    """
+    일괄 분류 실행
+    - 이미 체크포인트에 기록된 행은 건너뜀 (실패한 행은 기록하지 않으므로 재실행 시 다시 시도)
+    - 결과는 완료 순서대로 output_path에 JSONL로 추가 저장
+    - trace_path 지정 시 행별 span을 JSONL로 기록
+    Returns:
+        리포트 딕셔너리 (처리 건수, 처리량, 단계별 소요 시간)
+    """
+    from utils import HSDataManager, warm_up
+
+    checkpoint_path = checkpoint_path or output_path + '.ckpt'
+    rows = load_rows(input_path, text_column, id_column)
+    done_ids = load_checkpoint(checkpoint_path)
+    pending = [(row_id, text) for row_id, text in rows if row_id not in done_ids]
+    skipped = len(rows) - len(pending)
+    if limit:
+        pending = pending[:limit]
+
+    print(f"▶ 입력 {len(rows)}건, 완료된 {skipped}건 건너뜀, 처리 대상 {len(pending)}건")
+
+    timer = StageTimer()
+    stage_exporter = TRACER.add_exporter(StageTimerExporter(timer))
+    trace_exporter = configure_tracing(trace_path) if trace_path else None
+    with span('load'):
+        hs_manager = HSDataManager()
+        warm_up(hs_manager)
+
+    limiter = RateLimiter(rate_per_minute)
+    write_lock = threading.Lock()
+    counts = {'ok': 0, 'error': 0}
+
+    def process_row(row_id, text):
+        limiter.acquire()
+        sink = ListSink()
+        record = {'id': row_id, 'input': text, 'pipeline': pipeline}
+        try:
+            with span('request', q_type=pipeline, row_id=row_id, source='batch') as request_span:
+                record['answer'] = run_pipeline(pipeline, text, hs_manager, sink)
+            record['status'] = 'ok'
+        except Exception as e:
+            record['status'] = 'error'
+            record['error'] = f"{type(e).__name__}: {e}"
+        elapsed = request_span.duration
+        timer.add('pipeline', elapsed)
+        record['elapsed'] = round(elapsed, 3)
+        record['finished_at'] = datetime.now().isoformat(timespec='seconds')
+        logs = [event.to_dict() for event in sink.events if isinstance(event, LogEvent)]
+        if logs:
+            record['logs'] = logs
+
+        # 결과 저장 후 체크포인트 기록 (결과 유실 없이 이어서 실행 가능하도록 순서 유지)
+        with span('write'), write_lock:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if record['status'] == 'ok':
+                ckpt.write(row_id + "\n")
+                ckpt.flush()
+            counts[record['status']] += 1
+            finished = counts['ok'] + counts['error']
+        print(f"  [{finished}/{len(pending)}] {row_id} {record['status']} ({elapsed:.1f}s)")
+
+    run_start = time.time()
+    with open(output_path, 'a', encoding='utf-8') as out, open(checkpoint_path, 'a', encoding='utf-8') as ckpt:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            futures = [executor.submit(process_row, row_id, text) for row_id, text in pending]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except KeyboardInterrupt:
+                # 대기 중인 작업 취소 (진행 중인 행은 완료 후 기록됨)
+                for future in futures:
+                    future.cancel()
+                print("⚠ 중단 요청: 진행 중인 행만 마무리합니다. 다시 실행하면 이어서 처리합니다.")
+                raise
+            finally:
+                TRACER.remove_exporter(stage_exporter)
+                if trace_exporter is not None:
+                    TRACER.remove_exporter(trace_exporter)
+                    trace_exporter.close()
+    wall_time = time.time() - run_start
+
+    processed = counts['ok'] + counts['error']
+    report = {
+        'pipeline': pipeline,
+        'total_rows': len(rows),
+        'skipped': skipped,
+        'ok': counts['ok'],
+        'error': counts['error'],
+        'wall_time': wall_time,
+        'rows_per_min': processed / wall_time * 60 if wall_time > 0 else 0.0,
+        'stages': timer.summary(),
+    }
+    return report
+
+
+def print_report(report):
+    """처리 결과 리포트 출력"""
+    print("\n=== 일괄 처리 리포트 ===")
+    print(f"파이프라인: {report['pipeline']}")
+    print(f"전체 {report['total_rows']}건 | 성공 {report['ok']} | 실패 {report['error']} | 건너뜀 {report['skipped']}")
+    print(f"소요 시간: {report['wall_time']:.1f}s | 처리량: {report['rows_per_min']:.2f} rows/min")
+    print(f"{'stage':<28}{'count':>7}{'mean':>9}{'p50':>9}{'p95':>9}{'max':>9}")
+    for stage, s in report['stages'].items():
+        print(f"{stage:<28}{s['count']:>7}{s['mean']:>9.2f}{s['p50']:>9.2f}{s['p95']:>9.2f}{s['max']:>9.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HS 품목분류 일괄 처리")
+    parser.add_argument('input', help="입력 파일 (.csv 또는 .jsonl)")
+    parser.add_argument('-o', '--output', required=True, help="결과 JSONL 파일 (이어쓰기)")
+    parser.add_argument('--pipeline', choices=PIPELINES, default="hs_classification",
+                        help="hs_classification(국내사례), overseas_hs(해외사례), hs_manual(해설서 병렬검색)")
+    parser.add_argument('--concurrency', type=int, default=1, help="동시에 처리할 행 수")
+    parser.add_argument('--rate', type=float, default=0, help="분당 최대 처리 시작 건수 (0이면 제한 없음)")
+    parser.add_argument('--column', help="물품 설명 컬럼명 (미지정 시 자동 탐지)")
+    parser.add_argument('--id-column', help="행 ID 컬럼명 (미지정 시 'id' 컬럼 또는 행 번호)")
+    parser.add_argument('--checkpoint', help="체크포인트 파일 (기본값: <output>.ckpt)")
+    parser.add_argument('--limit', type=int, help="이번 실행에서 처리할 최대 건수")
+    parser.add_argument('--trace', help="span을 기록할 JSONL 파일")
+    args = parser.parse_args(argv)
+
+    report = run_batch(args.input, args.output, args.pipeline, args.concurrency, args.rate,
+                       args.column, args.id_column, args.checkpoint, args.limit, args.trace)
+    print_report(report)
+    return 0 if report['error'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
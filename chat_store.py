@@ -0,0 +1,204 @@
+"""
+채팅 기록 저장소 (SQLite)
+- 세션(브라우저 대화)별 메시지와 답변별 분석 과정(그룹 분석 결과, 후보 목록)을 로컬 SQLite 파일에 저장
+- 화면/세션 메모리에는 최근 메시지 몇 개(ChatWindow)만 두고, 그 이전 메시지는 필요할 때 페이지 단위로 조회
+- 스레드별로 연결을 따로 열어 사용 (Streamlit 세션은 서로 다른 스레드에서 실행), WAL 모드로 읽기/쓰기 동시 사용
+
+환경 변수:
+    HS_CHAT_DB          : 저장 파일 경로 (기본 chat_history.db)
+    HS_CHAT_WINDOW      : 세션 메모리에 유지할 최근 메시지 수 (기본 20)
+    HS_CHAT_PAGE_SIZE   : 이전 대화 한 번에 불러올 메시지 수 (기본 10)
+
+대화 목록 확인:
+    python chat_store.py --db chat_history.db
+    python chat_store.py --db chat_history.db --session <세션 ID>
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+DEFAULT_CHAT_DB = 'chat_history.db'
+DEFAULT_WINDOW = 20
+DEFAULT_PAGE_SIZE = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    analysis_json TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+"""
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+class ChatStore:
+    """
+    세션별 채팅 메시지 저장/조회
+    - 메시지: {'id', 'role', 'content', 'analysis'(dict 또는 None), 'created_at'}
+    """
+
+    def __init__(self, path=DEFAULT_CHAT_DB):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _message(row):
+        message_id, role, content, analysis_json, created_at = row
+        return {'id': message_id, 'role': role, 'content': content,
+                'analysis': json.loads(analysis_json) if analysis_json else None, 'created_at': created_at}
+
+    def append(self, session_id, role, content, analysis=None):
+        """
+        메시지 저장
+        Returns:
+            저장된 메시지 딕셔너리 (id 포함)
+        """
+        created_at = time.time()
+        analysis_json = json.dumps(analysis, ensure_ascii=False) if analysis else None
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO messages (session_id, role, content, analysis_json, created_at) VALUES (?, ?, ?, ?, ?)',
+                (session_id, role, content, analysis_json, created_at))
+        return {'id': cursor.lastrowid, 'role': role, 'content': content, 'analysis': analysis,
+                'created_at': created_at}
+
+    def recent(self, session_id, limit=DEFAULT_WINDOW):
+        """최근 메시지 limit개 (오래된 것부터)"""
+        return self.page(session_id, None, limit)
+
+    def page(self, session_id, before_id=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        before_id 이전 메시지 limit개 (오래된 것부터, before_id가 None이면 최근 메시지)
+        """
+        sql = 'SELECT id, role, content, analysis_json, created_at FROM messages WHERE session_id = ?'
+        params = [session_id]
+        if before_id is not None:
+            sql += ' AND id < ?'
+            params.append(before_id)
+        sql += ' ORDER BY id DESC LIMIT ?'
+        params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [self._message(row) for row in reversed(rows)]
+
+    def count(self, session_id, before_id=None):
+        """세션 메시지 수 (before_id가 있으면 그 이전 메시지 수)"""
+        sql = 'SELECT COUNT(*) FROM messages WHERE session_id = ?'
+        params = [session_id]
+        if before_id is not None:
+            sql += ' AND id < ?'
+            params.append(before_id)
+        with self._connect() as conn:
+            return conn.execute(sql, params).fetchone()[0]
+
+    def sessions(self, limit=20):
+        """최근 세션 목록 [(세션 ID, 메시지 수, 마지막 시각), ...]"""
+        with self._connect() as conn:
+            return conn.execute('SELECT session_id, COUNT(*), MAX(created_at) FROM messages GROUP BY session_id '
+                                'ORDER BY MAX(created_at) DESC LIMIT ?', (limit,)).fetchall()
+
+
+class ChatWindow:
+    """
+    세션 메모리에 두는 최근 메시지 (최대 max_messages개, 나머지는 ChatStore에서 조회)
+    - append: 저장소에 쓰고 창에 추가 (가장 오래된 메시지는 창에서만 빠짐)
+    - older: 창 이전 메시지 pages 페이지 (화면에서 '이전 대화 불러오기'를 누른 만큼)
+    """
+
+    def __init__(self, store, session_id=None, max_messages=DEFAULT_WINDOW, page_size=DEFAULT_PAGE_SIZE):
+        self.store = store
+        self.session_id = session_id or new_session_id()
+        self.page_size = page_size
+        self.messages = deque(store.recent(self.session_id, max_messages), maxlen=max_messages)
+
+    def append(self, role, content, analysis=None):
+        message = self.store.append(self.session_id, role, content, analysis)
+        self.messages.append(message)
+        return message
+
+    def first_id(self):
+        return self.messages[0]['id'] if self.messages else None
+
+    def older_count(self):
+        """창에 없는 이전 메시지 수"""
+        first_id = self.first_id()
+        return self.store.count(self.session_id, first_id) if first_id is not None else 0
+
+    def older(self, pages):
+        """창 이전 메시지 pages * page_size개 (오래된 것부터)"""
+        first_id = self.first_id()
+        if pages <= 0 or first_id is None:
+            return []
+        return self.store.page(self.session_id, first_id, pages * self.page_size)
+
+    def transcript(self):
+        """창 안의 대화를 프롬프트용 텍스트로 ('사용자: ...', '품목분류 전문가: ...')"""
+        speakers = {'user': '사용자', 'assistant': '품목분류 전문가'}
+        return ''.join(f"\n{speakers.get(message['role'], message['role'])}: {message['content']}"
+                       + ("\n" if message['role'] == 'assistant' else "") for message in self.messages)
+
+
+_store_lock = threading.Lock()
+_store_instance = None
+
+
+def get_chat_store():
+    """프로세스 공용 ChatStore (HS_CHAT_DB)"""
+    global _store_instance
+    if _store_instance is None:
+        with _store_lock:
+            if _store_instance is None:
+                _store_instance = ChatStore(os.getenv('HS_CHAT_DB', DEFAULT_CHAT_DB))
+    return _store_instance
+
+
+def open_chat_window(session_id=None):
+    """세션 대화 창 (세션 ID가 없으면 새 대화, 창/페이지 크기는 HS_CHAT_WINDOW / HS_CHAT_PAGE_SIZE)"""
+    return ChatWindow(get_chat_store(), session_id, int(os.getenv('HS_CHAT_WINDOW', DEFAULT_WINDOW)),
+                      int(os.getenv('HS_CHAT_PAGE_SIZE', DEFAULT_PAGE_SIZE)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="채팅 기록 저장소 확인")
+    parser.add_argument('--db', default=os.getenv('HS_CHAT_DB', DEFAULT_CHAT_DB), help="채팅 기록 DB 경로")
+    parser.add_argument('--session', help="메시지를 출력할 세션 ID (없으면 최근 세션 목록)")
+    parser.add_argument('--limit', type=int, default=20, help="출력할 세션/메시지 수")
+    args = parser.parse_args(argv)
+
+    store = ChatStore(args.db)
+    if not args.session:
+        for session_id, count, last in store.sessions(args.limit):
+            print(f"{session_id}  {count:>5}개  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last))}")
+        return 0
+    for message in store.recent(args.session, args.limit):
+        analysis = f" [분석: {', '.join(message['analysis'])}]" if message['analysis'] else ""
+        print(f"#{message['id']} {message['role']}{analysis}: {message['content'][:120]}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+부하 테스트/벤치마크용 가짜 Gemini 클라이언트
+- google-genai 클라이언트와 같은 형태(client.models.generate_content)로 동작
+- 실제 API 호출 없이 설정한 지연 시간만큼 대기 후 고정 형식의 답변 반환
+- JSON 출력 설정(response_mime_type='application/json')이면 그룹 에이전트 구조화 답변 형식의 JSON 반환
+  (프롬프트의 첫 번째 사례 HS 코드를 후보로 제시)
+
+사용 예:
+    import utils
+    from fake_llm import FakeLLMClient
+    utils.client = FakeLLMClient(latency=1.0, sigma=0.3)
+    utils.client = FakeLLMClient(model_latency={'gemini-2.5-flash': 4.0, 'gemini-2.0-flash': 1.0}, sigma=0.3)
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+
+
+class FakeUsage:
+    """usage_metadata 대용 (토큰 수는 글자 수 기반 추정치)"""
+
+    def __init__(self, prompt_chars, output_chars):
+        self.prompt_token_count = max(1, prompt_chars // 2)
+        self.candidates_token_count = max(1, output_chars // 2)
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, text, prompt_chars):
+        self.text = text
+        self.usage_metadata = FakeUsage(prompt_chars, len(text))
+
+
+class _FakeModels:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def generate_content(self, model, contents, config=None):
+        return self.owner.generate(model, contents, config)
+
+
+class FakeLLMClient:
+    """
+    지연 시간 분포를 설정할 수 있는 가짜 LLM 클라이언트
+    Args:
+        latency: 호출당 지연 시간 중앙값 (초)
+        sigma: 로그정규 분포의 표준편차 (0이면 고정 지연)
+        error_rate: 예외를 발생시킬 확률 (0~1)
+        seed: 난수 시드 (재현 가능한 지연 시간)
+        model_latency: 모델별 지연 시간 중앙값 {모델명: 초} (없는 모델은 latency 사용)
+        model_error_rate: 모델별 예외 확률 {모델명: 0~1} (없는 모델은 error_rate 사용, 대체 모델 재시도 확인용)
+    """
+
+    def __init__(self, latency=0.5, sigma=0.0, error_rate=0.0, seed=None, model_latency=None, model_error_rate=None):
+        self.latency = latency
+        self.model_latency = dict(model_latency or {})
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.model_error_rate = dict(model_error_rate or {})
+        self.models = _FakeModels(self)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def sample_latency(self, model=None):
+        median = self.model_latency.get(model, self.latency)
+        with self._lock:
+            self.calls += 1
+            if self.sigma:
+                return median * math.exp(self._random.gauss(0.0, self.sigma))
+            return median
+
+    def generate(self, model, contents, config=None):
+        prompt = str(contents)
+        delay = self.sample_latency(model)
+        time.sleep(delay)
+        error_rate = self.model_error_rate.get(model, self.error_rate)
+        if error_rate and self._random.random() < error_rate:
+            raise RuntimeError("fake LLM error")
+        if getattr(config, 'response_mime_type', None) == 'application/json':
+            return FakeResponse(self.json_answer_for(prompt), len(prompt))
+        return FakeResponse(self.answer_for(prompt), len(prompt))
+
+    def json_answer_for(self, prompt):
+        """그룹 에이전트 구조화 답변 (프롬프트의 첫 사례 HS 코드와 reference_id 인용)"""
+        match = re.search(r'"reference_id": "([^"]+)".*?"hs_code": "([^"]+)"', prompt)
+        if not match:
+            return json.dumps({'candidates': [], 'summary': "관련 사례 없음 (가짜 LLM 응답)"}, ensure_ascii=False)
+        return json.dumps({'candidates': [{'hs_code': match.group(2), 'confidence': 0.8,
+                                           'reference_ids': [match.group(1)], 'reason': "가장 유사한 사례와 같은 물품 (가짜 LLM 응답)"}],
+                           'summary': f"입력 길이: {len(prompt)} chars (가짜 LLM 응답)"}, ensure_ascii=False)
+
+    def answer_for(self, prompt):
+        """프롬프트 종류에 맞는 고정 답변 생성"""
+        # 질문 유형 분류 프롬프트 (classify_question)
+        if prompt.rstrip().endswith("답변:"):
+            return "hs_classification"
+        return (
+            "**추천 HS코드**: 3923.10\n\n"
+            "플라스틱 용기로서 제3923호에 분류됩니다. (가짜 LLM 응답)\n"
+            f"- 입력 길이: {len(prompt)} chars"
+        )
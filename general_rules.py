@@ -0,0 +1,129 @@
+"""
+HS 해석에 관한 통칙(통칙_grouped.json) 규칙별 분할과 선택
+- 통칙_grouped.json 그룹은 페이지 단위이므로 페이지를 이어 붙인 뒤 '통칙 제N호' 제목 줄 기준으로 규칙별로 나눔
+- 규칙마다 본문(제목 + 조문 + [해설]), 조문(제목 다음부터 첫 [해설] 전까지)과 조문을 한 문단으로 줄인 요약(digest)을 미리 만들어 둠
+- select_rules: 질문의 HS 코드 구성/표현에 맞는 규칙만 선택 (프롬프트에 통칙 전체를 넣지 않음)
+  - 제1호: 항상 (분류의 기본 원칙)
+  - 제2호: 미완성/미조립/분해, 혼합물·복합물 표현이 있을 때
+  - 제3호: 코드가 둘 이상의 호에 걸치거나 세트/혼합/복합 표현이 있을 때
+  - 제4호: 가장 유사한 물품 표현이 있을 때
+  - 제5호: 케이스/포장용기 표현이 있을 때
+  - 제6호: 소호(6자리) 수준 비교이거나 같은 호 안의 코드를 비교할 때
+  - 제7호: 10자리(관세율표) 수준 비교일 때
+
+규칙 확인:
+    python general_rules.py --codes 3923,3924 --text "플라스틱 용기 세트"
+"""
+import argparse
+import json
+import re
+import sys
+
+from notes_segmenter import split_pages
+
+RULE_HEADING = re.compile(r'^통칙 제(\d+)호(?:\(\*\))?$')
+COMMENTARY_MARK = '[해설]'
+# 페이지 첫 줄은 머리글('통칙')
+RUNNING_HEAD = '통칙'
+
+RULE_KEYWORDS = {
+    2: ('미완성', '미조립', '조립되지', '분해', '반제품', '혼합물', '복합물'),
+    3: ('세트', '혼합', '복합', '구성요소', '본질적 특성'),
+    4: ('가장 유사', '유사한 물품'),
+    5: ('케이스', '포장용기', '포장재', '용기에 넣', '상자에 넣'),
+}
+
+
+def compact(text):
+    """줄바꿈/연속 공백을 한 칸으로 (PDF 줄 바꿈 제거)"""
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def parse_rules(groups):
+    """
+    통칙 그룹 목록 → 규칙별 구간
+    Returns:
+        {번호: {'number', 'title', 'text', 'statute', 'digest'}} (번호 순)
+    """
+    lines = []
+    for group in groups:
+        for _, page_text in split_pages(group.get('text', '')):
+            page_lines = page_text.strip('\n').split('\n')
+            if page_lines and page_lines[0].strip() == RUNNING_HEAD:
+                page_lines = page_lines[1:]
+            lines.extend(page_lines)
+
+    rules, current = {}, None
+    for line in lines:
+        match = RULE_HEADING.match(line.strip())
+        if match and int(match.group(1)) not in rules:
+            current = int(match.group(1))
+            rules[current] = [line.strip()]
+        elif current is not None:
+            rules[current].append(line)
+
+    parsed = {}
+    for number in sorted(rules):
+        text = '\n'.join(rules[number]).strip()
+        statute = '\n'.join(rules[number][1:]).split(COMMENTARY_MARK, 1)[0].strip()
+        parsed[number] = {
+            'number': number,
+            'title': f"통칙 제{number}호",
+            'text': text,
+            'statute': statute,
+            'digest': compact(statute),
+        }
+    return parsed
+
+
+def select_rules(hs_codes=(), text='', available=None):
+    """
+    상황에 맞는 통칙 번호 선택
+    Args:
+        hs_codes: 비교 대상 HS 코드 목록 (숫자만)
+        text: 사용자 질문
+        available: 사용 가능한 규칙 번호 (없으면 1~7)
+    Returns:
+        정렬된 규칙 번호 리스트
+    """
+    codes = [re.sub(r'\D', '', str(code)) for code in hs_codes]
+    selected = {1}
+    headings = {code[:4] for code in codes if len(code) >= 4}
+    if len(headings) > 1:
+        selected.add(3)
+    if any(len(code) >= 6 for code in codes) or len(headings) < len([code for code in codes if len(code) >= 4]):
+        selected.add(6)
+    if any(len(code) > 6 for code in codes):
+        selected.add(7)
+    for number, keywords in RULE_KEYWORDS.items():
+        if any(keyword in text for keyword in keywords):
+            selected.add(number)
+    if available is not None:
+        selected &= set(available)
+    return sorted(selected)
+
+
+def format_rules(rules, numbers, field='digest'):
+    """선택한 규칙을 '통칙 제N호: ...' 형식으로 (규칙마다 한 번)"""
+    return "\n\n".join(f"{rules[number]['title']}: {rules[number][field]}" for number in numbers if number in rules)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="통칙 규칙별 분할/선택 결과 확인")
+    parser.add_argument('--rules', default='knowledge/통칙_grouped.json', help="통칙 그룹 JSON")
+    parser.add_argument('--codes', default='', help="비교할 HS 코드 (쉼표 구분)")
+    parser.add_argument('--text', default='', help="사용자 질문")
+    args = parser.parse_args(argv)
+
+    with open(args.rules, 'r', encoding='utf-8') as f:
+        rules = parse_rules(json.load(f))
+    for number, rule in rules.items():
+        print(f"{rule['title']}: 본문 {len(rule['text'])}자, 조문 {len(rule['statute'])}자, 요약 {len(rule['digest'])}자")
+    numbers = select_rules([code for code in args.codes.split(',') if code], args.text, rules)
+    print(f"\n선택: {numbers}\n")
+    print(format_rules(rules, numbers))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+Multi-Agent 그룹 에이전트 구조화 출력(JSON)과 로컬 투표 병합
+- 그룹 에이전트는 자유 형식 답변 대신 GROUP_OUTPUT_SCHEMA 형식의 JSON으로 답함 (Gemini response_schema)
+    {"candidates": [{"hs_code", "confidence"(0~1), "reference_ids"(근거 사례 reference_id), "reason"}], "summary"}
+- 병합: 그룹별 1순위 후보를 6자리 소호 단위로 투표 (신뢰도 가중)
+  - 인용한 reference_id는 해당 그룹에 실제로 제공된 사례만 인정 (없는 ID는 버림)
+  - 후보를 낸 그룹이 HS_GROUP_AGREEMENT_MIN_GROUPS개 이상이고 모두 같은 소호, 평균 신뢰도가
+    HS_GROUP_AGREEMENT_CONFIDENCE 이상, 인정된 근거 사례가 있으면 '일치' → Head Agent 없이 고정 템플릿으로 답변
+    (템플릿에 넣을 코드(agreed_code)는 호출하는 쪽에서 관세율표로 검증, 없는 번호면 Head Agent로 넘김)
+  - 그 밖에는 그룹별 구조화 결과를 짧게 요약하여 Head Agent에 전달 (자유 형식 답변 5개를 이어 붙이지 않음)
+- JSON으로 읽을 수 없는 그룹 답변은 자유 형식 답변으로 취급 (병합 투표에서 제외, Head Agent에는 원문 전달)
+
+환경 변수:
+    HS_GROUP_STRUCTURED            : 0이면 구조화 출력을 쓰지 않고 기존 자유 형식 답변 + Head Agent (기본 1)
+    HS_GROUP_AGREEMENT_MIN_GROUPS  : 일치로 판단할 최소 그룹 수 (기본 3)
+    HS_GROUP_AGREEMENT_CONFIDENCE  : 일치로 판단할 평균 신뢰도 하한 (기본 0.7)
+"""
+import json
+import os
+import re
+from collections import defaultdict
+
+# Gemini response_schema (OpenAPI 부분 집합)
+GROUP_OUTPUT_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'candidates': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'hs_code': {'type': 'STRING'},
+                    'confidence': {'type': 'NUMBER'},
+                    'reference_ids': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+                    'reason': {'type': 'STRING'},
+                },
+                'required': ['hs_code', 'confidence', 'reference_ids', 'reason'],
+            },
+        },
+        'summary': {'type': 'STRING'},
+    },
+    'required': ['candidates', 'summary'],
+}
+
+# 그룹 에이전트 프롬프트 끝에 붙이는 출력 형식 안내
+GROUP_OUTPUT_INSTRUCTION = """
+답변은 아래 JSON 형식으로만 작성하세요 (다른 설명 없이).
+- candidates: 적합한 HS코드 후보 최대 3개 (가장 적합한 것부터)
+  - hs_code: HS코드 (예: 3923.10-0000)
+  - confidence: 0~1 사이 신뢰도 (관련 데이터에 근거가 약하면 낮게)
+  - reference_ids: 근거로 삼은 관련 데이터 항목의 reference_id 목록
+  - reason: 분류 근거 한두 문장
+- summary: 이 그룹 데이터에 대한 분석 요약 2~3문장 (관련 사례가 없으면 candidates를 비우고 그 사실을 적음)
+"""
+
+DEFAULT_MIN_GROUPS = 3
+DEFAULT_CONFIDENCE = 0.7
+CODE_FENCE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+
+def structured_enabled():
+    return os.getenv('HS_GROUP_STRUCTURED', '1') != '0'
+
+
+def context_references(context):
+    """
+    그룹 컨텍스트('항목: {...}' 줄)에 들어 있는 사례
+    Returns:
+        {reference_id: {'hs_code', 'name'}}
+    """
+    references = {}
+    for line in context.splitlines():
+        if not line.startswith('항목: '):
+            continue
+        try:
+            item = json.loads(line[len('항목: '):])
+        except ValueError:
+            continue
+        reference_id = str(item.get('reference_id') or '').strip()
+        if reference_id:
+            references[reference_id] = {'hs_code': str(item.get('hs_code') or ''),
+                                        'name': str(item.get('product_name') or item.get('country') or '')}
+    return references
+
+
+def subheading(code):
+    """HS 코드의 6자리 소호 (숫자 6자리 미만이면 있는 만큼)"""
+    digits = ''.join(ch for ch in str(code) if ch.isdigit())
+    return digits[:6]
+
+
+def format_subheading(code6):
+    return f"{code6[:4]}.{code6[4:]}" if len(code6) > 4 else code6
+
+
+def parse_group_output(text, references=None):
+    """
+    그룹 에이전트 JSON 답변 → 정리된 구조 (JSON이 아니면 None)
+    - 후보는 신뢰도 순, 신뢰도는 0~1로 제한, reference_ids는 references(제공된 사례)에 있는 것만 남김
+    Returns:
+        {'candidates': [{'hs_code', 'subheading', 'confidence', 'reference_ids', 'reason'}], 'summary'} 또는 None
+    """
+    try:
+        data = json.loads(CODE_FENCE.sub('', (text or '').strip()))
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get('candidates', []), list):
+        return None
+    candidates = []
+    for candidate in data.get('candidates') or []:
+        if not isinstance(candidate, dict) or len(subheading(candidate.get('hs_code', ''))) < 4:
+            continue
+        try:
+            confidence = min(1.0, max(0.0, float(candidate.get('confidence', 0))))
+        except (TypeError, ValueError):
+            confidence = 0.0
+        reference_ids = [str(ref) for ref in candidate.get('reference_ids') or []]
+        if references is not None:
+            reference_ids = [ref for ref in reference_ids if ref in references]
+        candidates.append({'hs_code': str(candidate['hs_code']).strip(), 'subheading': subheading(candidate['hs_code']),
+                           'confidence': confidence, 'reference_ids': reference_ids,
+                           'reason': str(candidate.get('reason') or '').strip()})
+    candidates.sort(key=lambda c: c['confidence'], reverse=True)
+    return {'candidates': candidates[:3], 'summary': str(data.get('summary') or '').strip()}
+
+
+def format_group_output(output):
+    """구조화된 그룹 결과 → 화면 표시용 마크다운"""
+    if not output['candidates']:
+        return f"관련 사례에서 적합한 후보를 찾지 못했습니다.\n\n{output['summary']}".strip()
+    lines = []
+    for rank, candidate in enumerate(output['candidates'], 1):
+        refs = f" (근거: {', '.join(candidate['reference_ids'])})" if candidate['reference_ids'] else ""
+        lines.append(f"{rank}. **{candidate['hs_code']}** 신뢰도 {candidate['confidence']:.2f} - {candidate['reason']}{refs}")
+    return "\n".join(lines) + (f"\n\n{output['summary']}" if output['summary'] else "")
+
+
+def merge_group_outputs(outputs, min_groups=None, min_confidence=None):
+    """
+    그룹별 구조화 결과 투표
+    Args:
+        outputs: {그룹 번호: parse_group_output 결과 (JSON이 아니었으면 None)}
+    Returns:
+        {'agreed': bool, 'votes': [{'subheading', 'score', 'groups', 'codes', 'reference_ids', 'reasons'}, ...],
+         'voters': 후보를 낸 그룹 수, 'unstructured': JSON이 아닌 그룹 번호 목록, 'confidence': 1위 평균 신뢰도}
+    """
+    min_groups = int(os.getenv('HS_GROUP_AGREEMENT_MIN_GROUPS', DEFAULT_MIN_GROUPS)) if min_groups is None else min_groups
+    min_confidence = float(os.getenv('HS_GROUP_AGREEMENT_CONFIDENCE', DEFAULT_CONFIDENCE)) \
+        if min_confidence is None else min_confidence
+
+    votes = defaultdict(lambda: {'score': 0.0, 'groups': [], 'codes': defaultdict(float), 'reference_ids': [],
+                                 'reasons': [], 'confidences': []})
+    unstructured, voters = [], 0
+    for group_id in sorted(outputs):
+        output = outputs[group_id]
+        if output is None:
+            unstructured.append(group_id)
+            continue
+        if not output['candidates']:
+            continue
+        voters += 1
+        top = output['candidates'][0]
+        vote = votes[top['subheading']]
+        vote['score'] += top['confidence']
+        vote['groups'].append(group_id)
+        vote['codes'][top['hs_code']] += top['confidence']
+        vote['confidences'].append(top['confidence'])
+        vote['reference_ids'].extend(ref for ref in top['reference_ids'] if ref not in vote['reference_ids'])
+        if top['reason']:
+            vote['reasons'].append((group_id, top['reason']))
+
+    ranked = sorted(({'subheading': code6, **vote, 'codes': dict(vote['codes'])} for code6, vote in votes.items()),
+                    key=lambda v: (len(v['groups']), v['score']), reverse=True)
+    confidence = sum(ranked[0]['confidences']) / len(ranked[0]['confidences']) if ranked else 0.0
+    agreed = (len(ranked) == 1 and voters >= min_groups and not unstructured and confidence >= min_confidence
+              and bool(ranked[0]['reference_ids']))
+    return {'agreed': agreed, 'votes': ranked, 'voters': voters, 'unstructured': unstructured,
+            'confidence': confidence}
+
+
+def compact_summary(outputs, merged, raw_answers=None):
+    """
+    Head Agent에 전달할 짧은 요약 (투표 결과 + 그룹별 후보/근거 사례)
+    Args:
+        raw_answers: {그룹 번호: 원문} - JSON이 아닌 그룹은 원문을 그대로 포함
+    """
+    lines = ["[후보 투표 결과 (그룹별 1순위, 신뢰도 합)]"]
+    for vote in merged['votes']:
+        groups = ', '.join(f"그룹{i + 1}" for i in vote['groups'])
+        lines.append(f"- {format_subheading(vote['subheading'])}: {len(vote['groups'])}개 그룹 ({groups}), "
+                     f"신뢰도 합 {vote['score']:.2f}")
+    lines.append("")
+    for group_id in sorted(outputs):
+        output = outputs[group_id]
+        if output is None:
+            lines.append(f"[그룹{group_id + 1}] {(raw_answers or {}).get(group_id, '')}")
+            continue
+        if not output['candidates']:
+            lines.append(f"[그룹{group_id + 1}] 후보 없음 - {output['summary']}")
+            continue
+        lines.append(f"[그룹{group_id + 1}]")
+        for candidate in output['candidates']:
+            refs = ', '.join(candidate['reference_ids']) or '없음'
+            lines.append(f"- {candidate['hs_code']} ({candidate['confidence']:.2f}) 근거 사례: {refs} / {candidate['reason']}")
+    return "\n".join(lines)
+
+
+def agreed_code(merged):
+    """일치한 소호에서 그룹들이 제시한 코드 중 신뢰도 합이 가장 큰 코드 (LLM 출력 그대로, 검증 전)"""
+    return max(merged['votes'][0]['codes'].items(), key=lambda item: item[1])[0]
+
+
+def agreed_answer(merged, references, groups_total=5):
+    """
+    그룹 결과가 일치할 때의 고정 템플릿 답변 (Head Agent 호출 없음)
+    Args:
+        references: {reference_id: {'hs_code', 'name'}} - 그룹들에 제공된 사례
+    """
+    vote = merged['votes'][0]
+    code = agreed_code(merged)
+    lines = [
+        f"**추천 HS코드**: {code}",
+        "",
+        f"**분류 논리**: {groups_total}개 그룹 중 후보를 낸 {merged['voters']}개 그룹이 모두 "
+        f"제{format_subheading(vote['subheading'])}호를 1순위로 제시했습니다 (평균 신뢰도 {merged['confidence']:.2f}).",
+    ]
+    seen = set()
+    for group_id, reason in vote['reasons']:
+        # 같은 근거 문장은 한 번만
+        if reason not in seen:
+            seen.add(reason)
+            lines.append(f"- 그룹{group_id + 1}: {reason}")
+    if len(vote['codes']) > 1:
+        lines.append("")
+        lines.append(f"**세부 코드**: 그룹별 제시 코드 {', '.join(sorted(vote['codes']))} - 10단위는 물품 세부 사양을 확인하세요.")
+    lines.append("")
+    lines.append("**유사 사례**:")
+    for reference_id in vote['reference_ids']:
+        reference = references.get(reference_id, {})
+        name = f" {reference['name'][:60]}" if reference.get('name') else ""
+        lines.append(f"- {reference_id}: {reference.get('hs_code', '')}{name}")
+    lines.append("")
+    lines.append("**주의사항**: 그룹별 분석 결과가 일치하여 종합 분석 없이 작성한 답변입니다. "
+                 "품목분류는 수출입신고 당시의 물품 상태에 따라 달라질 수 있습니다.")
+    return "\n".join(lines)
@@ -1,65 +1,252 @@
-import pdfplumber
+"""
+HS 해설서 PDF → 그룹별 JSON 변환 (통칙_grouped.json, grouped_11_end.json)
+- 페이지 텍스트 추출은 프로세스 풀에서 병렬 실행 (워커마다 PDF를 한 번만 열기)
+- 페이지 내용(content stream)과 리소스(글꼴, 이미지 등) 해시를 키로 추출 텍스트를 캐시하여, 바뀌지 않은 페이지는 다시 추출하지 않음
+- 그룹 출력은 그룹 하나씩 만들어 바로 파일에 기록 (전체 텍스트를 메모리에 모으지 않음)
+- 각 그룹에 부/류/호/소호 제목 위치(sections: 텍스트 내 시작/끝 offset)를 함께 기록하고,
+  전체 제목 색인을 grouped_11_end.sections.json 으로 저장 (조회 시 본문 검색 불필요)
+
+실행 예:
+    python HS_manual_page_split.py --input HS해설서_국문.pdf --workers 8
+"""
+import argparse
+import hashlib
 import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pdfplumber
+from pdfminer.pdftypes import PDFObjRef, PDFStream, resolve1
+
+# 제목 줄 패턴(부 > 류 > 호 > 소호)은 저장소 루트의 notes_segmenter.py와 공유 (해설서 조회 시 구간 분할과 같은 기준)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from notes_segmenter import LEVEL_ORDER, match_heading  # noqa: E402
+
+# 추출 방식이 바뀌면 캐시를 무효화하기 위해 해시에 포함
+EXTRACTOR_VERSION = f"pdfplumber-{pdfplumber.__version__}-v2"
+
+
+def _hash_object(digest, obj, seen):
+    """
+    PDF 객체를 해시에 반영 (간접 참조는 따라가서 내용으로, 같은 객체는 한 번만)
+    - 스트림은 사전(attrs)과 디코딩한 바이트 (원본 바이트는 한 번 디코딩하면 버려지므로), 사전은 키 순서대로
+    """
+    if isinstance(obj, PDFObjRef):
+        if obj.objid in seen:
+            digest.update(f"<ref {obj.objid}>".encode('utf-8'))
+            return
+        seen.add(obj.objid)
+    obj = resolve1(obj)
+    if isinstance(obj, PDFStream):
+        _hash_object(digest, obj.attrs, seen)
+        digest.update(obj.get_data())
+    elif isinstance(obj, dict):
+        for key in sorted(obj, key=str):
+            digest.update(f"/{key}".encode('utf-8'))
+            _hash_object(digest, obj[key], seen)
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b'[')
+        for item in obj:
+            _hash_object(digest, item, seen)
+        digest.update(b']')
+    elif isinstance(obj, bytes):
+        digest.update(obj)
+    else:
+        digest.update(repr(getattr(obj, 'name', obj)).encode('utf-8'))
+
+
+def page_hash(page):
+    """
+    페이지 content stream + 리소스(/Resources: 글꼴, 이미지, XObject 등) + 크기 + 추출기 버전 기준 해시
+    - 내용 stream이 같아도 글꼴(ToUnicode 등)이 바뀌면 추출 텍스트가 달라지므로 리소스도 포함
+    """
+    digest = hashlib.sha256(EXTRACTOR_VERSION.encode('utf-8'))
+    digest.update(f"{page.width}x{page.height}".encode('utf-8'))
+    contents = page.page_obj.contents
+    if not isinstance(contents, list):
+        contents = [contents]
+    for stream in contents:
+        stream = resolve1(stream)
+        if stream is not None:
+            digest.update(stream.get_data())
+    _hash_object(digest, page.page_obj.resources, set())
+    return digest.hexdigest()
+
+
+class PageCache:
+    """페이지 해시별 추출 텍스트 캐시 (cache_dir/ab/<hash>.txt)"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.txt')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, text):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+# --- 워커 프로세스 (PDF는 워커당 한 번만 열기) ---
+_worker_pdf = None
+
+
+def _init_worker(input_path):
+    global _worker_pdf
+    _worker_pdf = pdfplumber.open(input_path)
 
-# 입력 PDF 경로
-input_path = 'HS해설서_국문.pdf'
 
-# 1. 통칙 페이지 JSON 생성
-tongchik_output = '통칙_grouped.json'
-tongchik_groups = {}
+def _extract_pages(indexes):
+    results = []
+    for idx in indexes:
+        page = _worker_pdf.pages[idx]
+        results.append((idx, page.extract_text() or ""))
+        page.close()  # 페이지별 파싱 결과 해제 (메모리 유지 방지)
+    return results
 
-with pdfplumber.open(input_path) as pdf:
-    for idx, page in enumerate(pdf.pages):
-        text = page.extract_text() or ""
-        lines = [ln.strip() for ln in text.split('\n') if ln.strip()]
-        # 첫 줄이 "통칙"인 페이지만 처리
-        if not lines or lines[0] != "통칙":
+
+def extract_all_pages(input_path, cache, workers=None, chunk_size=16):
+    """
+    모든 페이지 텍스트를 캐시에 준비
+    Returns:
+        (페이지 해시 리스트, 새로 추출한 페이지 수)
+    """
+    with pdfplumber.open(input_path) as pdf:
+        hashes = [page_hash(page) for page in pdf.pages]
+
+    missing = [idx for idx, key in enumerate(hashes) if cache.get(key) is None]
+    if missing:
+        chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(input_path,)) as executor:
+            for results in executor.map(_extract_pages, chunks):
+                for idx, text in results:
+                    cache.put(hashes[idx], text)
+    return hashes, len(missing)
+
+
+def page_headers(text):
+    """페이지 첫 두 줄 (그룹 키)"""
+    lines = []
+    for ln in text.split('\n'):
+        ln = ln.strip()
+        if ln:
+            lines.append(ln)
+            if len(lines) == 2:
+                break
+    return (lines[0] if lines else "", lines[1] if len(lines) > 1 else "")
+
+
+def find_sections(text):
+    """
+    그룹 텍스트의 부/류/호/소호 제목 위치
+    - 각 구간은 같은 수준 이상의 다음 제목 직전(또는 텍스트 끝)까지
+    Returns:
+        [{'level', 'id', 'title', 'start', 'end'}, ...]
+    """
+    sections = []
+    offset = 0
+    for line in text.split('\n'):
+        stripped = line.strip()
+        heading = match_heading(stripped)
+        if heading:
+            level, section_id = heading
+            start = offset + line.index(stripped)
+            sections.append({'level': level, 'id': section_id, 'title': stripped[:120], 'start': start, 'end': len(text)})
+        offset += len(line) + 1
+
+    for i, section in enumerate(sections):
+        for following in sections[i + 1:]:
+            if LEVEL_ORDER[following['level']] <= LEVEL_ORDER[section['level']]:
+                section['end'] = following['start']
+                break
+    return sections
+
+
+def group_pages(hashes, cache, page_indexes, header_filter=None):
+    """
+    (header1, header2)가 같은 페이지끼리 묶기 (처음 나온 순서 유지)
+    Returns:
+        [((header1, header2), [페이지 번호...]), ...]
+    """
+    groups = {}
+    for idx in page_indexes:
+        header1, header2 = page_headers(cache.get(hashes[idx]))
+        if header_filter is not None and header1 != header_filter:
             continue
-        header1 = lines[0]
-        header2 = lines[1] if len(lines) > 1 else ""
-        key = (header1, header2)
-        if key not in tongchik_groups:
-            tongchik_groups[key] = {
-                "header1": header1,
-                "header2": header2,
-                "pages": [],
-                "text": ""
-            }
-        page_num = idx + 1
-        tongchik_groups[key]["pages"].append(page_num)
-        tongchik_groups[key]["text"] += f"\n--- Page {page_num} ---\n{text}"
-
-tongchik_result = list(tongchik_groups.values())
-with open(tongchik_output, 'w', encoding='utf-8') as f:
-    json.dump(tongchik_result, f, ensure_ascii=False, indent=2)
-
-# 2. 11페이지부터 끝까지 그룹화하여 JSON 생성
-rest_output = 'grouped_11_end.json'
-rest_groups = {}
-
-with pdfplumber.open(input_path) as pdf:
-    for idx in range(10, len(pdf.pages)):
-        page = pdf.pages[idx]
-        text = page.extract_text() or ""
-        lines = [ln.strip() for ln in text.split('\n') if ln.strip()]
-        header1 = lines[0] if len(lines) >= 1 else ""
-        header2 = lines[1] if len(lines) >= 2 else ""
-        key = (header1, header2)
-        if key not in rest_groups:
-            rest_groups[key] = {
-                "header1": header1,
-                "header2": header2,
-                "pages": [],
-                "text": ""
-            }
-        page_num = idx + 1
-        rest_groups[key]["pages"].append(page_num)
-        rest_groups[key]["text"] += f"\n--- Page {page_num} ---\n{text}"
-
-rest_result = list(rest_groups.values())
-with open(rest_output, 'w', encoding='utf-8') as f:
-    json.dump(rest_result, f, ensure_ascii=False, indent=2)
-
-# 요약 출력
-print(f"통칙 그룹 수: {len(tongchik_result)}, 파일 생성: {tongchik_output}")
-print(f"나머지 그룹 수: {len(rest_result)}, 파일 생성: {rest_output}")
+        groups.setdefault((header1, header2), []).append(idx + 1)
+    return list(groups.items())
+
+
+def write_groups(output_path, groups, hashes, cache, sections_path=None):
+    """
+    그룹을 하나씩 만들어 JSON 배열로 기록 (텍스트는 리스트 join으로 구성)
+    Returns:
+        기록한 그룹 수
+    """
+    index = []
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('[\n')
+        for group_idx, ((header1, header2), pages) in enumerate(groups):
+            text = ''.join(f"\n--- Page {page_num} ---\n{cache.get(hashes[page_num - 1])}" for page_num in pages)
+            sections = find_sections(text)
+            entry = {"header1": header1, "header2": header2, "pages": pages, "text": text, "sections": sections}
+            if group_idx:
+                f.write(',\n')
+            f.write(json.dumps(entry, ensure_ascii=False, indent=2))
+            index.extend({'group': group_idx, **section} for section in sections)
+        f.write('\n]\n')
+    os.replace(tmp_path, output_path)
+
+    if sections_path:
+        with open(sections_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+    return len(groups)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HS 해설서 PDF 그룹별 JSON 변환")
+    parser.add_argument('--input', default='HS해설서_국문.pdf', help="입력 PDF 경로")
+    parser.add_argument('--out-dir', default='.', help="출력 폴더")
+    parser.add_argument('--cache-dir', default='.page_cache', help="페이지 텍스트 캐시 폴더")
+    parser.add_argument('--workers', type=int, default=None, help="추출 프로세스 수 (기본: CPU 수)")
+    parser.add_argument('--start-page', type=int, default=11, help="본문(부/류/호) 그룹화 시작 페이지")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    cache = PageCache(args.cache_dir)
+    hashes, extracted = extract_all_pages(args.input, cache, args.workers)
+    print(f"페이지 {len(hashes)}개 (새로 추출 {extracted}개, 캐시 사용 {len(hashes) - extracted}개) {time.time() - start:.1f}s")
+
+    # 1. 통칙 페이지 JSON 생성 (첫 줄이 "통칙"인 페이지)
+    tongchik_output = os.path.join(args.out_dir, '통칙_grouped.json')
+    tongchik_groups = group_pages(hashes, cache, range(len(hashes)), header_filter="통칙")
+    tongchik_count = write_groups(tongchik_output, tongchik_groups, hashes, cache)
+
+    # 2. start_page부터 끝까지 그룹화하여 JSON 생성
+    rest_output = os.path.join(args.out_dir, 'grouped_11_end.json')
+    rest_groups = group_pages(hashes, cache, range(args.start_page - 1, len(hashes)))
+    rest_count = write_groups(rest_output, rest_groups, hashes, cache,
+                              os.path.join(args.out_dir, 'grouped_11_end.sections.json'))
+
+    # 요약 출력
+    print(f"통칙 그룹 수: {tongchik_count}, 파일 생성: {tongchik_output}")
+    print(f"나머지 그룹 수: {rest_count}, 파일 생성: {rest_output}")
+    print(f"총 소요 시간: {time.time() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,427 @@
+"""
+SQLite 지식 데이터베이스 (메모리 인덱스 대신 사용할 수 있는 저장소)
+- 분류사례(국내/위원회/협의회/미국/EU), 관세율표(hstable.json), 해설서 그룹(grouped_11_end.json)을 SQLite 파일 하나로 변환
+- 분류사례: 키워드 역색인(case_keywords) 테이블로 기존 HSDataManager 키워드 검색과 같은 결과 반환
+- 여러 파일에 있는 같은 사례(reference_id, 없으면 내용 해시 기준)는 처음 나온 것만 저장하고 원본 위치는 case_duplicates에 기록
+- 해설서: FTS5 trigram 테이블(notes_fts)로 한글 부분 문자열 검색, header1/header2 인덱스로 부/류/호 조회
+- hs_code / 품목번호 컬럼은 B-tree 인덱스로 접두어 조회
+- 실행 시에는 읽기 전용(immutable) + mmap으로 열어 여러 프로세스가 같은 파일을 동시에 사용
+
+빌드 (오프라인):
+    python knowledge_db.py build --out knowledge/knowledge.db
+
+사용:
+    HS_KNOWLEDGE_DB=knowledge/knowledge.db streamlit run main.py
+    (환경 변수가 없으면 기존처럼 JSON 파일을 메모리에 로드)
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from datetime import datetime
+
+SCHEMA_VERSION = 3
+
+# 읽기 전용 연결의 mmap 크기 (바이트)
+DEFAULT_MMAP_SIZE = 512 * 1024 * 1024
+
+# 분류사례 원본 파일 (source 이름은 HSDataManager.data 키와 동일)
+# - 국내 분류사례는 HS분류사례_part<N>.json 패턴으로 찾아 번호 순으로 사용 (파트가 추가되어도 코드 수정 불필요)
+CASE_PART_PATTERN = re.compile(r'^HS분류사례_part(\d+)\.json$')
+FIXED_CASE_FILES = [
+    ('knowledge/HS위원회', 'HS위원회.json'),
+    ('knowledge/HS협의회', 'HS협의회.json'),
+    ('hs_classification_data_us', 'hs_classification_data_us.json'),
+    ('hs_classification_data_eu', 'hs_classification_data_eu.json'),
+]
+TARIFF_FILE = 'hstable.json'
+NOTES_FILE = 'grouped_11_end.json'
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE cases (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    ord INTEGER NOT NULL,
+    hs_code TEXT,
+    item_json TEXT NOT NULL
+);
+CREATE INDEX idx_cases_source_ord ON cases (source, ord);
+CREATE INDEX idx_cases_hs_code ON cases (hs_code);
+CREATE TABLE case_keywords (
+    keyword TEXT NOT NULL,
+    case_id INTEGER NOT NULL,
+    PRIMARY KEY (keyword, case_id)
+) WITHOUT ROWID;
+CREATE TABLE case_duplicates (
+    record_key TEXT NOT NULL,
+    source TEXT NOT NULL,
+    ord INTEGER NOT NULL
+);
+CREATE INDEX idx_case_duplicates_key ON case_duplicates (record_key);
+CREATE TABLE tariff (
+    id INTEGER PRIMARY KEY,
+    hs_code TEXT NOT NULL,
+    english_name TEXT,
+    korean_name TEXT
+);
+CREATE INDEX idx_tariff_hs_code ON tariff (hs_code);
+CREATE TABLE notes (
+    id INTEGER PRIMARY KEY,
+    header1 TEXT,
+    header1_norm TEXT,
+    header2 TEXT,
+    item_json TEXT NOT NULL,
+    search_text TEXT NOT NULL
+);
+CREATE INDEX idx_notes_header1 ON notes (header1);
+CREATE INDEX idx_notes_header2 ON notes (header2);
+CREATE VIRTUAL TABLE notes_fts USING fts5(search_text, content='notes', content_rowid='id', tokenize='trigram');
+"""
+
+
+def extract_keywords(text):
+    """HSDataManager._extract_keywords와 같은 규칙 (특수문자 제거, casefold, 길이 2 이상, 중복 제거)"""
+    words = re.sub(r'[^\w\s]', ' ', text).casefold().split()
+    return list(set(word for word in words if len(word) >= 2))
+
+
+def normalize_part_header(header):
+    """'제 7 부' → '제7부' (lookup_hscode의 부 비교 규칙)"""
+    return re.sub(r'제\s*(\d+)\s*부', r'제\1부', header or '')
+
+
+def discover_case_files(knowledge_dir='knowledge'):
+    """
+    knowledge_dir에 있는 분류사례 파일 목록
+    Returns:
+        [(source, 파일 경로), ...] - 국내 파트(번호 순) → 위원회 → 협의회 → 미국 → EU 순서
+    """
+    try:
+        names = [unicodedata.normalize('NFC', name) for name in os.listdir(knowledge_dir)]
+    except FileNotFoundError:
+        return []
+    parts = sorted((int(match.group(1)), name) for name in names
+                   for match in [CASE_PART_PATTERN.match(name)] if match)
+    files = [(f'HS분류사례_part{number}', os.path.join(knowledge_dir, name)) for number, name in parts]
+    files += [(source, os.path.join(knowledge_dir, name)) for source, name in FIXED_CASE_FILES if name in names]
+    return files
+
+
+def record_key(item):
+    """중복 판단 키: reference_id (없으면 내용 해시)"""
+    reference_id = str(item.get('reference_id') or '').strip()
+    if reference_id:
+        return 'ref:' + reference_id
+    content = json.dumps(item, ensure_ascii=False, sort_keys=True)
+    return 'sha1:' + hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def deduplicate_sources(raw):
+    """
+    source 순서대로 처음 나온 분류사례만 남기고 중복 제거
+    Args:
+        raw: {source: items} (파일 탐색 순서)
+    Returns:
+        (kept, provenance, removed)
+        - kept: {source: 중복 제거된 items}
+        - provenance: {record_key: [(source, 원본 순번), ...]} - 두 곳 이상에 있는 사례만 (첫 번째가 남긴 사례)
+        - removed: [(source, item), ...] 제거된 사례
+    """
+    seen = {}
+    provenance = {}
+    kept = {}
+    removed = []
+    for source, items in raw.items():
+        kept_items = []
+        for ord_idx, item in enumerate(items):
+            key = record_key(item)
+            if key in seen:
+                provenance.setdefault(key, [seen[key]]).append((source, ord_idx))
+                removed.append((source, item))
+            else:
+                seen[key] = (source, ord_idx)
+                kept_items.append(item)
+        kept[source] = kept_items if len(kept_items) < len(items) else items
+    return kept, provenance, removed
+
+
+def dedup_report(raw, removed):
+    """중복 제거 결과 요약 (전체/제거 사례 수, 제거된 키워드 색인 항목 수, source별 제거 수)"""
+    by_source = {}
+    for source, _ in removed:
+        by_source[source] = by_source.get(source, 0) + 1
+    return {
+        'records': sum(len(items) for items in raw.values()),
+        'duplicates': len(removed),
+        'postings': sum(len(extract_keywords(str(item))) for _, item in removed),
+        'by_source': by_source,
+    }
+
+
+def _load_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"Warning: {path} not found")
+        return []
+
+
+def build_database(out_path, knowledge_dir='knowledge'):
+    """
+    JSON 지식 파일을 SQLite 파일로 변환
+    - 임시 파일에 만든 뒤 교체하므로, 실행 중인 프로세스는 이전 파일을 계속 사용 가능
+    Returns:
+        테이블별 행 수
+    """
+    tmp_path = out_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.executescript(SCHEMA)
+    counts = {'cases': 0, 'case_keywords': 0, 'tariff': 0, 'notes': 0}
+
+    # 1) 분류사례 + 키워드 역색인 (여러 파일에 있는 같은 사례는 처음 나온 것만, 나머지 위치는 case_duplicates에 기록)
+    raw = {source: _load_json(path) for source, path in discover_case_files(knowledge_dir)}
+    kept, provenance, removed = deduplicate_sources(raw)
+    for source, items in kept.items():
+        for ord_idx, item in enumerate(items):
+            cursor = conn.execute(
+                'INSERT INTO cases (source, ord, hs_code, item_json) VALUES (?, ?, ?, ?)',
+                (source, ord_idx, str(item.get('hs_code') or ''), json.dumps(item, ensure_ascii=False)))
+            keywords = extract_keywords(str(item))
+            conn.executemany('INSERT OR IGNORE INTO case_keywords (keyword, case_id) VALUES (?, ?)',
+                             [(keyword, cursor.lastrowid) for keyword in keywords])
+            counts['cases'] += 1
+            counts['case_keywords'] += len(keywords)
+    conn.executemany('INSERT INTO case_duplicates (record_key, source, ord) VALUES (?, ?, ?)',
+                     [(key, source, ord_idx) for key, places in provenance.items() for source, ord_idx in places])
+    report = dedup_report(raw, removed)
+    counts['duplicate_cases'] = report['duplicates']
+    counts['duplicate_postings'] = report['postings']
+
+    # 2) 관세율표
+    tariff_rows = [(item.get('품목번호', ''), item.get('영문품명', ''), item.get('한글품명', ''))
+                   for item in _load_json(os.path.join(knowledge_dir, TARIFF_FILE))]
+    conn.executemany('INSERT INTO tariff (hs_code, english_name, korean_name) VALUES (?, ?, ?)', tariff_rows)
+    counts['tariff'] = len(tariff_rows)
+
+    # 3) 해설서 그룹 (검색 텍스트는 direct_manual_search와 같이 헤더 + 본문을 소문자로)
+    for item in _load_json(os.path.join(knowledge_dir, NOTES_FILE)):
+        header1, header2 = item.get('header1', ''), item.get('header2', '')
+        search_text = f"{header1} {header2} {item.get('text', '')}".lower()
+        conn.execute(
+            'INSERT INTO notes (header1, header1_norm, header2, item_json, search_text) VALUES (?, ?, ?, ?, ?)',
+            (header1, normalize_part_header(header1), header2, json.dumps(item, ensure_ascii=False), search_text))
+        counts['notes'] += 1
+    conn.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO notes_fts (notes_fts) VALUES ('optimize')")
+
+    meta = {'schema_version': SCHEMA_VERSION, 'built_at': datetime.now().isoformat(timespec='seconds'), **counts}
+    conn.executemany('INSERT INTO meta (key, value) VALUES (?, ?)', [(k, str(v)) for k, v in meta.items()])
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.execute('VACUUM')
+    conn.close()
+
+    os.replace(tmp_path, out_path)
+    return counts
+
+
+def _fts_phrase(keyword):
+    """FTS5 MATCH용 따옴표 구문 (내부 따옴표는 두 번)"""
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+class KnowledgeDB:
+    """
+    읽기 전용 지식 데이터베이스
+    - 스레드별로 연결을 따로 열어 사용 (sqlite3 연결은 스레드 간 공유하지 않음)
+    - immutable=1 로 열어 잠금 없이 여러 프로세스가 동시에 읽음 (파일 교체는 build_database가 원자적으로 수행)
+    """
+
+    def __init__(self, path, mmap_size=DEFAULT_MMAP_SIZE):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        conn = self.connection()
+        self.meta = dict(conn.execute('SELECT key, value FROM meta'))
+        if self.meta.get('schema_version') != str(SCHEMA_VERSION):
+            print(f"Warning: {path} schema v{self.meta.get('schema_version')} != v{SCHEMA_VERSION}, "
+                  f"rebuild with 'python knowledge_db.py build'")
+        self.source_counts = dict(conn.execute('SELECT source, COUNT(*) FROM cases GROUP BY source'))
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            uri = 'file:' + os.path.abspath(self.path) + '?mode=ro&immutable=1'
+            conn = sqlite3.connect(uri, uri=True)
+            conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+            conn.execute('PRAGMA query_only=1')
+            self._local.conn = conn
+        return conn
+
+    def search_cases(self, keywords, sources=None, max_results=5, ord_range=None):
+        """
+        키워드가 많이 일치하는 분류사례 검색 (HSDataManager.search* 와 같은 점수)
+        Args:
+            keywords: 검색 키워드 목록
+            sources: 검색할 source 이름 목록 (None이면 전체)
+            max_results: 최대 결과 수
+            ord_range: (시작, 끝) source 내 순번 범위 (해외 데이터 그룹 분할용)
+        Returns:
+            [(source, item), ...]
+        """
+        if not keywords:
+            return []
+        sql = ('SELECT c.source, c.item_json, COUNT(*) AS score FROM case_keywords k '
+               'JOIN cases c ON c.id = k.case_id '
+               f'WHERE k.keyword IN ({",".join("?" * len(keywords))})')
+        params = list(keywords)
+        if sources is not None:
+            sql += f' AND c.source IN ({",".join("?" * len(sources))})'
+            params.extend(sources)
+        if ord_range is not None:
+            sql += ' AND c.ord >= ? AND c.ord < ?'
+            params.extend(ord_range)
+        sql += ' GROUP BY k.case_id ORDER BY score DESC, k.case_id LIMIT ?'
+        params.append(max_results)
+        return [(source, json.loads(item_json))
+                for source, item_json, _ in self.connection().execute(sql, params)]
+
+    def case_provenance(self, key):
+        """record_key가 같은 사례의 원본 위치 [(source, 원본 순번), ...] (중복이 없으면 빈 리스트)"""
+        return [(source, ord_idx) for source, ord_idx in self.connection().execute(
+            'SELECT source, ord FROM case_duplicates WHERE record_key = ? ORDER BY rowid', (key,))]
+
+    def tariff_rows(self):
+        """관세율표 전체 (hstable.json과 같은 키의 딕셔너리 목록)"""
+        return [{'품목번호': hs_code, '영문품명': english_name, '한글품명': korean_name}
+                for hs_code, english_name, korean_name in
+                self.connection().execute('SELECT hs_code, english_name, korean_name FROM tariff ORDER BY id')]
+
+    def tariff_by_prefix(self, prefixes):
+        """품목번호가 prefixes 중 하나로 시작하는 첫 행 (파일 순서 기준)"""
+        clauses, params = [], []
+        for prefix in prefixes:
+            if not prefix:
+                continue
+            # 접두어 조회를 인덱스 범위 검색으로 변환 (prefix <= 값 < 다음 문자열)
+            clauses.append('(hs_code >= ? AND hs_code < ?)')
+            params.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+        if not clauses:
+            return None
+        row = self.connection().execute(
+            f'SELECT hs_code, english_name, korean_name FROM tariff WHERE {" OR ".join(clauses)} ORDER BY id LIMIT 1',
+            params).fetchone()
+        if row is None:
+            return None
+        return {'품목번호': row[0], '영문품명': row[1], '한글품명': row[2]}
+
+    def notes(self):
+        """해설서 그룹 전체 (grouped_11_end.json 순서)"""
+        return [json.loads(item_json) for item_json, in
+                self.connection().execute('SELECT item_json FROM notes ORDER BY id')]
+
+    def note_by_header2(self, header2):
+        row = self.connection().execute(
+            'SELECT item_json FROM notes WHERE header2 = ? ORDER BY id LIMIT 1', (header2,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def note_by_part(self, part_key):
+        """header1이 part_key와 같은 첫 부(部) 항목"""
+        row = self.connection().execute(
+            'SELECT item_json FROM notes WHERE header1 = ? AND header1_norm = ? ORDER BY id LIMIT 1',
+            (part_key, part_key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def search_notes(self, keywords, limit=10):
+        """
+        해설서 부분 문자열 검색 (direct_manual_search와 같은 점수: 포함된 키워드 수)
+        - 3자 이상 키워드는 FTS5 trigram 색인, 2자 키워드는 instr 검색
+        Returns:
+            [(item, score), ...] 점수 내림차순 (동점은 파일 순서)
+        """
+        conn = self.connection()
+        scores = {}
+        for keyword in keywords:
+            keyword = keyword.lower()
+            if len(keyword) >= 3:
+                rows = conn.execute('SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?', (_fts_phrase(keyword),))
+            else:
+                rows = conn.execute('SELECT id FROM notes WHERE instr(search_text, ?) > 0', (keyword,))
+            for (note_id,) in rows:
+                scores[note_id] = scores.get(note_id, 0) + 1
+        if not scores:
+            return []
+
+        top = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:limit]
+        ids = [note_id for note_id, _ in top]
+        items = dict(conn.execute(
+            f'SELECT id, item_json FROM notes WHERE id IN ({",".join("?" * len(ids))})', ids))
+        return [(json.loads(items[note_id]), score) for note_id, score in top]
+
+
+_db_lock = threading.Lock()
+_db_instance = None
+
+
+def get_knowledge_db():
+    """
+    HS_KNOWLEDGE_DB 환경 변수로 지정한 데이터베이스 (프로세스당 한 번만 열기)
+    - 환경 변수가 없거나 파일이 없으면 None (JSON 메모리 로드 사용)
+    """
+    global _db_instance
+    path = os.getenv('HS_KNOWLEDGE_DB')
+    if not path:
+        return None
+    with _db_lock:
+        if _db_instance is None or _db_instance.path != path:
+            try:
+                _db_instance = KnowledgeDB(path)
+            except FileNotFoundError:
+                print(f"Warning: knowledge DB {path} not found, using JSON files")
+                return None
+        return _db_instance
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HS 챗봇 SQLite 지식 데이터베이스")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="knowledge/ JSON 파일로 데이터베이스 생성")
+    build.add_argument('--out', default='knowledge/knowledge.db', help="생성할 데이터베이스 파일")
+    build.add_argument('--knowledge-dir', default='knowledge', help="원본 JSON 폴더")
+    info = sub.add_parser('info', help="데이터베이스 정보 출력")
+    info.add_argument('db', nargs='?', default='knowledge/knowledge.db')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        start = time.time()
+        counts = build_database(args.out, args.knowledge_dir)
+        size_mb = os.path.getsize(args.out) / 1024 / 1024
+        print(f"생성 완료: {args.out} ({size_mb:.1f}MB, {time.time() - start:.1f}s)")
+        for table, count in counts.items():
+            print(f"  {table}: {count}")
+    else:
+        db = KnowledgeDB(args.db)
+        for key, value in db.meta.items():
+            print(f"{key}: {value}")
+        for source, count in db.source_counts.items():
+            print(f"  {source}: {count}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""
+분류사례 키워드 인덱스 (세그먼트 + 스냅샷, 재시작 없는 지식 파일 갱신)
+- knowledge/ 폴더의 분류사례 파일을 패턴으로 찾아 로드 (knowledge_db.discover_case_files)
+- 파일 단위로 (수정 시각, 크기)를 기록하고, 새로 생기거나 바뀐 파일만 델타 세그먼트로 인덱싱
+- 여러 파일에 있는 같은 사례(reference_id, 없으면 내용 해시)는 처음 나온 source에만 남기고 출처 목록(provenance)을 기록
+- 세그먼트는 백그라운드 스레드에서 하나로 병합
+- 검색은 요청 시작 시점의 스냅샷(데이터 + 세그먼트 목록)만 사용하고, 갱신/병합은 새 스냅샷을 만들어 참조를 교체
+  → 처리 중인 질문은 끝날 때까지 같은 데이터를 봄
+
+파일별 사례 수 / 중복 제거 결과 확인:
+    python knowledge_index.py --knowledge-dir knowledge
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import defaultdict
+
+from knowledge_db import (discover_case_files, extract_keywords, deduplicate_sources, dedup_report,
+                          FIXED_CASE_FILES)
+
+# 국내 분류사례 Multi-Agent 그룹 수 (search_domestic_group)
+DOMESTIC_GROUP_COUNT = 5
+COMMITTEE_SOURCES = ['knowledge/HS위원회', 'knowledge/HS협의회']
+OVERSEAS_SOURCES = ['hs_classification_data_us', 'hs_classification_data_eu']
+CASE_PART_PREFIX = 'HS분류사례_part'
+
+
+def domestic_group_sources(sources, group_count=DOMESTIC_GROUP_COUNT):
+    """
+    국내 분류사례 source를 그룹별로 분배
+    - HS분류사례_part<N>: (N - 1) // 2 % group_count 번 그룹 (part1~10은 두 개씩, 이후 파트는 첫 그룹부터 다시)
+    - 위원회/협의회 결정: 마지막 그룹
+    Returns:
+        [[source, ...], ...] (group_count개)
+    """
+    groups = [[] for _ in range(group_count)]
+    for source in sources:
+        if source.startswith(CASE_PART_PREFIX):
+            number = int(source[len(CASE_PART_PREFIX):])
+            groups[(number - 1) // 2 % group_count].append(source)
+    groups[-1].extend(source for source in COMMITTEE_SOURCES if source in sources)
+    return groups
+
+
+def is_domestic_source(source):
+    return source.startswith(CASE_PART_PREFIX) or source in COMMITTEE_SOURCES
+
+
+def is_overseas_source(source):
+    return source in OVERSEAS_SOURCES
+
+
+def domestic_sources(sources):
+    """국내 분류사례 + 위원회/협의회 source 목록"""
+    return [source for source in sources if is_domestic_source(source)]
+
+
+# HSDataManager가 따로 지연 로드하는 분류사례 묶음 (이름 → source 포함 여부, 검색 시 이 순서로 결과 병합)
+CORPUS_FILTERS = {'domestic': is_domestic_source, 'overseas': is_overseas_source}
+
+
+class IndexSegment:
+    """source 몇 개에 대한 키워드 → [(source, item)] 역색인 (만든 뒤에는 변경하지 않음)"""
+
+    def __init__(self, sources, index):
+        self.sources = frozenset(sources)
+        self.index = index
+
+    @classmethod
+    def build(cls, data):
+        """{source: items} → 세그먼트 (source 순서대로 항목 추가)"""
+        index = defaultdict(list)
+        for source, items in data.items():
+            for item in items:
+                for keyword in extract_keywords(str(item)):
+                    index[keyword].append((source, item))
+        return cls(data.keys(), dict(index))
+
+
+class KnowledgeSnapshot:
+    """
+    특정 시점의 분류사례 데이터와 세그먼트 목록 (읽기 전용)
+    Attributes:
+        version: 데이터가 바뀔 때마다 1씩 증가 (세그먼트 병합만 한 경우는 그대로)
+        files: {파일 경로: (source, 수정 시각 ns, 크기)}
+        raw: {source: 파일 원본 items}
+        data: {source: 중복 제거된 items} (source 순서 = 파일 탐색 순서)
+        segments: [(IndexSegment, 유효한 source 집합)] - 바뀐 파일의 이전 세그먼트 항목은 유효 집합에서 제외
+        provenance: {record_key: [(source, 원본 순번), ...]} 두 곳 이상에 있는 사례의 출처
+        dedup: 중복 제거 요약 (knowledge_db.dedup_report)
+        fingerprint: 파일 상태 해시 (검색 캐시 키 등 데이터 식별용)
+    """
+
+    def __init__(self, version, files, raw, data, segments, provenance=None, dedup=None):
+        self.version = version
+        self.files = files
+        self.raw = raw
+        self.data = data
+        self.segments = segments
+        self.provenance = provenance or {}
+        self.dedup = dedup or {}
+        # 파일 상태(경로, 수정 시각, 크기) 기반 데이터 식별자 (같은 파일이면 인스턴스가 달라도 같은 값)
+        self.fingerprint = hashlib.sha1(repr(sorted(files.items())).encode('utf-8')).hexdigest()[:16]
+
+    def postings(self, keyword):
+        """키워드가 포함된 (source, item) 목록 (세그먼트 순서)"""
+        if len(self.segments) == 1:
+            segment, live = self.segments[0]
+            if live == segment.sources:
+                return segment.index.get(keyword, [])
+        return [posting for segment, live in self.segments
+                for posting in segment.index.get(keyword, []) if posting[0] in live]
+
+    def source_count(self, source):
+        return len(self.data.get(source, []))
+
+
+def _file_state(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _same_items(a, b):
+    """같은 항목 객체 목록인지 (파일을 다시 읽지 않았으면 항목 객체가 그대로 유지됨)"""
+    return len(a) == len(b) and all(x is y for x, y in zip(a, b))
+
+
+def _load_items(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class KnowledgeIndex:
+    """
+    분류사례 인덱스 관리자
+    - reload(): 파일 변경 확인 후 바뀐 파일만 델타 세그먼트로 추가하고 새 스냅샷으로 교체
+    - 세그먼트가 2개 이상이면 백그라운드에서 병합 (병합 중 다른 갱신이 있으면 다시 병합)
+    - start_watcher(interval): interval초마다 reload() 실행하는 데몬 스레드
+    - source_filter: 이 인덱스가 담당할 source만 로드 (예: is_domestic_source, 국내/해외 인덱스를 따로 지연 로드)
+    """
+
+    def __init__(self, knowledge_dir='knowledge', background_merge=True, source_filter=None):
+        self.knowledge_dir = knowledge_dir
+        self.background_merge = background_merge
+        self.source_filter = source_filter
+        self._lock = threading.Lock()
+        self._merge_thread = None
+        self._watch_stop = None
+        self.snapshot = KnowledgeSnapshot(0, {}, {}, {}, [])
+
+        names = {os.path.basename(path) for _, path in discover_case_files(knowledge_dir)}
+        for source, name in FIXED_CASE_FILES:
+            if name not in names and (source_filter is None or source_filter(source)):
+                print(f'Warning: {name} not found')
+        self.reload()
+
+    def _scan(self):
+        """현재 파일 목록 {경로: (source, 수정 시각 ns, 크기)}"""
+        files = {}
+        for source, path in discover_case_files(self.knowledge_dir):
+            if self.source_filter is not None and not self.source_filter(source):
+                continue
+            try:
+                files[path] = (source, *_file_state(path))
+            except FileNotFoundError:
+                continue
+        return files
+
+    def reload(self):
+        """
+        새로 생기거나 바뀌거나 삭제된 파일을 반영
+        Returns:
+            {'added': [...], 'changed': [...], 'removed': [...], 'version': 스냅샷 버전, 'duplicates': 제거된 중복 사례 수}
+        """
+        with self._lock:
+            current = self.snapshot
+            files = self._scan()
+            added = [path for path in files if path not in current.files]
+            changed = [path for path in files if path in current.files and files[path] != current.files[path]]
+            removed = [path for path in current.files if path not in files]
+            if not (added or changed or removed):
+                return {'added': [], 'changed': [], 'removed': [], 'version': current.version,
+                        'duplicates': current.dedup.get('duplicates', 0)}
+
+            loaded = {}
+            for path in added + changed:
+                try:
+                    loaded[files[path][0]] = _load_items(path)
+                except (OSError, ValueError) as e:
+                    # 복사 중인 파일 등은 이전 상태를 유지하고 다음 확인 때 다시 시도
+                    print(f'Warning: {path} load failed ({e}), keeping previous version')
+                    if path in current.files:
+                        files[path] = current.files[path]
+                    else:
+                        del files[path]
+                    if path in added:
+                        added.remove(path)
+                    else:
+                        changed.remove(path)
+
+            order = [source for source, *_ in files.values()]
+            raw = {source: loaded[source] if source in loaded else current.raw[source] for source in order}
+            data, provenance, duplicates = deduplicate_sources(raw)
+            report = dedup_report(raw, duplicates)
+
+            # 다시 인덱싱할 source: 새로 읽은 파일 + 다른 파일 변경으로 중복 제거 결과가 달라진 source
+            reindex = set(loaded) | {source for source in order
+                                     if source in current.data and not _same_items(data[source], current.data[source])}
+            stale = {current.files[path][0] for path in changed + removed} | reindex
+            segments = [(segment, live - stale) for segment, live in current.segments if live - stale]
+            if reindex:
+                delta = {source: data[source] for source in order if source in reindex}
+                segments.append((IndexSegment.build(delta), frozenset(delta)))
+
+            self.snapshot = KnowledgeSnapshot(current.version + 1, files, raw, data, segments, provenance, report)
+            summary = {'added': added, 'changed': changed, 'removed': removed, 'version': self.snapshot.version,
+                       'duplicates': report['duplicates']}
+        if current.version:
+            print(f"Knowledge reload v{summary['version']}: +{len(added)} ~{len(changed)} -{len(removed)} files, "
+                  f"{len(segments)} segments")
+        if report['duplicates']:
+            print(f"Knowledge dedup: removed {report['duplicates']} of {report['records']} records "
+                  f"({report['postings']} postings) {report['by_source']}")
+        if len(segments) > 1:
+            self._schedule_merge()
+        return summary
+
+    def _schedule_merge(self):
+        if not self.background_merge:
+            self.merge()
+            return
+        with self._lock:
+            if self._merge_thread is not None:
+                return  # 실행 중인 병합 스레드가 최신 스냅샷까지 병합
+            self._merge_thread = threading.Thread(target=self.merge, name='knowledge-merge', daemon=True)
+            self._merge_thread.start()
+
+    def merge(self):
+        """
+        현재 스냅샷의 세그먼트를 하나로 병합 (유효 항목만, source 순서 유지)
+        - 병합 중 스냅샷이 바뀌면 바뀐 스냅샷으로 다시 병합
+        Returns:
+            병합된 스냅샷 버전
+        """
+        while True:
+            with self._lock:
+                base = self.snapshot
+                if len(base.segments) <= 1:
+                    self._merge_thread = None
+                    return base.version
+            rank = {source: i for i, source in enumerate(base.data)}
+            index = defaultdict(list)
+            for segment, live in base.segments:
+                for keyword, postings in segment.index.items():
+                    index[keyword].extend(posting for posting in postings if posting[0] in live)
+            for postings in index.values():
+                postings.sort(key=lambda posting: rank[posting[0]])
+            merged = IndexSegment(base.data.keys(), dict(index))
+
+            with self._lock:
+                if self.snapshot is base:
+                    self.snapshot = KnowledgeSnapshot(base.version, base.files, base.raw, base.data,
+                                                      [(merged, merged.sources)], base.provenance, base.dedup)
+
+    def start_watcher(self, interval=60.0):
+        """interval초마다 파일 변경 확인 (이미 실행 중이면 무시)"""
+        if self._watch_stop is not None:
+            return
+        self._watch_stop = threading.Event()
+
+        def watch(stop):
+            while not stop.wait(interval):
+                try:
+                    self.reload()
+                except Exception as e:
+                    print(f"Knowledge reload error: {e}")
+
+        threading.Thread(target=watch, args=(self._watch_stop,), name='knowledge-watcher', daemon=True).start()
+
+    def stop_watcher(self):
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_stop = None
+
+    def wait_for_merge(self, timeout=None):
+        """백그라운드 병합 완료 대기 (테스트/벤치마크용)"""
+        thread = self._merge_thread
+        if thread is not None:
+            thread.join(timeout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="분류사례 파일 탐색 및 중복 제거 결과 확인")
+    parser.add_argument('--knowledge-dir', default='knowledge', help="분류사례 JSON 폴더")
+    args = parser.parse_args(argv)
+
+    snapshot = KnowledgeIndex(args.knowledge_dir, background_merge=False).snapshot
+    print(f"{'source':<30}{'원본':>7}{'유지':>7}  파일")
+    for path, (source, _, _) in snapshot.files.items():
+        print(f"{source:<30}{len(snapshot.raw[source]):>7}{len(snapshot.data[source]):>7}  {path}")
+    report = snapshot.dedup
+    print(f"\n전체 {report['records']}건 중 중복 {report['duplicates']}건 제거 "
+          f"(키워드 색인 항목 {report['postings']}개 감소)")
+    for key, places in list(snapshot.provenance.items())[:10]:
+        print(f"  {key}: {', '.join(f'{source}#{ord_idx}' for source, ord_idx in places)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+API 서버 부하 테스트 스크립트
+- 기본값: 가짜 LLM을 사용하는 API 서버를 같은 프로세스에서 띄운 뒤 부하를 발생
+- --url 지정 시 이미 실행 중인 서버에 부하를 발생
+- 지속 처리량(성공 요청/초), 429 거절 수, 응답 지연 분포 출력
+
+실행 예:
+    python loadtest.py --clients 16 --duration 30 --llm-latency 0.5 --workers 4
+    python loadtest.py --url http://127.0.0.1:8000 --q-type overseas_hs
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+# 부하 테스트용 질문 (국내 분류사례의 대표 품명)
+SAMPLE_QUERIES = [
+    "프로틴 파우더의 HS 코드는?",
+    "플라스틱 용기 분류",
+    "무선 이어폰 HS 분류",
+    "섬유유연제 시트",
+    "리튬이온 배터리의 HS 코드가 무엇인가요?",
+    "자동차 엔진 부품의 HS코드",
+]
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * (len(ordered) - 1)))]
+
+
+def run_load(url, q_type, clients, duration):
+    """clients개의 스레드가 duration초 동안 요청을 반복"""
+    statuses = Counter()
+    latencies = []
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client_loop(client_idx):
+        i = client_idx
+        while time.time() < stop_at:
+            body = json.dumps({'query': SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]}).encode('utf-8')
+            request = urllib.request.Request(f"{url}/api/{q_type}", data=body,
+                                             headers={'Content-Type': 'application/json'})
+            start = time.time()
+            try:
+                with urllib.request.urlopen(request, timeout=600) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except Exception:
+                status = 'conn_error'
+            elapsed = time.time() - start
+            with lock:
+                statuses[status] += 1
+                if status == 200:
+                    latencies.append(elapsed)
+            if status == 429:
+                # 서버가 알려준 Retry-After 대신 짧게 대기 후 재시도 (최대 부하 유지)
+                time.sleep(0.05)
+            i += clients
+
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(clients)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.time() - start
+
+    latencies.sort()
+    return {
+        'wall_time': wall,
+        'statuses': dict(statuses),
+        'rps': statuses[200] / wall if wall > 0 else 0.0,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'max': latencies[-1] if latencies else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HS 챗봇 API 부하 테스트")
+    parser.add_argument('--url', help="대상 서버 URL (미지정 시 가짜 LLM 서버를 내부에서 실행)")
+    parser.add_argument('--q-type', default='hs_classification')
+    parser.add_argument('--clients', type=int, default=16, help="동시 클라이언트 수")
+    parser.add_argument('--duration', type=float, default=20, help="부하 지속 시간 (초)")
+    parser.add_argument('--llm-latency', type=float, default=0.5, help="가짜 LLM 호출당 지연 (초)")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--queue-size', type=int, default=8)
+    parser.add_argument('--answer-cache', action='store_true',
+                        help="내부 서버의 최종 답변 캐시 사용 (기본: 끔 - 같은 질문 반복이 캐시 적중으로 측정되지 않도록)")
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if not url:
+        import utils
+        from fake_llm import FakeLLMClient
+        from api_server import create_server
+        from answer_cache import ANSWER_CACHE
+        utils.client = FakeLLMClient(latency=args.llm_latency, sigma=0.2, seed=0)
+        if not args.answer_cache:
+            ANSWER_CACHE.max_entries = 0
+        server = create_server('127.0.0.1', 0, None, args.workers, args.queue_size)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        print(f"가짜 LLM 서버 실행: {url} (LLM 지연 {args.llm_latency}s, workers={args.workers}, queue={args.queue_size})")
+
+    print(f"부하 발생: {args.clients} clients × {args.duration}s → {url}/api/{args.q_type}")
+    result = run_load(url, args.q_type, args.clients, args.duration)
+
+    print("\n=== 부하 테스트 결과 ===")
+    print(f"상태 코드: {result['statuses']}")
+    print(f"지속 처리량: {result['rps']:.2f} req/s ({result['wall_time']:.1f}s)")
+    print(f"응답 지연(200): p50 {result['p50']:.2f}s | p95 {result['p95']:.2f}s | max {result['max']:.2f}s")
+
+    if server is not None:
+        server.shutdown()
+        server.app.executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,24 @@
 import streamlit as st
-from google import genai
 import time
+import threading
+from abc import abstractmethod
+from collections import deque
 from datetime import datetime
 
 import os
 from dotenv import load_dotenv
-from utils import HSDataManager, extract_hs_codes, clean_text, classify_question
+from utils import HSDataManager, extract_hs_codes, clean_text, classify_question, warm_up
+from utils import QueryPrefetch, prefetched, describe_prefetch, answer_with_cache
+from answer_cache import ANSWER_CACHE, cache_notice, admin_token_ok
+from model_router import USAGE_LEDGER, request_usage, describe_usage
 from utils import handle_web_search, handle_hs_classification_cases, handle_overseas_hs, get_hs_explanations, handle_hs_manual_with_parallel_search, handle_hs_manual_with_user_codes
+from progress import ProgressSink, LogEvent, StageStart, StageEnd, GroupResult, CandidateList
+from tracing import span, set_attributes, start_metrics_server
+from chat_store import open_chat_window
 
-# 환경 변수 로드 (.env 파일에서 API 키 등 설정값 로드)
+# 환경 변수 로드 (.env 파일에서 API 키 등 설정값 로드, Gemini 클라이언트는 utils에서 첫 호출 때 생성)
 load_dotenv()
 
-# Gemini API 설정
-GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-client = genai.Client(api_key=GOOGLE_API_KEY)
-
 # Streamlit 페이지 설정
 st.set_page_config(
     page_title="HS 품목분류 챗봇",  # 브라우저 탭 제목
@@ -44,18 +48,34 @@ st.markdown("""
 # HS 데이터 매니저 초기화 (캐싱을 통해 성능 최적화)
 @st.cache_resource
 def get_hs_manager():
-    return HSDataManager()
+    hs_manager = HSDataManager()
+    # 분류사례 파일 추가/변경 시 재시작 없이 반영 (HS_KNOWLEDGE_RELOAD_SECONDS, 0이면 끔)
+    hs_manager.start_watcher(float(os.getenv('HS_KNOWLEDGE_RELOAD_SECONDS', '60')))
+    return hs_manager
 
-# 세션 상태 초기화
-if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []  # 채팅 기록 저장
+# Prometheus 지표 엔드포인트 (HS_METRICS_PORT 지정 시 프로세스당 한 번만 실행)
+@st.cache_resource
+def get_metrics_server():
+    port = os.getenv('HS_METRICS_PORT')
+    if not port:
+        return None
+    return start_metrics_server(int(port))
 
-if 'selected_category' not in st.session_state:
-    st.session_state.selected_category = "AI자동분류"  # 기본값
+get_metrics_server()
 
-if 'context' not in st.session_state:
-    # 초기 컨텍스트 설정
-    st.session_state.context = """당신은 HS 품목분류 전문가로서 관세청에서 오랜 경력을 가진 전문가입니다. 사용자가 물어보는 품목에 대해 아래 네 가지 유형 중 하나로 질문을 분류하여 답변해주세요.
+# 데이터/클라이언트 백그라운드 미리 로드 (화면은 바로 표시, HS_WARM_UP=0이면 첫 질문 때 필요한 것만 로드)
+@st.cache_resource
+def start_warm_up():
+    if os.getenv('HS_WARM_UP', '1') == '0':
+        return None
+    thread = threading.Thread(target=warm_up, args=(get_hs_manager(),), name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+start_warm_up()
+
+# 기본 컨텍스트 (질문마다 최근 대화 창의 내용을 뒤에 붙여 사용)
+CHAT_CONTEXT = """당신은 HS 품목분류 전문가로서 관세청에서 오랜 경력을 가진 전문가입니다. 사용자가 물어보는 품목에 대해 아래 네 가지 유형 중 하나로 질문을 분류하여 답변해주세요.
 
 질문 유형:
 1. 웹 검색(Web Search): 물품개요, 용도, 기술개발, 무역동향 등 일반 정보 탐색이 필요한 경우.
@@ -73,20 +93,113 @@ if 'context' not in st.session_state:
 지금까지의 대화:
 """
 
-if 'ai_analysis_results' not in st.session_state:
-    st.session_state.ai_analysis_results = []
+# 세션 상태 초기화
+# - 채팅 기록은 SQLite(chat_store.py)에 저장하고 세션에는 최근 메시지 창만 유지
+# - 세션 ID를 URL(?chat=...)에 두어 새로고침해도 같은 대화를 이어감
+if 'chat' not in st.session_state:
+    st.session_state.chat = open_chat_window(st.query_params.get('chat'))
+    st.session_state.history_pages = 0  # 화면에 불러온 이전 대화 페이지 수
+st.query_params['chat'] = st.session_state.chat.session_id
 
-class RealTimeProcessLogger:
-    def __init__(self, container):
+if 'selected_category' not in st.session_state:
+    st.session_state.selected_category = "AI자동분류"  # 기본값
+
+def chat_context():
+    """기본 컨텍스트 + 최근 대화 창 (전체 대화를 세션에 누적하지 않음)"""
+    return CHAT_CONTEXT + st.session_state.chat.transcript()
+
+class StreamlitSinkBase(ProgressSink):
+    """
+    Streamlit 화면에 그리는 sink 공통 처리
+    - Streamlit 호출은 스크립트 실행 스레드에서만 가능하므로, 다른 스레드(워커)에서 온 이벤트는
+      보관했다가 스크립트 스레드의 다음 이벤트나 flush() 때 그림
+    - 채팅 기록에 답변과 함께 저장할 분석 과정(그룹 분석 결과, 해설서 후보 요약)을 analysis에 모음
+    """
+    def __init__(self):
+        self._owner_thread = threading.get_ident()
+        self._pending = deque()
+        self.analysis = {}
+    
+    def emit(self, event):
+        if threading.get_ident() != self._owner_thread:
+            self._pending.append(event)
+            return
+        self._drain()
+        self._render(event)
+    
+    def _render(self, event):
+        self.collect(event)
+        with span('render', event=event.kind):
+            self.handle(event)
+    
+    def collect(self, event):
+        """채팅 기록에서 다시 보여 줄 분석 과정 저장 (화면 표시에 필요한 항목만)"""
+        if isinstance(event, GroupResult):
+            self.analysis.setdefault('groups', []).append({
+                'type': event.agent_type,
+                'group_id': event.group_id,
+                'answer': event.answer,
+                'start_time': event.start_time,
+                'processing_time': event.processing_time
+            })
+        elif isinstance(event, CandidateList) and event.stage == 'summary':
+            self.analysis['candidates'] = [
+                {key: result.get(key) for key in ('hs_code', 'confidence', 'final_score', 'sources', 'tariff_name')}
+                | {'manual_summary': (result.get('manual_summary') or '')[:200]}
+                for result in event.candidates
+            ]
+    
+    def _drain(self):
+        while self._pending:
+            self._render(self._pending.popleft())
+    
+    def flush(self):
+        if threading.get_ident() == self._owner_thread:
+            self._drain()
+    
+    @abstractmethod
+    def handle(self, event):
+        """이벤트 하나를 화면에 그림 (스크립트 실행 스레드에서만 호출됨)"""
+
+
+class RealTimeProcessLogger(StreamlitSinkBase):
+    """실시간 처리 로그 패널 (로그가 몰려도 min_interval 간격으로만 다시 그림)"""
+    
+    def __init__(self, container, min_interval=0.3):
+        super().__init__()
         self.container = container
         self.log_placeholder = container.empty()
         self.logs = []
         self.start_time = time.time()
+        self.min_interval = min_interval
+        self._last_draw = 0.0
+        self._dirty = False
+    
+    def handle(self, event):
+        """진행 이벤트를 로그 한 줄로 변환하여 기록"""
+        if isinstance(event, LogEvent):
+            level, message, data = event.level, event.message, event.data
+        elif isinstance(event, StageStart):
+            level, message, data = "INFO", event.message or f"Stage '{event.stage}' started", None
+        elif isinstance(event, StageEnd):
+            level = "ERROR" if event.status == 'error' else "SUCCESS"
+            message = event.message or f"Stage '{event.stage}' completed"
+            data = f"{event.elapsed:.2f}s" if event.elapsed is not None else None
+        elif isinstance(event, GroupResult):
+            level, message = "AI", f"Group {event.group_id + 1} ({event.agent_type}) completed"
+            data = f"{event.processing_time:.1f}s, {len(event.answer)} chars"
+        elif isinstance(event, CandidateList):
+            level, message = "DATA", f"{len(event.candidates)} HS code candidates ({event.stage})"
+            data = ", ".join(str(c.get('hs_code')) for c in event.candidates)
+        else:
+            return
+        self.add_log(level, message, data, event.ts)
     
-    def log_actual(self, level, message, data=None):
+    def add_log(self, level, message, data=None, ts=None):
         """실제 진행 상황만 기록"""
-        elapsed = time.time() - self.start_time
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        ts = ts or time.time()
+        elapsed = ts - self.start_time
+        timestamp = datetime.fromtimestamp(ts).strftime("%H:%M:%S.%f")[:-3]
         
         log_entry = {
             "time": timestamp,
@@ -96,7 +209,11 @@ class RealTimeProcessLogger:
             "data": data
         }
         self.logs.append(log_entry)
-        self.update_display()
+        self._dirty = True
+        
+        # 직전 갱신 후 min_interval이 지났을 때만 다시 그림 (나머지는 flush 시 반영)
+        if time.time() - self._last_draw >= self.min_interval:
+            self.update_display()
     
     def update_display(self):
         log_text = ""
@@ -108,99 +225,235 @@ class RealTimeProcessLogger:
             log_text += f"`{log['time']}` `+{log['elapsed']}` {icon} {log['message']}{data_str}\n\n"
         
         self.log_placeholder.markdown(log_text)
+        self._last_draw = time.time()
+        self._dirty = False
+    
+    def flush(self):
+        super().flush()
+        if self._dirty:
+            self.update_display()
     
     def clear(self):
         self.logs = []
         self.log_placeholder.empty()
 
 
-def process_query_with_real_logging(user_input):
-    """실제 진행사항을 기록하면서 쿼리 처리"""
+class StreamlitProgressSink(StreamlitSinkBase):
+    """분석 과정 패널(expander)에 진행 이벤트를 그리는 sink"""
     
-    log_container = st.container()
-    logger = RealTimeProcessLogger(log_container)
+    def __init__(self, container):
+        super().__init__()
+        self.container = container
+        self.root_stage = None
+        self.progress_bar = None
+        self.results_container = None
+        self.progress_value = 0.0
     
-    try:
-        logger.log_actual("INFO", "Query processing started", f"Input length: {len(user_input)}")
-        
-        start_time = time.time()
-        hs_manager = get_hs_manager()
-        load_time = time.time() - start_time
-        logger.log_actual("SUCCESS", "HSDataManager loaded", f"{load_time:.2f}s")
+    def _set_progress(self, value, text):
+        if value is not None:
+            self.progress_value = value
+        if self.progress_bar is not None:
+            self.progress_bar.progress(self.progress_value, text=text)
+    
+    def handle(self, event):
+        if isinstance(event, StageStart):
+            if self.root_stage is None:
+                # 첫 단계 시작: 분석 패널 구성
+                self.root_stage = event.stage
+                with self.container:
+                    st.info(event.message)
+                    self.progress_bar = st.progress(0, text="분석 준비 중...")
+                    self.results_container = st.container()
+            else:
+                self._set_progress(event.progress, event.message)
         
-        category = st.session_state.selected_category
-        logger.log_actual("INFO", "Category selected", category)
+        elif isinstance(event, StageEnd):
+            if event.stage == self.root_stage:
+                self._set_progress(1.0, "분석 완료!")
+                with self.container:
+                    st.success(event.message)
+                    st.info("📋 **패널을 접고 아래에서 최종 답변을 확인하세요**")
+            elif event.status == 'error':
+                self._set_progress(1.0, "분석 완료!")
+                with self.results_container:
+                    st.error(event.message)
+            elif event.message:
+                self._set_progress(event.progress, event.message.replace('*', ''))
+                with self.results_container:
+                    st.success(event.message)
+            elif event.progress is not None:
+                self._set_progress(event.progress, "진행 중...")
         
-        if category == "AI자동분류":
-            logger.log_actual("AI", "Starting LLM question classification...")
-            start_classify = time.time()
-            q_type = classify_question(user_input)
-            classify_time = time.time() - start_classify
-            logger.log_actual("SUCCESS", "LLM classification completed", f"{q_type} in {classify_time:.2f}s")
-        else:
-            category_mapping = {
-                "웹검색": "web_search",
-                "국내HS분류사례 검색": "hs_classification", 
-                "해외HS분류사례검색": "overseas_hs",
-                "HS해설서분석": "hs_manual",
-                "HS해설서원문검색": "hs_manual_raw"
-            }
-            q_type = category_mapping.get(category, "hs_classification")
-            logger.log_actual("INFO", "Question type mapped", q_type)
-
-        answer_start = time.time()
+        elif isinstance(event, GroupResult):
+            emoji = "🤖" if event.agent_type == 'domestic' else "🌐"
+            with self.results_container:
+                st.success(f"{emoji} **그룹 {event.group_id+1} AI 분석 완료** ({event.processing_time:.1f}초)")
+                with st.container():
+                    st.write(f"⏰ {event.start_time}")
+                    st.markdown(f"**분석 결과:**")
+                    st.info(event.answer)
+                    st.divider()
+            self._set_progress(event.completed / event.total, f"완료: {event.completed}/{event.total} 그룹")
         
-        if q_type == "web_search":
-            logger.log_actual("SEARCH", "Initiating Google Search API call...")
-            ai_start = time.time()
-            answer = "\n\n +++ 웹검색 실시 +++\n\n" + handle_web_search(user_input, st.session_state.context, hs_manager)
-            ai_time = time.time() - ai_start
-            logger.log_actual("SUCCESS", "Web search completed", f"{ai_time:.2f}s, {len(answer)} chars")
+        elif isinstance(event, CandidateList):
+            self.render_candidates(event)
+    
+    def render_candidates(self, event):
+        with self.results_container:
+            if event.stage == 'user_codes':
+                st.markdown("### 📊 **HS코드별 상세 정보**")
+                for item in event.candidates:
+                    st.markdown(f"#### 🔢 **HS코드: {item['hs_code']}**")
+                    col1, col2 = st.columns([1, 1])
+                    with col1:
+                        if item.get('korean_name') is not None:
+                            st.write(f"**📋 국문품명**: {item.get('korean_name') or 'N/A'}")
+                            st.write(f"**📋 영문품명**: {item.get('english_name') or 'N/A'}")
+                    with col2:
+                        if item.get('manual_collected'):
+                            st.write(f"**📚 해설서**: 수집 완료")
+                            if item.get('summary_used'):
+                                st.write(f"**🤖 요약**: 적용됨")
+                    st.divider()
+                return
+            
+            if event.stage == 'search':
+                st.success("✅ **병렬 검색 완료**")
+                st.markdown("### 🎯 **상위 HS코드 후보 선정**")
+            else:
+                st.success("✅ **해설서 내용 요약 완료**")
+                st.markdown("### 📚 **해설서 요약 결과**")
             
-        elif q_type == "hs_classification":
-            # Multi-Agent 분석 실행 (UI 컨테이너 없이)
-            final_answer = handle_hs_classification_cases(user_input, st.session_state.context, hs_manager, None)
-            answer = "\n\n +++ HS 분류사례 검색 실시 +++\n\n" + final_answer
+            for i, result in enumerate(event.candidates, 1):
+                confidence_color = "🟢" if result['confidence'] == 'HIGH' else "🟡"
+                st.markdown(f"{confidence_color} **후보 {i}: HS코드 {result['hs_code']}** (신뢰도: {result['confidence']})")
+                
+                col1, col2 = st.columns([1, 2])
+                with col1:
+                    st.write(f"**최종점수**: {result['final_score']:.3f}")
+                    st.write(f"**검색경로**: {', '.join(result['sources'])}")
+                with col2:
+                    if result['tariff_name']:
+                        st.write(f"**관세율표 품목명**: {result['tariff_name']}")
+                    if event.stage == 'search':
+                        if result['manual_content']:
+                            st.write(f"**📖 해설서 원문**: 발견됨 (요약 예정)")
+                    elif result.get('manual_summary'):
+                        st.write(f"**📖 해설서 요약**:")
+                        st.text(result['manual_summary'][:300] + "...")
+                    elif result['manual_content']:
+                        st.write(f"**📖 해설서**: 요약 실패 (원문 사용)")
+                
+                st.divider()
+
+
+def answer_cached(q_type, user_input, hs_manager, sink, compute):
+    """
+    최종 답변 캐시를 거쳐 처리 함수 실행
+    - 캐시 적중 시 재사용 안내 문구를 붙이고, 답변과 함께 저장된 분석 과정을 sink.analysis에 넣음
+    """
+    answer, cached = answer_with_cache(q_type, user_input, hs_manager, compute, sink, extra=lambda: dict(sink.analysis))
+    if cached is None:
+        return answer
+    sink.analysis.update(cached['extra'] or {})
+    return cache_notice(cached) + answer
+
+
+def process_query_with_real_logging(user_input):
+    """
+    실제 진행사항을 기록하면서 쿼리 처리
+    Returns:
+        (답변, 채팅 기록에 저장할 분석 과정)
+    """
+    
+    log_container = st.container()
+    logger = RealTimeProcessLogger(log_container)
+    prefetch = None
+    
+    try:
+        with span('request', category=st.session_state.selected_category) as request_span:
+            logger.log_actual("INFO", "Query processing started", f"Input length: {len(user_input)}")
             
-        elif q_type == "overseas_hs":
-            # Multi-Agent 분석 실행 (UI 컨테이너 없이)
-            final_answer = handle_overseas_hs(user_input, st.session_state.context, hs_manager, None)
-            answer = "\n\n +++ 해외 HS 분류 검색 실시 +++\n\n" + final_answer
+            with span('load_data') as load_span:
+                hs_manager = get_hs_manager()
+            logger.log_actual("SUCCESS", "HSDataManager loaded", f"{load_span.duration:.2f}s")
             
-        elif q_type == "hs_manual":
-            logger.log_actual("AI", "Starting enhanced parallel HS manual analysis...")
-            ai_start = time.time()
-            answer = "\n\n +++ HS 해설서 분석 실시 (병렬 검색) +++ \n\n" + handle_hs_manual_with_parallel_search(user_input, st.session_state.context, hs_manager, logger)
-            ai_time = time.time() - ai_start
-            logger.log_actual("SUCCESS", "Enhanced HS manual analysis completed", f"{ai_time:.2f}s, {len(answer)} chars")
+            category = st.session_state.selected_category
+            logger.log_actual("INFO", "Category selected", category)
             
-        elif q_type == "hs_manual_raw":
-            logger.log_actual("SEARCH", "Extracting HS codes...")
-            hs_codes = extract_hs_codes(user_input)
-            if hs_codes:
-                logger.log_actual("SUCCESS", f"Found {len(hs_codes)} HS codes", ", ".join(hs_codes))
-                logger.log_actual("DATA", "Retrieving raw HS explanations...")
-                raw_start = time.time()
-                raw_answer = clean_text(get_hs_explanations(hs_codes))
-                raw_time = time.time() - raw_start
-                answer = "\n\n +++ HS 해설서 원문 검색 실시 +++ \n\n" + raw_answer
-                logger.log_actual("SUCCESS", "Raw HS manual retrieved", f"{raw_time:.2f}s, {len(raw_answer)} chars")
+            if category == "AI자동분류":
+                # 분류 결과와 무관한 로컬 검색은 분류 LLM 호출과 동시에 미리 실행
+                prefetch = QueryPrefetch(user_input, hs_manager).start()
+                logger.log_actual("AI", "Starting LLM question classification...", f"prefetching {len(prefetch.futures)} retrievals")
+                with span('classify') as classify_span:
+                    q_type = classify_question(user_input)
+                logger.log_actual("SUCCESS", "LLM classification completed", f"{q_type} in {classify_span.duration:.2f}s")
             else:
-                logger.log_actual("ERROR", "No valid HS codes found in input")
-                answer = "HS 코드를 찾을 수 없습니다. 4자리 HS 코드를 입력해주세요."
-
-        answer_time = time.time() - answer_start
-        logger.log_actual("SUCCESS", "Answer generation completed", f"{answer_time:.2f}s, {len(answer)} chars")
-        
-        total_time = time.time() - logger.start_time
-        logger.log_actual("INFO", "Process completed successfully", f"Total time: {total_time:.2f}s")
+                category_mapping = {
+                    "웹검색": "web_search",
+                    "국내HS분류사례 검색": "hs_classification", 
+                    "해외HS분류사례검색": "overseas_hs",
+                    "HS해설서분석": "hs_manual",
+                    "HS해설서원문검색": "hs_manual_raw"
+                }
+                q_type = category_mapping.get(category, "hs_classification")
+                logger.log_actual("INFO", "Question type mapped", q_type)
+            set_attributes(q_type=q_type)
+            
+            with span('answer') as answer_span:
+                if q_type == "web_search":
+                    logger.log_actual("SEARCH", "Initiating Google Search API call...")
+                    answer = "\n\n +++ 웹검색 실시 +++\n\n" + handle_web_search(user_input, chat_context(), hs_manager)
+                    logger.log_actual("SUCCESS", "Web search completed", f"{answer_span.duration:.2f}s, {len(answer)} chars")
+                    
+                elif q_type == "hs_classification":
+                    # Multi-Agent 분석 실행 (진행 이벤트는 로그 패널로 표시)
+                    final_answer = answer_cached(q_type, user_input, hs_manager, logger, lambda: handle_hs_classification_cases(
+                        user_input, chat_context(), hs_manager, logger, prefetch))
+                    answer = "\n\n +++ HS 분류사례 검색 실시 +++\n\n" + final_answer
+                    
+                elif q_type == "overseas_hs":
+                    # Multi-Agent 분석 실행 (진행 이벤트는 로그 패널로 표시)
+                    final_answer = answer_cached(q_type, user_input, hs_manager, logger, lambda: handle_overseas_hs(
+                        user_input, chat_context(), hs_manager, logger))
+                    answer = "\n\n +++ 해외 HS 분류 검색 실시 +++\n\n" + final_answer
+                    
+                elif q_type == "hs_manual":
+                    logger.log_actual("AI", "Starting enhanced parallel HS manual analysis...")
+                    answer = "\n\n +++ HS 해설서 분석 실시 (병렬 검색) +++ \n\n" + answer_cached(q_type, user_input, hs_manager, logger, lambda: handle_hs_manual_with_parallel_search(
+                        user_input, chat_context(), hs_manager, logger, prefetch))
+                    logger.log_actual("SUCCESS", "Enhanced HS manual analysis completed", f"{answer_span.duration:.2f}s, {len(answer)} chars")
+                    
+                elif q_type == "hs_manual_raw":
+                    logger.log_actual("SEARCH", "Extracting HS codes...")
+                    hs_codes = prefetched(prefetch, 'hs_codes', lambda: extract_hs_codes(user_input))
+                    if hs_codes:
+                        logger.log_actual("SUCCESS", f"Found {len(hs_codes)} HS codes", ", ".join(hs_codes))
+                        logger.log_actual("DATA", "Retrieving raw HS explanations...")
+                        with span('retrieval.raw_manual', codes=len(hs_codes)) as raw_span:
+                            raw_answer = clean_text(get_hs_explanations(hs_codes, user_input))
+                        answer = "\n\n +++ HS 해설서 원문 검색 실시 +++ \n\n" + raw_answer
+                        logger.log_actual("SUCCESS", "Raw HS manual retrieved", f"{raw_span.duration:.2f}s, {len(raw_answer)} chars")
+                    else:
+                        logger.log_actual("ERROR", "No valid HS codes found in input")
+                        answer = "HS 코드를 찾을 수 없습니다. 4자리 HS 코드를 입력해주세요."
+            
+            logger.log_actual("SUCCESS", "Answer generation completed", f"{answer_span.duration:.2f}s, {len(answer)} chars")
+            if prefetch is not None:
+                logger.log_actual("INFO", "Speculative prefetch", describe_prefetch(prefetch.finish()))
+            logger.log_actual("INFO", "LLM usage", describe_usage(request_usage()))
+            logger.log_actual("INFO", "Process completed successfully", f"Total time: {request_span.duration:.2f}s")
+            logger.flush()
         
         # Return the answer for external processing
-        return answer
+        return answer, logger.analysis
         
     except Exception as e:
+        if prefetch is not None:
+            prefetch.finish()
         logger.log_actual("ERROR", f"Exception occurred: {str(e)}")
         logger.log_actual("ERROR", f"Error type: {type(e).__name__}")
+        logger.flush()
         raise e
 
 
@@ -248,31 +501,29 @@ with st.sidebar:
     
     # 새로운 채팅 시작 버튼
     if st.button("새로운 채팅 시작하기", type="primary"):
-        st.session_state.chat_history = []  # 채팅 기록 초기화
-        # Multi-Agent 및 HS 해설서 분석 결과도 초기화
-        if 'ai_analysis_results' in st.session_state:
-            st.session_state.ai_analysis_results = []
-        if 'hs_manual_analysis_results' in st.session_state:
-            st.session_state.hs_manual_analysis_results = []
-        # 컨텍스트 초기화 (기본 컨텍스트 재사용)
-        st.session_state.context = """당신은 HS 품목분류 전문가로서 관세청에서 오랜 경력을 가진 전문가입니다. 사용자가 물어보는 품목에 대해 아래 네 가지 유형 중 하나로 질문을 분류하여 답변해주세요.
-
-질문 유형:
-1. 웹 검색(Web Search): 물품개요, 용도, 기술개발, 무역동향 등 일반 정보 탐색이 필요한 경우.
-2. HS 분류 검색(HS Classification Search): HS 코드, 품목분류, 관세, 세율 등 HS 코드 관련 정보가 필요한 경우.
-3. HS 해설서 분석(HS Manual Analysis): HS 해설서 본문 심층 분석이 필요한 경우.
-4. 해외 HS 분류(Overseas HS Classification): 해외(미국/EU) HS 분류 사례가 필요한 경우.
-
-중요 지침:
-1. 사용자가 질문하는 물품에 대해 관련어, 유사품목, 대체품목도 함께 고려하여 가장 적합한 HS 코드를 찾아주세요.
-2. 품목의 성분, 용도, 가공상태 등을 고려하여 상세히 설명해주세요.
-3. 사용자가 특정 HS code를 언급하며 질문하는 경우, 답변에 해당 HS code 해설서 분석 내용을 포함하여 답변해주세요.
-4. 관련 규정이나 판례가 있다면 함께 제시해주세요.
-5. 답변은 간결하면서도 전문적으로 제공해주세요.
-
-지금까지의 대화:
-"""
+        # 새 세션 ID로 대화 시작 (이전 대화는 저장소에 남음, 컨텍스트도 새 대화 창 기준)
+        st.session_state.chat = open_chat_window()
+        st.session_state.history_pages = 0
+        st.query_params['chat'] = st.session_state.chat.session_id
         st.success("✅ 새로운 채팅이 시작되었습니다!")
+    
+    # 관리 기능: 답변 캐시, LLM 사용량 (HS_ADMIN_TOKEN 설정 후 URL에 ?admin=<토큰>을 붙여 접속한 경우만 표시)
+    if admin_token_ok(st.query_params.get('admin')):
+        with st.expander("⚙️ 답변 캐시 관리"):
+            cache_stats = ANSWER_CACHE.stats()
+            st.write(f"항목 {cache_stats['entries']}/{cache_stats['max_entries']}개, 적중률 {cache_stats['hit_rate']:.0%} "
+                     f"(정확 {cache_stats['hit_exact']}, 유사 {cache_stats['hit_similar']}, 미스 {cache_stats['miss']})")
+            purge_query = st.text_input("삭제할 질문 (비우면 전체 삭제)", key="purge_query")
+            if st.button("답변 캐시 삭제", key="purge_answer_cache"):
+                st.success(f"✅ {ANSWER_CACHE.purge(query=purge_query or None)}개 항목을 삭제했습니다.")
+        with st.expander("📈 오늘 LLM 사용량"):
+            usage_today = USAGE_LEDGER.today()
+            total = usage_today['total']
+            st.write(f"호출 {total['calls']}회 (오류 {total['errors']}, 대체 모델 {total['fallbacks']}), "
+                     f"토큰 {total['prompt_tokens']:,} + {total['output_tokens']:,}, LLM 시간 {total['seconds']:.1f}초")
+            for model, totals in usage_today['by_model'].items():
+                st.write(f"- {model}: {totals['calls']}회, {totals['prompt_tokens'] + totals['output_tokens']:,} 토큰, "
+                         f"{totals['seconds']:.1f}초")
 
 # 메인 페이지 설정
 st.title("HS 품목분류 챗봇")
@@ -320,8 +571,9 @@ st.info(example_messages[actual_category])
 
 st.divider()  # 구분선 추가
 
-# 채팅 기록 표시
-for message in st.session_state.chat_history:
+def render_message(message):
+    """채팅 메시지 한 개 표시 (분석 과정은 메시지와 함께 저장된 analysis 사용)"""
+    analysis = message.get('analysis') or {}
     if message["role"] == "user":
         st.markdown(f"""<div style='background-color: #e6f7ff; padding: 10px; border-radius: 10px; margin-bottom: 10px;'>
                    <strong>사용자:</strong> {message['content']}
@@ -343,11 +595,9 @@ for message in st.session_state.chat_history:
                     5. 🧠 최종 AI 비교 분석 (Gemini 2.5)
                     """)
                 elif "+++ HS 해설서 분석 실시 (병렬 검색) +++" in message['content']:
-                    # HS 해설서 분석의 경우 - 저장된 분석 결과 표시
-                    if hasattr(st.session_state, 'hs_manual_analysis_results') and st.session_state.hs_manual_analysis_results:
-                        # 가장 최근 분석 결과 표시
-                        latest_result = st.session_state.hs_manual_analysis_results[-1]
-                        search_results = latest_result.get('search_results', [])
+                    # HS 해설서 분석의 경우 - 이 답변의 분석 결과 표시
+                    if analysis.get('candidates'):
+                        search_results = analysis['candidates']
                         
                         st.success("✅ **병렬 검색 완료**")
                         st.markdown("### 🎯 **상위 HS코드 후보**")
@@ -378,9 +628,9 @@ for message in st.session_state.chat_history:
                         4. 🧠 통합 분석 및 최종 추천 (Gemini 2.5)
                         5. ✅ 신뢰도 평가 (HIGH/MEDIUM)
                         """)
-                elif st.session_state.ai_analysis_results:
-                    # Multi-Agent 분석의 경우 - 저장된 결과 표시
-                    for result in st.session_state.ai_analysis_results:
+                elif analysis.get('groups'):
+                    # Multi-Agent 분석의 경우 - 이 답변의 그룹별 결과 표시
+                    for result in analysis['groups']:
                         emoji = "🤖" if result['type'] == 'domestic' else "🌐"
                         st.success(f"{emoji} **그룹 {result['group_id']+1} AI 분석 완료** ({result['processing_time']:.1f}초)")
                         with st.container():
@@ -406,6 +656,17 @@ for message in st.session_state.chat_history:
                     </div>""", unsafe_allow_html=True)
 
 
+# 채팅 기록 표시 (최근 메시지 창 + 요청한 만큼의 이전 대화 페이지)
+chat = st.session_state.chat
+older_messages = chat.older(st.session_state.history_pages)
+remaining = chat.older_count() - len(older_messages)
+if remaining > 0 and st.button(f"⬆️ 이전 대화 불러오기 ({remaining}개 남음)", key="load_older_messages"):
+    st.session_state.history_pages += 1
+    st.rerun()
+for message in older_messages + list(chat.messages):
+    render_message(message)
+
+
 # 하단 입력 영역 (Form 기반 입력)
 input_container = st.container()
 st.markdown("<div style='flex: 1;'></div>", unsafe_allow_html=True)
@@ -442,39 +703,44 @@ with input_container:
             
             # 분석 과정 표시가 필요한 유형들
             if selected_category in ["국내HS분류사례 검색", "해외HS분류사례검색", "HS해설서분석"]:
-                if selected_category in ["국내HS분류사례 검색", "해외HS분류사례검색"]:
-                    st.session_state.ai_analysis_results = []  # Multi-Agent용 결과 초기화
                 analysis_expander = st.expander("🔍 **AI 분석 과정 보기**", expanded=True)
             
             try:
                 # 분석 과정 표시 방식 분기
                 if selected_category == "HS해설서분석":
-                    # HS 해설서 분석은 사용자 제시 코드 기반 분석 (더미 로거 생성)
-                    class DummyLogger:
-                        def log_actual(self, level, message, data=None):
-                            pass  # UI 표시용이므로 로깅은 생략
-                    
-                    dummy_logger = DummyLogger()
-                    final_answer = handle_hs_manual_with_user_codes(user_input, st.session_state.context, hs_manager, dummy_logger, analysis_expander)
+                    # HS 해설서 분석은 사용자 제시 코드 기반 분석 (진행 상황은 분석 패널에 표시)
+                    progress_sink = StreamlitProgressSink(analysis_expander)
+                    with span('request', q_type='hs_manual_codes', category=selected_category):
+                        final_answer = answer_cached('hs_manual_codes', user_input, hs_manager, progress_sink, lambda: handle_hs_manual_with_user_codes(
+                            user_input, chat_context(), hs_manager, progress_sink))
+                        progress_sink.log_actual("INFO", "LLM usage", describe_usage(request_usage()))
+                        progress_sink.flush()
                     answer = "\n\n +++ HS 해설서 분석 실시 (사용자 제시 코드) +++ \n\n" + final_answer
+                    analysis = progress_sink.analysis
                 elif selected_category not in ["국내HS분류사례 검색", "해외HS분류사례검색"]:
                     # 기타 유형은 로그 패널 표시
                     with st.expander("실시간 처리 과정 로그 보기", expanded=True):
-                        answer = process_query_with_real_logging(user_input)
+                        answer, analysis = process_query_with_real_logging(user_input)
                 else:
-                    # Multi-Agent 분석용 특별 처리
+                    # Multi-Agent 분석용 특별 처리 (진행 이벤트를 expander에 그리는 sink 전달)
+                    progress_sink = StreamlitProgressSink(analysis_expander)
                     if selected_category == "국내HS분류사례 검색":
-                        # utils 함수를 직접 호출하되 expander 컨테이너 전달
-                        final_answer = handle_hs_classification_cases(user_input, st.session_state.context, hs_manager, analysis_expander)
+                        with span('request', q_type='hs_classification', category=selected_category):
+                            final_answer = answer_cached('hs_classification', user_input, hs_manager, progress_sink, lambda: handle_hs_classification_cases(
+                                user_input, chat_context(), hs_manager, progress_sink))
+                            progress_sink.log_actual("INFO", "LLM usage", describe_usage(request_usage()))
                         answer = "\n\n +++ HS 분류사례 검색 실시 +++\n\n" + final_answer
                     elif selected_category == "해외HS분류사례검색":
-                        final_answer = handle_overseas_hs(user_input, st.session_state.context, hs_manager, analysis_expander)
+                        with span('request', q_type='overseas_hs', category=selected_category):
+                            final_answer = answer_cached('overseas_hs', user_input, hs_manager, progress_sink, lambda: handle_overseas_hs(
+                                user_input, chat_context(), hs_manager, progress_sink))
+                            progress_sink.log_actual("INFO", "LLM usage", describe_usage(request_usage()))
                         answer = "\n\n +++ 해외 HS 분류 검색 실시 +++\n\n" + final_answer
+                    analysis = progress_sink.analysis
                 
                 # Update chat history after successful processing
-                st.session_state.chat_history.append({"role": "user", "content": user_input})
-                st.session_state.chat_history.append({"role": "assistant", "content": answer})
-                st.session_state.context += f"\n사용자: {user_input}\n품목분류 전문가: {answer}\n"
+                st.session_state.chat.append("user", user_input)
+                st.session_state.chat.append("assistant", answer, analysis)
                 
                 # 분석 과정이 표시된 유형들의 최종 답변 표시 (마크다운으로 렌더링)
                 if selected_category in ["국내HS분류사례 검색", "해외HS분류사례검색", "HS해설서분석"]:
@@ -0,0 +1,268 @@
+"""
+LLM 모델 선택(호출 위치별 정책)과 토큰/지연 시간 집계
+- utils.call_gemini가 호출마다 사용: 호출 전 프롬프트 토큰 추정 → 정책으로 모델 선택 → 오류 시 대체 모델 재시도
+- 정책 (호출 위치 call_site별, DEFAULT_POLICIES)
+    model          : 기본 모델
+    small_tokens   : 추정 토큰이 이 값 이하이면 small_model 사용 (짧은 프롬프트는 가벼운 모델로 충분)
+    large_tokens   : 추정 토큰이 이 값 이상이면 large_model 사용
+    latency_budget : 선택한 모델의 최근 지연 시간(EWMA, 호출 위치별)이 이 값(초)을 넘으면 fast_model 사용
+                     (LATENCY_RETRY_SECONDS가 지나면 원래 모델을 다시 시도하여 지연 시간 갱신)
+    fallbacks      : 호출 오류 시 차례로 재시도할 모델 목록
+- 사용량 집계
+    요청별: 현재 요청(루트 span)의 llm_calls / llm_prompt_tokens / llm_output_tokens / llm_seconds 속성
+    일별  : 날짜 → (모델, 호출 위치)별 호출 수, 오류 수, 대체 호출 수, 토큰, 지연 시간 (USAGE_LEDGER)
+    지표  : hs_llm_calls_total, hs_llm_tokens_total, hs_llm_seconds_total, hs_llm_errors_total, hs_llm_fallback_total
+
+환경 변수:
+    HS_MODEL_POLICY : 정책을 덮어쓸 JSON 파일 ({"head_agent": {"latency_budget": 20}, ...}, 호출 위치별 병합)
+    HS_USAGE_DAYS   : 메모리에 보관할 일별 집계 일수 (기본 30)
+    HS_USAGE_LOG    : 지정 시 호출마다 사용량을 JSONL로 추가 기록 (재시작 후에도 일별 집계 가능)
+
+일별 사용량 확인:
+    python model_router.py --log usage.jsonl
+    python model_router.py --policy
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from tracing import TRACER, add_root_attributes, current_span
+
+# 호출 위치별 기본 정책
+DEFAULT_POLICIES = {
+    'classify': {'model': 'gemini-2.0-flash', 'fallbacks': ['gemini-2.5-flash']},
+    'manual_summary': {'model': 'gemini-2.0-flash', 'fallbacks': ['gemini-2.5-flash']},
+    'parallel_summary': {'model': 'gemini-2.0-flash', 'fallbacks': ['gemini-2.5-flash']},
+    'group_agent': {'model': 'gemini-2.5-flash', 'small_tokens': 1500, 'small_model': 'gemini-2.0-flash',
+                    'latency_budget': 20, 'fast_model': 'gemini-2.0-flash', 'fallbacks': ['gemini-2.0-flash']},
+    'head_agent': {'model': 'gemini-2.5-flash', 'latency_budget': 30, 'fast_model': 'gemini-2.0-flash',
+                   'fallbacks': ['gemini-2.0-flash']},
+    'parallel_final': {'model': 'gemini-2.5-flash', 'latency_budget': 30, 'fast_model': 'gemini-2.0-flash',
+                       'fallbacks': ['gemini-2.0-flash']},
+    'user_codes_analysis': {'model': 'gemini-2.5-flash', 'fallbacks': ['gemini-2.0-flash']},
+    'web_search': {'model': 'gemini-2.5-flash', 'fallbacks': ['gemini-2.0-flash']},
+}
+DEFAULT_MODEL = 'gemini-2.5-flash'
+DEFAULT_USAGE_DAYS = 30
+# 최근 지연 시간 지수 이동 평균 가중치
+LATENCY_EWMA_ALPHA = 0.3
+# 지연 시간 초과로 fast_model로 바꾼 뒤 원래 모델을 다시 시도하기까지의 시간 (초)
+LATENCY_RETRY_SECONDS = 300
+
+
+def load_policies(path=None):
+    """기본 정책에 HS_MODEL_POLICY JSON 파일의 호출 위치별 설정을 병합"""
+    policies = {site: dict(policy) for site, policy in DEFAULT_POLICIES.items()}
+    path = path or os.getenv('HS_MODEL_POLICY')
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            for site, overrides in json.load(f).items():
+                policies.setdefault(site, {}).update(overrides)
+    return policies
+
+
+class ModelRouter:
+    """호출 위치별 정책으로 모델 선택, 모델/호출 위치별 최근 지연 시간(EWMA) 관리"""
+
+    def __init__(self, policies=None):
+        self.policies = policies if policies is not None else load_policies()
+        self.lock = threading.Lock()
+        self.latency = {}  # (model, call_site) -> (최근 지연 시간 EWMA (초), 갱신 시각)
+
+    def policy(self, call_site):
+        return self.policies.get(call_site) or {'model': DEFAULT_MODEL}
+
+    def select(self, call_site, prompt_tokens):
+        """
+        호출할 모델과 선택 이유
+        Returns:
+            (모델, 이유) - 이유: 'default' | 'small_prompt' | 'large_prompt' | 'latency_budget'
+        """
+        policy = self.policy(call_site)
+        model, reason = policy.get('model', DEFAULT_MODEL), 'default'
+        if policy.get('small_model') and prompt_tokens <= policy.get('small_tokens', 0):
+            model, reason = policy['small_model'], 'small_prompt'
+        elif policy.get('large_model') and policy.get('large_tokens') and prompt_tokens >= policy['large_tokens']:
+            model, reason = policy['large_model'], 'large_prompt'
+        budget = policy.get('latency_budget')
+        if budget and policy.get('fast_model') and model != policy['fast_model']:
+            with self.lock:
+                recent, updated_at = self.latency.get((model, call_site), (None, 0.0))
+            if recent is not None and recent > budget and time.time() - updated_at < LATENCY_RETRY_SECONDS:
+                model, reason = policy['fast_model'], 'latency_budget'
+        return model, reason
+
+    def candidates(self, call_site, prompt_tokens):
+        """선택한 모델과 오류 시 대체 모델 [(모델, 이유), ...] (중복 제외)"""
+        model, reason = self.select(call_site, prompt_tokens)
+        result = [(model, reason)]
+        for fallback in self.policy(call_site).get('fallbacks', []):
+            if fallback not in [m for m, _ in result]:
+                result.append((fallback, 'fallback'))
+        return result
+
+    def observe_latency(self, model, call_site, seconds):
+        with self.lock:
+            previous, _ = self.latency.get((model, call_site), (None, 0.0))
+            recent = seconds if previous is None else LATENCY_EWMA_ALPHA * seconds + (1 - LATENCY_EWMA_ALPHA) * previous
+            self.latency[(model, call_site)] = (recent, time.time())
+
+
+class UsageLedger:
+    """일별 LLM 사용량 누적 (날짜 → (모델, 호출 위치) → 합계, 최근 max_days일 보관)"""
+
+    FIELDS = ('calls', 'errors', 'fallbacks', 'prompt_tokens', 'output_tokens', 'seconds')
+
+    def __init__(self, max_days=DEFAULT_USAGE_DAYS, log_path=None):
+        self.max_days = max_days
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.days = OrderedDict()  # 'YYYY-MM-DD' -> {(model, call_site): {필드: 값}}
+
+    def record(self, model, call_site, prompt_tokens=0, output_tokens=0, seconds=0.0, error=False, fallback=False,
+               now=None):
+        now = time.time() if now is None else now
+        day = time.strftime('%Y-%m-%d', time.localtime(now))
+        with self.lock:
+            if day not in self.days:
+                self.days[day] = defaultdict(lambda: dict.fromkeys(self.FIELDS, 0))
+                while len(self.days) > self.max_days:
+                    self.days.popitem(last=False)
+            totals = self.days[day][(model, call_site)]
+            totals['calls'] += 1
+            totals['errors'] += int(error)
+            totals['fallbacks'] += int(fallback)
+            totals['prompt_tokens'] += prompt_tokens or 0
+            totals['output_tokens'] += output_tokens or 0
+            totals['seconds'] += seconds
+            if self.log_path:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'ts': round(now, 3), 'model': model, 'call_site': call_site,
+                                        'prompt_tokens': prompt_tokens or 0, 'output_tokens': output_tokens or 0,
+                                        'seconds': round(seconds, 3), 'error': error, 'fallback': fallback}) + '\n')
+
+    def summary(self, day=None):
+        """
+        일별 합계
+        Args:
+            day: 'YYYY-MM-DD' (없으면 보관 중인 모든 날짜)
+        Returns:
+            {날짜: {'total': {필드: 값}, 'by_model': {모델: {...}}, 'by_call_site': {호출 위치: {...}}}}
+        """
+        with self.lock:
+            days = {d: {key: dict(totals) for key, totals in rows.items()}
+                    for d, rows in self.days.items() if day is None or d == day}
+        return {d: summarize_rows(rows) for d, rows in days.items()}
+
+    def today(self):
+        day = time.strftime('%Y-%m-%d')
+        return self.summary(day).get(day) or summarize_rows({})
+
+
+def summarize_rows(rows):
+    """{(모델, 호출 위치): 합계} → 전체/모델별/호출 위치별 합계"""
+    def add(target, totals):
+        for field in UsageLedger.FIELDS:
+            target[field] = target.get(field, 0) + totals.get(field, 0)
+
+    result = {'total': dict.fromkeys(UsageLedger.FIELDS, 0), 'by_model': {}, 'by_call_site': {}}
+    for (model, call_site), totals in sorted(rows.items()):
+        add(result['total'], totals)
+        add(result['by_model'].setdefault(model, {}), totals)
+        add(result['by_call_site'].setdefault(call_site, {}), totals)
+    result['total']['seconds'] = round(result['total']['seconds'], 3)
+    return result
+
+
+ROUTER = ModelRouter()
+USAGE_LEDGER = UsageLedger(int(os.getenv('HS_USAGE_DAYS', DEFAULT_USAGE_DAYS)), os.getenv('HS_USAGE_LOG') or None)
+
+
+def record_call(model, call_site, prompt_tokens, output_tokens, seconds, error=False, fallback=False):
+    """
+    LLM 호출 1회 사용량 기록 (지표, 현재 요청 합계, 일별 합계, 최근 지연 시간)
+    - 오류 호출은 지연 시간 EWMA에 넣지 않음
+    """
+    labels = {'model': model, 'call_site': call_site}
+    if prompt_tokens:
+        TRACER.metrics.inc('hs_llm_tokens_total', prompt_tokens, kind='prompt', **labels)
+    if output_tokens:
+        TRACER.metrics.inc('hs_llm_tokens_total', output_tokens, kind='output', **labels)
+    TRACER.metrics.inc('hs_llm_calls_total', 1, **labels)
+    TRACER.metrics.inc('hs_llm_seconds_total', seconds, **labels)
+    if error:
+        TRACER.metrics.inc('hs_llm_errors_total', 1, **labels)
+    if fallback:
+        TRACER.metrics.inc('hs_llm_fallback_total', 1, **labels)
+    add_root_attributes(llm_calls=1, llm_errors=int(error), llm_prompt_tokens=prompt_tokens or 0,
+                        llm_output_tokens=output_tokens or 0, llm_seconds=seconds)
+    USAGE_LEDGER.record(model, call_site, prompt_tokens, output_tokens, seconds, error, fallback)
+    if not error:
+        ROUTER.observe_latency(model, call_site, seconds)
+
+
+def request_usage():
+    """현재 요청(루트 span)의 LLM 사용량 합계 {'calls', 'errors', 'prompt_tokens', 'output_tokens', 'seconds'}"""
+    current = current_span()
+    root = current.trace.root if current is not None else None
+    attributes = root.attributes if root is not None else {}
+    return {'calls': attributes.get('llm_calls', 0), 'errors': attributes.get('llm_errors', 0),
+            'prompt_tokens': attributes.get('llm_prompt_tokens', 0),
+            'output_tokens': attributes.get('llm_output_tokens', 0),
+            'seconds': round(attributes.get('llm_seconds', 0.0), 3)}
+
+
+def describe_usage(usage):
+    """사용량 요약 문자열 ('5 calls, 12345+2345 tokens, 18.20s LLM time')"""
+    errors = f", {usage['errors']} errors" if usage.get('errors') else ""
+    return (f"{usage['calls']} calls, {usage['prompt_tokens']}+{usage['output_tokens']} tokens, "
+            f"{usage['seconds']:.2f}s LLM time{errors}")
+
+
+def summarize_log(path):
+    """HS_USAGE_LOG JSONL 파일의 일별 합계"""
+    days = defaultdict(lambda: defaultdict(lambda: dict.fromkeys(UsageLedger.FIELDS, 0)))
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            day = time.strftime('%Y-%m-%d', time.localtime(row['ts']))
+            totals = days[day][(row['model'], row['call_site'])]
+            totals['calls'] += 1
+            totals['errors'] += int(row.get('error', False))
+            totals['fallbacks'] += int(row.get('fallback', False))
+            totals['prompt_tokens'] += row.get('prompt_tokens', 0)
+            totals['output_tokens'] += row.get('output_tokens', 0)
+            totals['seconds'] += row.get('seconds', 0.0)
+    return {day: summarize_rows(rows) for day, rows in sorted(days.items())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LLM 모델 정책 / 일별 사용량 확인")
+    parser.add_argument('--log', default=os.getenv('HS_USAGE_LOG'), help="사용량 JSONL 경로 (HS_USAGE_LOG)")
+    parser.add_argument('--policy', action='store_true', help="적용 중인 호출 위치별 정책 출력")
+    args = parser.parse_args(argv)
+
+    if args.policy:
+        print(json.dumps(load_policies(), ensure_ascii=False, indent=2))
+        return 0
+    if not args.log:
+        parser.error("--log 또는 HS_USAGE_LOG가 필요합니다")
+    for day, summary in summarize_log(args.log).items():
+        total = summary['total']
+        print(f"{day}  {total['calls']:>6} calls  {total['prompt_tokens']:>10} prompt  "
+              f"{total['output_tokens']:>9} output  {total['seconds']:>9.1f}s  errors {total['errors']}  "
+              f"fallbacks {total['fallbacks']}")
+        for model, totals in summary['by_model'].items():
+            print(f"    {model:<22}{totals['calls']:>6} calls  {totals['prompt_tokens']:>10} prompt  "
+                  f"{totals['output_tokens']:>9} output  {totals['seconds']:>9.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+HS 해설서 구간 분할 (부 주/총설, 류 주/총설, 호, 소호)
+- grouped_11_end.json 그룹은 페이지 단위(머리글 header1/header2 기준)로 묶여 있어, 한 그룹에 앞뒤 호의 내용이 섞이고
+  한 호가 여러 그룹(페이지)에 걸침
+- 모든 그룹의 페이지를 페이지 번호 순으로 이어 붙인 문서(페이지 구분선, 반복되는 머리글 제거)를 만들고
+  부/류/호/소호 제목 줄 기준으로 구간을 나눔 (제목 패턴은 hs해설서/HS_manual_page_split.py 의 구간 색인과 공용)
+- 구간 ID: '제7부', '제39류', '39.23', '3923.10' / 위치: 문서 내 문자 offset (start, note_end, end)
+  - note_end: 첫 하위 제목 직전 (부/류는 주·총설, 호는 소호 앞 설명)
+  - end: 같은 수준 이상의 다음 제목 직전
+- 호출하는 쪽은 필요한 구간만 가져가므로 프롬프트에 페이지 전체(이웃 호 포함)를 넣지 않음
+
+구간 목록 확인:
+    python notes_segmenter.py --notes knowledge/grouped_11_end.json --code 3923.10
+"""
+import argparse
+import json
+import re
+import sys
+
+# 제목 줄 패턴 (부 > 류 > 호 > 소호, 번호 뒤에 공백이나 줄 끝이 와야 제목으로 인정)
+# hs해설서/HS_manual_page_split.py 도 이 정의를 가져다 씀
+HEADING_PATTERNS = [
+    ('부', re.compile(r'^제\s*(\d+)\s*부(?=\s|$)')),
+    ('류', re.compile(r'^제\s*(\d+)\s*류(?=\s|$)')),
+    ('소호', re.compile(r'^(\d{4})\.(\d{1,2})(?=\s|$)')),
+    ('호', re.compile(r'^(\d{2})\.(\d{2})(?=\s|$)')),
+]
+LEVEL_ORDER = {'부': 0, '류': 1, '호': 2, '소호': 3}
+PAGE_MARKER = re.compile(r'^--- Page (\d+) ---$', re.MULTILINE)
+# 페이지 첫 두 줄은 머리글 (HS_manual_page_split.page_headers)
+RUNNING_HEAD_LINES = 2
+
+
+def heading_id(level, match):
+    if level in ('부', '류'):
+        return f"제{int(match.group(1))}{level}"
+    if level == '호':
+        return f"{match.group(1)}.{match.group(2)}"
+    return f"{match.group(1)}.{match.group(2).ljust(2, '0')}"
+
+
+def match_heading(line):
+    """제목 줄이면 (수준, ID), 아니면 None"""
+    for level, pattern in HEADING_PATTERNS:
+        match = pattern.match(line)
+        if match:
+            return level, heading_id(level, match)
+    return None
+
+
+def split_pages(text):
+    """그룹 텍스트 → [(페이지 번호, 페이지 텍스트)] (구분선이 없으면 페이지 번호 None인 한 페이지)"""
+    markers = list(PAGE_MARKER.finditer(text))
+    if not markers:
+        return [(None, text)]
+    return [(int(marker.group(1)), text[marker.end():markers[i + 1].start() if i + 1 < len(markers) else len(text)])
+            for i, marker in enumerate(markers)]
+
+
+def code_section_ids(hs_code):
+    """
+    HS 코드 → (류 ID, 호 ID, 소호 ID 또는 None)
+    - 예: '392310' → ('제39류', '39.23', '3923.10'), '3923' → ('제39류', '39.23', None)
+    """
+    code = re.sub(r'\D', '', str(hs_code))
+    if len(code) < 4:
+        return (f"제{int(code[:2])}류" if len(code) >= 2 else None), None, None
+    subheading = f"{code[:4]}.{code[4:6].ljust(2, '0')}" if len(code) >= 5 else None
+    return f"제{int(code[:2])}류", f"{code[:2]}.{code[2:4]}", subheading
+
+
+class NotesIndex:
+    """
+    해설서 구간 색인 (만든 뒤에는 변경하지 않음)
+    Attributes:
+        text: 페이지 순서로 이어 붙인 해설서 본문
+        sections: [{'level', 'id', 'title', 'start', 'note_end', 'end', 'parent', 'pages'}, ...] (문서 순서)
+    """
+
+    def __init__(self, text, sections):
+        self.text = text
+        self.sections = sections
+        # 같은 ID가 여러 번 나오면(본문 중 제목 형태의 줄 등) 가장 긴 구간을 사용
+        self.by_id = {}
+        for section in sections:
+            current = self.by_id.get(section['id'])
+            if current is None or section['end'] - section['start'] > current['end'] - current['start']:
+                self.by_id[section['id']] = section
+
+    @classmethod
+    def build(cls, groups):
+        """
+        해설서 그룹 목록(grouped_11_end.json 형식) → 구간 색인
+        - 페이지는 번호 순으로 한 번씩만 사용
+        - 각 페이지 머리글은 이전 페이지와 같으면 제거, 달라지면 본문에 남겨 제목으로 인식
+        - 이미 열려 있는 구간과 같은 ID의 제목(다음 페이지로 이어지는 호 등)은 새 구간으로 보지 않음
+        """
+        # 키: (0, 페이지 번호), 구분선이 없는 그룹은 (1, 그룹 순번) - 그룹 순서대로 뒤에 배치
+        pages = {}
+        for group_idx, group in enumerate(groups):
+            for page_number, page_text in split_pages(group.get('text', '')):
+                pages.setdefault((0, page_number) if page_number is not None else (1, group_idx), page_text)
+
+        parts, page_starts = [], []
+        offset = 0
+        previous_heads = [None] * RUNNING_HEAD_LINES
+        for key in sorted(pages):
+            kept, head_idx = [], 0
+            for line in pages[key].split('\n'):
+                stripped = line.strip()
+                if stripped and head_idx < RUNNING_HEAD_LINES:
+                    same = stripped == previous_heads[head_idx]
+                    previous_heads[head_idx] = stripped
+                    head_idx += 1
+                    if same:
+                        continue
+                kept.append(line)
+            body = '\n'.join(kept).strip('\n')
+            if not body:
+                continue
+            page_starts.append((offset, key[1] if key[0] == 0 else None))
+            parts.append(body + '\n')
+            offset += len(body) + 1
+        text = ''.join(parts)
+
+        sections, open_ids = [], {}
+        offset, page_idx = 0, 0
+        for line in text.split('\n'):
+            while page_idx + 1 < len(page_starts) and page_starts[page_idx + 1][0] <= offset:
+                page_idx += 1
+            stripped = line.strip()
+            heading = match_heading(stripped) if stripped else None
+            if heading and open_ids.get(heading[0]) != heading[1]:
+                level, section_id = heading
+                rank = LEVEL_ORDER[level]
+                parent = next((open_ids[upper] for upper in ('소호', '호', '류', '부')
+                               if LEVEL_ORDER[upper] < rank and upper in open_ids), None)
+                start = offset + line.index(stripped)
+                sections.append({'level': level, 'id': section_id, 'title': stripped[:120], 'start': start,
+                                 'note_end': len(text), 'end': len(text), 'parent': parent,
+                                 'pages': [page_starts[page_idx][1]] if page_starts else []})
+                open_ids = {upper: open_id for upper, open_id in open_ids.items() if LEVEL_ORDER[upper] < rank}
+                open_ids[level] = section_id
+            offset += len(line) + 1
+
+        for i, section in enumerate(sections):
+            rank = LEVEL_ORDER[section['level']]
+            if i + 1 < len(sections):
+                section['note_end'] = sections[i + 1]['start']
+            for following in sections[i + 1:]:
+                if LEVEL_ORDER[following['level']] <= rank:
+                    section['end'] = following['start']
+                    break
+            last_page = next((page for start, page in reversed(page_starts) if start < section['end']), None)
+            if section['pages'] and last_page is not None and last_page != section['pages'][0]:
+                section['pages'] = [section['pages'][0], last_page]
+        return cls(text, sections)
+
+    def get(self, section_id):
+        return self.by_id.get(section_id)
+
+    def section_text(self, section_id, scope='full'):
+        """
+        구간 본문
+        Args:
+            scope: 'full' (하위 구간 포함) 또는 'note' (첫 하위 제목 전까지: 부/류 주·총설, 호 일반 설명)
+        Returns:
+            본문 문자열 (구간이 없으면 None)
+        """
+        section = self.by_id.get(section_id)
+        if section is None:
+            return None
+        end = section['note_end'] if scope == 'note' else section['end']
+        return self.text[section['start']:end].strip()
+
+    def part_of(self, section_id):
+        """구간이 속한 부(部) ID"""
+        section = self.by_id.get(section_id)
+        while section is not None and section['level'] != '부':
+            section = self.by_id.get(section['parent'])
+        return section['id'] if section else None
+
+    def excerpt(self, hs_code):
+        """
+        HS 코드에 필요한 구간만 추출
+        - 부/류: 주·총설 (하위 호 제외)
+        - 호: 소호가 지정되면 호 일반 설명 + 해당 소호, 아니면 호 전체
+        Returns:
+            {'part', 'chapter', 'heading'}: 각각 {'id', 'level', 'text'} 또는 None
+        """
+        chapter_id, heading_code, subheading_id = code_section_ids(hs_code)
+        part_id = self.part_of(chapter_id) if chapter_id else None
+
+        def piece(section_id, scope):
+            text = self.section_text(section_id, scope) if section_id else None
+            return {'id': section_id, 'level': self.by_id[section_id]['level'], 'text': text} if text else None
+
+        heading = None
+        if heading_code:
+            heading = piece(heading_code, 'full')
+            subheading = piece(subheading_id, 'full') if subheading_id else None
+            if heading and subheading:
+                general = self.section_text(heading_code, 'note')
+                heading = {'id': subheading_id, 'level': '소호', 'text': f"{general}\n...\n{subheading['text']}"}
+        return {'part': piece(part_id, 'note'), 'chapter': piece(chapter_id, 'note'), 'heading': heading}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="해설서 부/류/호/소호 구간 확인")
+    parser.add_argument('--notes', default='knowledge/grouped_11_end.json', help="해설서 그룹 JSON")
+    parser.add_argument('--code', help="구간을 추출할 HS 코드 (없으면 구간 수준별 개수 출력)")
+    args = parser.parse_args(argv)
+
+    with open(args.notes, 'r', encoding='utf-8') as f:
+        groups = json.load(f)
+    index = NotesIndex.build(groups)
+    group_chars = sum(len(group.get('text', '')) for group in groups)
+    print(f"그룹 {len(groups)}개 ({group_chars}자) → 문서 {len(index.text)}자, 구간 {len(index.sections)}개")
+    if not args.code:
+        for level in LEVEL_ORDER:
+            print(f"  {level}: {sum(1 for section in index.sections if section['level'] == level)}")
+        return 0
+    for name, piece in index.excerpt(args.code).items():
+        if piece:
+            print(f"\n[{name}] {piece['id']} ({len(piece['text'])}자)\n{piece['text'][:500]}")
+        else:
+            print(f"\n[{name}] 없음")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
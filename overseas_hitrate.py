@@ -0,0 +1,171 @@
+"""
+해외 분류사례 검색 적중률 측정 (casefold/한영 용어 사전 질의 확장 전/후 비교)
+- 질의 세트: 국내 분류사례(HS분류사례_part1~10)의 한글 품명(없으면 물품 설명 앞부분)과 결정 HS 코드, 일정 간격으로 추출
+  - --save-queries로 저장한 세트를 --query-file로 다시 쓰면 데이터가 바뀌어도 같은 질의로 비교
+- 질의마다 해외 그룹 5개(search_overseas_group)를 모두 검색하여
+  - 결과 있음: 해외 사례가 하나 이상 검색됨
+  - 호 일치: 검색된 해외 사례 중 HS 코드 앞 4자리(호)가 국내 결정과 같은 것이 있음
+  - 평균 결과 수
+- 비교 방식 (같은 질의 세트, 같은 분류사례 데이터)
+  - baseline: 변경 전 검색 (키워드 casefold 없음, 질의 확장 없음) - LegacyOverseasSearch로 역색인을 다시 만들어 재현
+  - casefold: 현재 검색, 질의 확장 끔 (HSDataManager(query_expansion=False))
+  - expanded: 현재 검색 (casefold + 질의 확장)
+- 검색 키워드는 집합 순서로 점수를 더하므로 점수가 같은 사례의 순위는 PYTHONHASHSEED에 따라 달라짐
+  (같은 수치를 재현하려면 PYTHONHASHSEED=0 으로 실행)
+
+실행 예:
+    PYTHONHASHSEED=0 python overseas_hitrate.py
+    PYTHONHASHSEED=0 python overseas_hitrate.py --queries 500 --save-queries hitrate_queries.json
+    PYTHONHASHSEED=0 python overseas_hitrate.py --query-file hitrate_queries.json --json hitrate_report.json
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from collections import defaultdict
+
+from knowledge_index import OVERSEAS_SOURCES
+
+OVERSEAS_GROUPS = 5
+DEFAULT_QUERIES = 300
+HANGUL = re.compile(r'[가-힣]')
+
+
+def load_labeled_queries(count=DEFAULT_QUERIES):
+    """
+    국내 분류사례에서 (질의, 호) 목록 추출 (실행마다 동일)
+    Returns:
+        [(질의, 4자리 호), ...]
+    """
+    items = []
+    for i in range(1, 11):
+        path = f'knowledge/HS분류사례_part{i}.json'
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                items.extend(json.load(f))
+
+    labeled, seen = [], set()
+    for item in items:
+        heading = ''.join(ch for ch in str(item.get('hs_code') or '') if ch.isdigit())[:4]
+        name = str(item.get('product_name') or '').strip()
+        if not HANGUL.search(name):
+            # 품명이 영문이면 한글 물품 설명 앞부분을 질의로 사용
+            name = re.split(r'[.,(\n]', str(item.get('description') or ''))[0].strip()[:60]
+        if len(heading) == 4 and HANGUL.search(name) and name not in seen:
+            seen.add(name)
+            labeled.append((name, heading))
+    step = max(1, len(labeled) // count)
+    return labeled[::step][:count]
+
+
+def legacy_keywords(text):
+    """변경 전 키워드 규칙 (특수문자 제거, 길이 2 이상, 중복 제거 - casefold 없음)"""
+    words = re.sub(r'[^\w\s]', ' ', text).split()
+    return list(set(word for word in words if len(word) >= 2))
+
+
+class LegacyOverseasSearch:
+    """
+    변경 전 해외 그룹 검색 (baseline)
+    - 같은 분류사례 데이터로 casefold 없는 키워드 역색인을 만들고, 그룹 분할(미국 3등분, EU 2등분)과
+      키워드 일치 수 순위는 HSDataManager.search_overseas_group과 같게 계산
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.index = defaultdict(list)
+        for source in OVERSEAS_SOURCES:
+            for position, item in enumerate(data.get(source, [])):
+                for keyword in legacy_keywords(str(item)):
+                    self.index[keyword].append((source, position))
+
+    def search_overseas_group(self, query, group_idx, max_results=3):
+        if group_idx < 3:
+            source, parts, part = 'hs_classification_data_us', 3, group_idx
+        else:
+            source, parts, part = 'hs_classification_data_eu', 2, group_idx - 3
+        count = len(self.data.get(source, []))
+        chunk_size = count // parts
+        start = part * chunk_size
+        end = start + chunk_size if part < parts - 1 else count
+
+        results = defaultdict(int)
+        for keyword in legacy_keywords(query):
+            for item_source, position in self.index.get(keyword, []):
+                if item_source == source and start <= position < end:
+                    results[position] += 1
+        ranked = sorted(results.items(), key=lambda x: x[1], reverse=True)
+        return [{'source': source, 'item': self.data[source][position]} for position, _ in ranked[:max_results]]
+
+
+def measure(hs_manager, queries):
+    """
+    질의 세트의 해외 검색 적중률
+    Args:
+        hs_manager: search_overseas_group(query, group_idx)가 있는 객체 (HSDataManager, LegacyOverseasSearch)
+    Returns:
+        {'queries', 'any_hit', 'heading_hit', 'mean_results'}
+    """
+    any_hit = heading_hit = total_results = 0
+    for query, heading in queries:
+        results = [result for group_idx in range(OVERSEAS_GROUPS)
+                   for result in hs_manager.search_overseas_group(query, group_idx)]
+        total_results += len(results)
+        any_hit += bool(results)
+        headings = {''.join(ch for ch in str(result['item'].get('hs_code') or '') if ch.isdigit())[:4]
+                    for result in results}
+        heading_hit += heading in headings
+    count = len(queries) or 1
+    return {'queries': len(queries), 'any_hit': any_hit / count, 'heading_hit': heading_hit / count,
+            'mean_results': total_results / count}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="해외 분류사례 검색 적중률 (casefold/질의 확장 전후)")
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES, help="질의 개수")
+    parser.add_argument('--query-file', help="저장해 둔 질의 세트 JSON (--queries 대신 사용)")
+    parser.add_argument('--save-queries', help="이번에 사용한 질의 세트를 JSON으로 저장")
+    parser.add_argument('--json', help="결과를 저장할 JSON 경로")
+    args = parser.parse_args(argv)
+
+    # 같은 질의의 방식별 결과가 캐시로 섞이지 않도록 검색 캐시 끔
+    os.environ['HS_RETRIEVAL_CACHE_SIZE'] = '0'
+    from utils import HSDataManager
+
+    if args.query_file:
+        with open(args.query_file, 'r', encoding='utf-8') as f:
+            queries = [tuple(query) for query in json.load(f)]
+    else:
+        queries = load_labeled_queries(args.queries)
+    if args.save_queries:
+        with open(args.save_queries, 'w', encoding='utf-8') as f:
+            json.dump(queries, f, ensure_ascii=False, indent=1)
+
+    hs_manager = HSDataManager(query_expansion=False)
+    if hs_manager.db is not None:
+        # baseline 역색인은 JSON 분류사례 데이터로 만듦
+        print("HS_KNOWLEDGE_DB를 설정하지 않고 실행하세요 (baseline은 knowledge/*.json 데이터 필요)")
+        return 1
+    searchers = {
+        'baseline': LegacyOverseasSearch(hs_manager.data),
+        'casefold': hs_manager,
+        'expanded': HSDataManager(query_expansion=True),
+    }
+    results = {}
+    print(f"질의 {len(queries)}개, 해외 source: {', '.join(OVERSEAS_SOURCES)}, "
+          f"PYTHONHASHSEED={os.getenv('PYTHONHASHSEED', 'random')}")
+    print(f"{'mode':<12}{'결과 있음':>10}{'호 일치':>10}{'평균 결과':>10}")
+    for mode, searcher in searchers.items():
+        results[mode] = measure(searcher, queries)
+        print(f"{mode:<12}{results[mode]['any_hit']:>10.1%}{results[mode]['heading_hit']:>10.1%}"
+              f"{results[mode]['mean_results']:>10.2f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'queries': queries, 'results': results}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
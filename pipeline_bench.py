@@ -0,0 +1,258 @@
+"""
+질문 유형별 전체 처리 경로(end-to-end) 지연 시간 분석
+- 실제 처리 함수(handle_*)를 그대로 실행하고 Gemini 호출만 지연 시간 분포를 설정한 가짜 LLM(fake_llm.py)으로 대체
+- tracing.py의 span을 모아 요청별로 분석
+  * 임계 경로(critical path): 응답 시간을 실제로 결정한 단계별 소요 시간 (자체 처리 시간은 '(self)'로 표시)
+  * 유휴 워커 시간: Multi-Agent 병렬 처리 중 스레드 풀 워커가 놀고 있던 시간 합계
+  * 이론상 최소 시간: ① 워커 수 제한이 없을 때(fan-out 대기 제거) ② 서로 독립적인 LLM 호출(요약 등)까지 동시에 실행할 때
+
+실행 예:
+    python pipeline_bench.py --runs 3
+    python pipeline_bench.py --q-types hs_classification,hs_manual --model-latency gemini-2.5-flash=6 --sigma 0.4
+"""
+import argparse
+import sys
+from collections import defaultdict
+
+# 측정 대상 질문 유형과 질의 (hs_manual_codes: 사용자 제시 코드 분석, hs_manual_raw: 해설서 원문,
+# auto: 분류 LLM 호출 + 추측 실행 - 가짜 LLM은 hs_classification으로 분류)
+BENCH_QUERIES = {
+    'auto': "플라스틱 용기",
+    'web_search': "플라스틱 용기 시장 동향",
+    'hs_classification': "플라스틱 용기",
+    'overseas_hs': "플라스틱 용기",
+    'hs_manual': "플라스틱 용기",
+    'hs_manual_codes': "3923, 3924, 3926 중에서 플라스틱 용기를 분류해주세요",
+    'hs_manual_raw': "3923",
+}
+
+# 모델별 가짜 LLM 지연 시간 중앙값 (초)
+DEFAULT_MODEL_LATENCY = {'gemini-2.5-flash': 4.0, 'gemini-2.0-flash': 1.0}
+
+EPS = 1e-6
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * (len(ordered) - 1)))]
+
+
+def build_tree(spans):
+    """span 목록 → (루트 span, {span_id: [자식 span]})"""
+    children = defaultdict(list)
+    root = None
+    for s in spans:
+        if s.parent is None:
+            root = s
+        else:
+            children[s.parent.span_id].append(s)
+    return root, children
+
+
+def covered_time(intervals):
+    """겹치는 구간을 합친 총 길이"""
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def critical_path(s, children):
+    """
+    응답 시간을 결정한 구간 목록 [(이름, 초)]
+    - 부모 종료 시점부터 거꾸로, 그 시점 이전에 가장 늦게 끝난 자식을 따라가며 계산
+    - 자식이 없는 빈 구간은 해당 span의 자체 처리 시간('<이름> (self)', 자식이 없는 span은 이름 그대로)
+    """
+    segments = []
+    cursor = s.end
+    remaining = sorted(children.get(s.span_id, []), key=lambda c: c.end, reverse=True)
+    if not remaining:
+        return [(s.name, s.duration)]
+    while True:
+        candidates = [c for c in remaining if c.end <= cursor + EPS]
+        if not candidates:
+            break
+        child = candidates[0]
+        if cursor - child.end > EPS:
+            segments.append((f"{s.name} (self)", cursor - child.end))
+        segments.extend(critical_path(child, children))
+        cursor = child.start
+        remaining = [c for c in remaining if c is not child and c.end <= cursor + EPS]
+    if cursor - s.start > EPS:
+        segments.append((f"{s.name} (self)", cursor - s.start))
+    return segments
+
+
+def best_case(s, children, parallel_llm=False):
+    """
+    이론상 최소 처리 시간
+    - 다른 스레드에서 실행된 자식(fan-out)은 워커 수 제한 없이 동시에 실행된다고 보고 가장 긴 것만 반영
+    - 같은 스레드의 자식은 순차 실행 (parallel_llm=True면 같은 이름의 LLM 호출끼리는 동시 실행으로 계산)
+    - span 자체 처리 시간은 그대로 포함
+    """
+    kids = children.get(s.span_id, [])
+    own = s.duration - covered_time([(c.start, c.end) for c in kids])
+    sequential = [c for c in kids if c.thread == s.thread]
+    fan_out = [c for c in kids if c.thread != s.thread]
+
+    total = max(0.0, own)
+    llm_groups = defaultdict(list)
+    for child in sequential:
+        value = best_case(child, children, parallel_llm)
+        if parallel_llm and child.name.startswith('llm.'):
+            llm_groups[child.name].append(value)
+        else:
+            total += value
+    total += sum(max(values) for values in llm_groups.values())
+    if fan_out:
+        total += max(best_case(child, children, parallel_llm) for child in fan_out)
+    return total
+
+
+def idle_worker_time(spans, children):
+    """fan-out 구간에서 워커가 일하지 않은 시간 합계 (워커 수 × 구간 길이 - 실제 작업 시간)"""
+    idle = 0.0
+    for s in spans:
+        # 추측 실행(prefetch.*)은 요청 전체에 걸친 백그라운드 작업이므로 fan-out으로 보지 않음
+        fan_out = [c for c in children.get(s.span_id, [])
+                   if c.thread != s.thread and not c.name.startswith('prefetch.')]
+        if not fan_out:
+            continue
+        workers = s.attributes.get('workers') or len({c.thread for c in fan_out})
+        idle += max(0.0, workers * s.duration - sum(c.duration for c in fan_out))
+    return idle
+
+
+def analyze_trace(spans):
+    """요청 하나의 span 분석 결과"""
+    root, children = build_tree(spans)
+    path = defaultdict(float)
+    for name, seconds in critical_path(root, children):
+        path[name] += seconds
+    llm_spans = [s for s in spans if s.name.startswith('llm.')]
+    return {
+        'wall': root.duration,
+        'critical_path': dict(path),
+        'llm_calls': len(llm_spans),
+        'llm_time': sum(s.duration for s in llm_spans),
+        'llm_tokens': root.attributes.get('llm_prompt_tokens', 0) + root.attributes.get('llm_output_tokens', 0),
+        'idle_worker': idle_worker_time(spans, children),
+        'best_unbounded': best_case(root, children),
+        'best_parallel_llm': best_case(root, children, parallel_llm=True),
+    }
+
+
+def run_bench(q_types, runs, model_latency, sigma, seed=0):
+    """질문 유형별로 runs회 실행하고 span 분석 결과 수집"""
+    import utils
+    from fake_llm import FakeLLMClient
+    from progress import NullSink
+    from tracing import TRACER, ListTraceExporter, span
+    from api_server import answer_question
+    from answer_cache import ANSWER_CACHE
+
+    # 같은 질의를 반복 실행하므로 최종 답변 캐시는 끔 (처리 경로 전체를 측정)
+    ANSWER_CACHE.max_entries = 0
+    utils.client = FakeLLMClient(latency=1.0, sigma=sigma, seed=seed, model_latency=model_latency)
+    hs_manager = utils.HSDataManager()
+    utils.warm_up(hs_manager)
+
+    exporter = TRACER.add_exporter(ListTraceExporter())
+    results = defaultdict(list)
+    try:
+        for q_type in q_types:
+            for i in range(runs):
+                print(f"  실행 중: {q_type} ({i + 1}/{runs})")
+                exporter.spans.clear()
+                with span('request', q_type=q_type, source='bench'):
+                    answer_question(q_type, BENCH_QUERIES[q_type], hs_manager, NullSink())
+                results[q_type].append(analyze_trace(list(exporter.spans)))
+    finally:
+        TRACER.remove_exporter(exporter)
+    return results
+
+
+def summarize(samples):
+    """여러 실행 결과의 평균/중앙값"""
+    def mean(key):
+        return sum(s[key] for s in samples) / len(samples)
+
+    path = defaultdict(float)
+    for s in samples:
+        for name, seconds in s['critical_path'].items():
+            path[name] += seconds / len(samples)
+    walls = sorted(s['wall'] for s in samples)
+    return {
+        'runs': len(samples),
+        'wall_mean': mean('wall'),
+        'wall_p50': percentile(walls, 0.50),
+        'wall_max': walls[-1],
+        'llm_calls': mean('llm_calls'),
+        'llm_time': mean('llm_time'),
+        'llm_tokens': mean('llm_tokens'),
+        'idle_worker': mean('idle_worker'),
+        'best_unbounded': mean('best_unbounded'),
+        'best_parallel_llm': mean('best_parallel_llm'),
+        'critical_path': dict(sorted(path.items(), key=lambda x: x[1], reverse=True)),
+    }
+
+
+def print_report(summaries, top=8):
+    """질문 유형별 요약과 임계 경로 구성 출력"""
+    print("\n=== 처리 경로별 지연 시간 분석 (가짜 LLM) ===")
+    print(f"{'q_type':<18}{'runs':>5}{'wall':>8}{'max':>8}{'LLM calls':>11}{'LLM sum':>9}{'tokens':>9}"
+          f"{'idle wkr':>10}{'best①':>8}{'best②':>8}")
+    for q_type, s in summaries.items():
+        print(f"{q_type:<18}{s['runs']:>5}{s['wall_mean']:>7.2f}s{s['wall_max']:>7.2f}s"
+              f"{s['llm_calls']:>11.1f}{s['llm_time']:>8.1f}s{s['llm_tokens']:>9.0f}{s['idle_worker']:>9.2f}s{s['best_unbounded']:>7.2f}s{s['best_parallel_llm']:>7.2f}s")
+    print("  wall: 평균 응답 시간, tokens: 요청당 LLM 토큰(prompt+output), idle wkr: 유휴 워커 시간 합계")
+    print("  best①: 워커 수 제한 없는 fan-out, best②: ① + 독립 LLM 호출(요약 등) 동시 실행")
+
+    for q_type, s in summaries.items():
+        print(f"\n[{q_type}] 임계 경로 (평균 {s['wall_mean']:.2f}s)")
+        for name, seconds in list(s['critical_path'].items())[:top]:
+            share = seconds / s['wall_mean'] * 100 if s['wall_mean'] else 0.0
+            print(f"  {name:<34}{seconds:>8.2f}s {share:>5.1f}%")
+
+
+def parse_model_latency(values):
+    model_latency = dict(DEFAULT_MODEL_LATENCY)
+    for value in values or []:
+        model, _, seconds = value.partition('=')
+        model_latency[model.strip()] = float(seconds)
+    return model_latency
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HS 챗봇 처리 경로별 end-to-end 지연 시간 분석")
+    parser.add_argument('--q-types', default=','.join(BENCH_QUERIES), help="측정할 질문 유형 (쉼표로 구분)")
+    parser.add_argument('--runs', type=int, default=3, help="질문 유형별 실행 횟수")
+    parser.add_argument('--model-latency', action='append', metavar='MODEL=SECONDS',
+                        help="모델별 지연 시간 중앙값 (여러 번 지정 가능)")
+    parser.add_argument('--sigma', type=float, default=0.3, help="지연 시간 로그정규 분포 표준편차 (0이면 고정)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    q_types = [q.strip() for q in args.q_types.split(',') if q.strip()]
+    unknown = [q for q in q_types if q not in BENCH_QUERIES]
+    if unknown:
+        parser.error(f"지원하지 않는 질문 유형: {', '.join(unknown)}")
+
+    model_latency = parse_model_latency(args.model_latency)
+    print(f"가짜 LLM 지연: {model_latency} (sigma={args.sigma})")
+    results = run_bench(q_types, args.runs, model_latency, args.sigma, args.seed)
+    print_report({q_type: summarize(samples) for q_type, samples in results.items()})
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+처리 진행 상황 이벤트 프로토콜
+- 처리 함수(handle_*)는 Streamlit을 직접 호출하지 않고 이벤트를 sink로 전달
+- Streamlit 화면 표시는 main.py의 sink가 담당하고, API 서버/일괄 처리/테스트는 아래의 UI 없는 sink 사용
+- 모든 sink는 기존 로거와 같은 log_actual(level, message, data) 메서드도 제공
+"""
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, asdict
+from typing import Any, ClassVar, Dict, List, Optional
+
+
+@dataclass
+class ProgressEvent:
+    """진행 이벤트 기본 클래스"""
+    kind: ClassVar[str] = "event"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'kind': self.kind, **asdict(self)}
+
+
+@dataclass
+class LogEvent(ProgressEvent):
+    """처리 로그 한 줄 (level: INFO, SUCCESS, ERROR, DATA, AI, SEARCH)"""
+    kind: ClassVar[str] = "log"
+    level: str
+    message: str
+    data: Any = None
+    ts: float = field(default_factory=time.time)
+
+
+@dataclass
+class StageStart(ProgressEvent):
+    """단계 시작 (progress: 0~1 진행률, 표시용)"""
+    kind: ClassVar[str] = "stage_start"
+    stage: str
+    message: str = ""
+    progress: Optional[float] = None
+    ts: float = field(default_factory=time.time)
+
+
+@dataclass
+class StageEnd(ProgressEvent):
+    """단계 종료 (status: 'ok' 또는 'error')"""
+    kind: ClassVar[str] = "stage_end"
+    stage: str
+    message: str = ""
+    progress: Optional[float] = None
+    status: str = "ok"
+    elapsed: Optional[float] = None
+    ts: float = field(default_factory=time.time)
+
+
+@dataclass
+class GroupResult(ProgressEvent):
+    """Multi-Agent 그룹별 분석 결과 (agent_type: 'domestic' 또는 'overseas')"""
+    kind: ClassVar[str] = "group_result"
+    agent_type: str
+    group_id: int
+    answer: str
+    start_time: str
+    processing_time: float
+    completed: int = 0
+    total: int = 0
+    ts: float = field(default_factory=time.time)
+
+
+@dataclass
+class CandidateList(ProgressEvent):
+    """
+    HS코드 후보 목록
+    stage: 'search'(병렬 검색 결과), 'summary'(해설서 요약 완료), 'user_codes'(사용자 제시 코드 정보)
+    """
+    kind: ClassVar[str] = "candidate_list"
+    stage: str
+    candidates: List[Dict[str, Any]]
+    query: str = ""
+    ts: float = field(default_factory=time.time)
+
+
+class ProgressSink(ABC):
+    """진행 이벤트 수신 인터페이스 (하위 클래스는 emit 구현)"""
+
+    @abstractmethod
+    def emit(self, event: ProgressEvent):
+        """이벤트 하나 처리"""
+
+    def log_actual(self, level, message, data=None):
+        """기존 로거 호환 메서드 (LogEvent로 전달)"""
+        self.emit(LogEvent(level, message, data))
+
+    def flush(self):
+        """버퍼링된 내용을 내보냄 (필요한 sink만 구현)"""
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class NullSink(ProgressSink):
+    """아무 것도 하지 않는 sink (UI/로그 오버헤드 없음)"""
+
+    def emit(self, event):
+        pass
+
+    def log_actual(self, level, message, data=None):
+        pass
+
+
+class ListSink(ProgressSink):
+    """이벤트를 리스트에 모으는 sink (일괄 처리 결과 기록, 테스트용)"""
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def emit(self, event):
+        with self._lock:
+            self.events.append(event)
+
+
+class QueueSink(ProgressSink):
+    """이벤트를 queue.Queue에 넣는 sink (API 서버 SSE 스트리밍, 워커 간 전달용)"""
+
+    def __init__(self, events_queue):
+        self.queue = events_queue
+
+    def emit(self, event):
+        self.queue.put(event)
+
+
+class JsonlSink(ProgressSink):
+    """이벤트를 한 줄에 하나씩 JSON으로 기록하는 sink"""
+
+    def __init__(self, path_or_file):
+        if isinstance(path_or_file, str):
+            self.file = open(path_or_file, 'a', encoding='utf-8')
+            self._owns_file = True
+        else:
+            self.file = path_or_file
+            self._owns_file = False
+        self._lock = threading.Lock()
+
+    def emit(self, event):
+        line = json.dumps(event.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self.file.write(line + "\n")
+
+    def flush(self):
+        with self._lock:
+            self.file.flush()
+
+    def close(self):
+        self.flush()
+        if self._owns_file:
+            self.file.close()
+
+
+class MultiSink(ProgressSink):
+    """여러 sink로 같은 이벤트를 전달"""
+
+    def __init__(self, *sinks):
+        self.sinks = [s for s in sinks if s is not None]
+
+    def emit(self, event):
+        for sink in self.sinks:
+            sink.emit(event)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def ensure_sink(sink):
+    """None이면 NullSink 반환"""
+    return sink if sink is not None else NullSink()
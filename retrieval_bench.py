@@ -0,0 +1,275 @@
+"""
+검색 경로 마이크로 벤치마크
+- knowledge/ 데이터를 한 번만 로드한 뒤 고정 질의 세트로 검색 함수를 개별 측정
+- 질의 세트: 국내 분류사례(HS분류사례_part1~10)의 product_name / hs_code 에서 일정 간격으로 추출 (실행마다 동일)
+- 함수별 지연 시간 분포(p50/p95/p99), 처리량(calls/s), 최대 메모리 사용량(tracemalloc) 출력
+- 기준값(baseline)을 JSON으로 저장하고, 이후 실행에서 허용 범위를 넘는 성능 저하가 있으면 종료 코드 1
+
+실행 예:
+    python retrieval_bench.py --save-baseline bench_baseline.json
+    python retrieval_bench.py --baseline bench_baseline.json --threshold 0.2
+    python retrieval_bench.py --only search_domestic,search_by_tariff_table --queries 20
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+# 해설서 데이터 (없으면 해설서 관련 함수는 건너뜀)
+MANUAL_FILE = 'knowledge/grouped_11_end.json'
+
+# 기준값과 비교할 기본 지연 시간 지표 (p95/p99는 질의 수가 적으면 변동이 커서 --keys로 선택)
+DEFAULT_COMPARE_KEYS = ['p50']
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * (len(ordered) - 1)))]
+
+
+def load_query_set(count=50):
+    """
+    국내 분류사례에서 고정 질의 세트 추출
+    Returns:
+        (품명 질의 리스트, HS코드 리스트)
+    """
+    items = []
+    for i in range(1, 11):
+        path = f'knowledge/HS분류사례_part{i}.json'
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                items.extend(json.load(f))
+
+    names, codes = [], []
+    seen = set()
+    for item in items:
+        name = str(item.get('product_name') or '').strip()
+        if name and name not in seen:
+            seen.add(name)
+            names.append(name)
+    for item in items:
+        digits = ''.join(ch for ch in str(item.get('hs_code') or '') if ch.isdigit())
+        if len(digits) >= 4 and digits[:4] not in codes:
+            codes.append(digits[:4])
+
+    # 전체 범위에서 일정 간격으로 선택 (특정 파트에 치우치지 않도록)
+    def spread(values):
+        if len(values) <= count:
+            return values
+        step = len(values) / count
+        return [values[int(i * step)] for i in range(count)]
+
+    return spread(names), spread(codes)
+
+
+def build_targets(hs_manager, tariff_searcher, parallel_searcher, has_manual):
+    """
+    측정 대상 함수 목록
+    Returns:
+        {이름: (입력 종류 'query'|'code', 호출 함수)}
+    """
+    from utils import lookup_hscode, get_tariff_info_for_codes
+    from progress import NullSink
+
+    sink = NullSink()
+    targets = {
+        'search': ('query', lambda q: hs_manager.search(q)),
+        'search_domestic': ('query', lambda q: hs_manager.search_domestic(q)),
+        'search_domestic_group': ('query', lambda q: [hs_manager.search_domestic_group(q, i) for i in range(5)]),
+        'search_overseas_group': ('query', lambda q: [hs_manager.search_overseas_group(q, i) for i in range(5)]),
+        'search_by_tariff_table': ('query', lambda q: tariff_searcher.search_by_tariff_table(q)),
+        'get_tariff_info_for_codes': ('code', lambda c: get_tariff_info_for_codes([c])),
+    }
+    if has_manual:
+        targets['lookup_hscode'] = ('code', lambda c: lookup_hscode(c, MANUAL_FILE))
+        targets['direct_manual_search'] = ('query', lambda q: parallel_searcher.direct_manual_search(q, sink))
+    return targets
+
+
+def measure(fn, inputs, repeat=1, warmup=1, max_seconds=10.0, min_samples=5):
+    """
+    한 함수의 호출별 지연 시간 측정
+    - 호출이 느린 함수는 max_seconds가 지나면 (최소 min_samples회 측정 후) 중단
+    """
+    for value in inputs[:warmup]:
+        fn(value)
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for value in inputs:
+            t0 = time.perf_counter()
+            fn(value)
+            latencies.append(time.perf_counter() - t0)
+            if len(latencies) >= min_samples and time.perf_counter() - started > max_seconds:
+                break
+        else:
+            continue
+        break
+
+    total = sum(latencies)
+    latencies.sort()
+    return {
+        'calls': len(latencies),
+        'mean': total / len(latencies) if latencies else 0.0,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'max': latencies[-1] if latencies else 0.0,
+        'throughput': len(latencies) / total if total > 0 else 0.0,
+    }
+
+
+def measure_peak_memory(fn, inputs, samples=5, max_seconds=10.0):
+    """
+    몇 개의 입력으로 호출 중 최대 추가 메모리 사용량(KB) 측정 (지연 시간 측정과 분리)
+    - tracemalloc 사용 시 호출이 느려지므로 max_seconds가 지나면 (최소 1회 측정 후) 중단
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        for value in inputs[:samples]:
+            fn(value)
+            if time.perf_counter() - started > max_seconds:
+                break
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+def run_benchmark(query_count=50, repeat=1, max_seconds=10.0, only=None, memory=True, cache=False):
+    """
+    knowledge/ 데이터를 한 번 로드하고 모든 대상 함수 측정
+    - cache=False(기본)면 검색 결과 캐시(retrieval_cache.py)를 끄고 실제 검색 비용 측정
+    """
+    from utils import HSDataManager, TariffTableSearcher, ParallelHSSearcher, warm_up
+    from retrieval_cache import RETRIEVAL_CACHE
+
+    if not cache:
+        RETRIEVAL_CACHE.max_entries = 0
+
+    load_start = time.perf_counter()
+    hs_manager = HSDataManager()
+    tariff_searcher = TariffTableSearcher()
+    parallel_searcher = ParallelHSSearcher(hs_manager)
+    warm_up(hs_manager, ('domestic', 'overseas', 'tariff', 'notes'))  # 로드 시간이 첫 검색에 섞이지 않도록
+    load_time = time.perf_counter() - load_start
+
+    has_manual = os.path.exists(MANUAL_FILE)
+    if not has_manual:
+        print(f"Warning: {MANUAL_FILE} not found - lookup_hscode, direct_manual_search 측정 생략")
+
+    queries, codes = load_query_set(query_count)
+    targets = build_targets(hs_manager, tariff_searcher, parallel_searcher, has_manual)
+    if only:
+        targets = {name: target for name, target in targets.items() if name in only}
+
+    results = {}
+    for name, (kind, fn) in targets.items():
+        inputs = queries if kind == 'query' else codes
+        print(f"  측정 중: {name} ({len(inputs)} inputs)")
+        stats = measure(fn, inputs, repeat=repeat, max_seconds=max_seconds)
+        if memory:
+            stats['peak_kb'] = measure_peak_memory(fn, inputs, max_seconds=max_seconds)
+        results[name] = stats
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'load_time': load_time,
+        'query_count': len(queries),
+        'code_count': len(codes),
+        'results': results,
+    }
+
+
+def compare_to_baseline(report, baseline, threshold=0.2, memory_threshold=0.5, keys=None, min_delta=0.0005):
+    """
+    기준값 대비 성능 저하 목록
+    - 지연 시간(keys, 기본 p50)이 threshold 비율 이상 늘거나 최대 메모리가 memory_threshold 비율 이상 늘면 저하로 판단
+    - min_delta(초) 이하의 차이는 측정 오차로 보고 무시
+    """
+    regressions = []
+    for name, current in report['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        for key in keys or DEFAULT_COMPARE_KEYS:
+            before, after = base.get(key, 0.0), current.get(key, 0.0)
+            if after - before > min_delta and after > before * (1 + threshold):
+                regressions.append(f"{name}.{key}: {before * 1000:.2f}ms → {after * 1000:.2f}ms")
+        if 'peak_kb' in base and 'peak_kb' in current:
+            before, after = base['peak_kb'], current['peak_kb']
+            if after > before * (1 + memory_threshold) and after - before > 64:
+                regressions.append(f"{name}.peak_kb: {before:.0f}KB → {after:.0f}KB")
+    return regressions
+
+
+def print_report(report, baseline=None):
+    """함수별 측정 결과 출력 (기준값이 있으면 p50 변화율 함께 표시)"""
+    print("\n=== 검색 경로 벤치마크 ===")
+    print(f"데이터 로드: {report['load_time']:.2f}s | 질의 {report['query_count']}개, HS코드 {report['code_count']}개")
+    header = f"{'function':<28}{'calls':>7}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'calls/s':>10}{'peak(KB)':>10}"
+    if baseline:
+        header += f"{'Δp50':>9}"
+    print(header)
+    for name, s in report['results'].items():
+        line = (f"{name:<28}{s['calls']:>7}{s['p50'] * 1000:>10.2f}{s['p95'] * 1000:>10.2f}"
+                f"{s['p99'] * 1000:>10.2f}{s['throughput']:>10.1f}{s.get('peak_kb', 0.0):>10.0f}")
+        base = (baseline or {}).get('results', {}).get(name)
+        if base and base.get('p50'):
+            line += f"{(s['p50'] / base['p50'] - 1) * 100:>+8.0f}%"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HS 챗봇 검색 경로 마이크로 벤치마크")
+    parser.add_argument('--queries', type=int, default=50, help="질의/HS코드 개수")
+    parser.add_argument('--repeat', type=int, default=1, help="질의 세트 반복 횟수")
+    parser.add_argument('--max-seconds', type=float, default=10.0, help="함수별 최대 측정 시간 (초)")
+    parser.add_argument('--only', help="측정할 함수 이름 (쉼표로 구분)")
+    parser.add_argument('--no-memory', action='store_true', help="메모리 측정 생략")
+    parser.add_argument('--cache', action='store_true', help="검색 결과 캐시를 켠 상태로 측정 (기본: 끔)")
+    parser.add_argument('--baseline', help="비교할 기준값 JSON 파일")
+    parser.add_argument('--save-baseline', help="측정 결과를 기준값 JSON으로 저장")
+    parser.add_argument('--threshold', type=float, default=0.2, help="지연 시간 허용 증가율 (0.2 = 20%%)")
+    parser.add_argument('--memory-threshold', type=float, default=0.5, help="최대 메모리 허용 증가율")
+    parser.add_argument('--keys', default=','.join(DEFAULT_COMPARE_KEYS), help="비교할 지연 시간 지표 (예: p50,p95)")
+    args = parser.parse_args(argv)
+
+    only = set(args.only.split(',')) if args.only else None
+    report = run_benchmark(args.queries, args.repeat, args.max_seconds, only, not args.no_memory, args.cache)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n기준값 저장: {args.save_baseline}")
+
+    if baseline:
+        regressions = compare_to_baseline(report, baseline, args.threshold, args.memory_threshold, args.keys.split(','))
+        if regressions:
+            print("\n❌ 성능 저하 감지:")
+            for item in regressions:
+                print(f"  - {item}")
+            return 1
+        print("\n✅ 기준값 대비 성능 저하 없음")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
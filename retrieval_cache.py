@@ -0,0 +1,123 @@
+"""
+검색 결과 공유 캐시 (프로세스 전체, 스레드 안전 LRU)
+- HSDataManager / TariffTableSearcher / ParallelHSSearcher 검색 메서드 앞에 두어 같은 질문의 검색을 다시 계산하지 않음
+- 키: (메서드 이름, 정규화된 질의(키워드 집합), 검색 인자, 데이터 버전) → 데이터 파일이 바뀌면 자동으로 다른 키 사용
+- 항목 수 상한을 넘으면 가장 오래 사용하지 않은 항목부터 제거
+- 적중/미스/제거 횟수는 Prometheus 카운터(hs_retrieval_cache_total, hs_retrieval_cache_evictions_total)와
+  현재 span의 cache_hit 속성으로 기록
+- 저장/반환 시 결과를 복사하므로 호출한 쪽에서 결과를 수정해도 캐시에 영향 없음
+
+환경 변수:
+    HS_RETRIEVAL_CACHE_SIZE : 최대 항목 수 (기본 1024, 0이면 캐시 사용 안 함)
+"""
+import copy
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+from tracing import TRACER, set_attributes
+
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class RetrievalCache:
+    """크기 제한 LRU 캐시 (Lock으로 보호, 계산은 Lock 밖에서 수행)"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, namespace, key, compute):
+        """
+        캐시된 결과 반환, 없으면 compute() 실행 후 저장
+        Returns:
+            (결과, 캐시 적중 여부)
+        """
+        if self.max_entries <= 0:
+            return compute(), False
+        full_key = (namespace, key)
+        with self.lock:
+            if full_key in self.entries:
+                self.entries.move_to_end(full_key)
+                value = self.entries[full_key]
+                self.hits += 1
+                hit = True
+            else:
+                self.misses += 1
+                hit = False
+        TRACER.metrics.inc('hs_retrieval_cache_total', 1, namespace=namespace, result='hit' if hit else 'miss')
+        if hit:
+            return copy.deepcopy(value), True
+
+        # 같은 키를 여러 스레드가 동시에 계산할 수 있지만 결과가 같으므로 마지막 저장만 유지
+        value = compute()
+        stored = copy.deepcopy(value)
+        evicted = 0
+        with self.lock:
+            self.entries[full_key] = stored
+            self.entries.move_to_end(full_key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                evicted += 1
+            self.evictions += evicted
+        if evicted:
+            TRACER.metrics.inc('hs_retrieval_cache_evictions_total', evicted)
+        return value, False
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """항목 수, 적중/미스/제거 횟수, 적중률"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+RETRIEVAL_CACHE = RetrievalCache(int(os.getenv('HS_RETRIEVAL_CACHE_SIZE', DEFAULT_MAX_ENTRIES)))
+
+
+def normalize_query(keywords):
+    """키워드 목록 → 순서/중복과 무관한 캐시 키 (정렬된 튜플)"""
+    return tuple(sorted(set(keywords)))
+
+
+def file_version(path):
+    """파일 버전 문자열 (수정 시각 + 크기, 없으면 'missing')"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 'missing'
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def cached_retrieval(namespace, key_fn, cache=None):
+    """
+    검색 메서드 결과 캐시 데코레이터
+    Args:
+        namespace: 캐시 구분 이름 (메서드 이름)
+        key_fn: 메서드와 같은 인자를 받아 캐시 키 튜플 반환 (정규화 질의 + 검색 인자 + 데이터 버전)
+        cache: 사용할 RetrievalCache (기본: RETRIEVAL_CACHE)
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            value, hit = (cache or RETRIEVAL_CACHE).get_or_compute(
+                namespace, key_fn(*args, **kwargs), lambda: fn(*args, **kwargs))
+            set_attributes(cache_hit=hit)
+            return value
+        return wrapper
+    return decorator
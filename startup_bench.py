@@ -0,0 +1,120 @@
+"""
+시작 시간(cold start) 벤치마크
+- 매 측정마다 새 Python 프로세스를 띄워 OS 외 캐시가 없는 상태에서 측정
+- import utils 소요 시간과 모듈별 import 비용(python -X importtime) 상위 항목 출력
+- 항목별 첫 호출 지연 시간 (import 후 처음 필요한 데이터/클라이언트를 로드하는 호출) 측정
+- utils는 import 시점에 파일/네트워크 작업을 하지 않으므로, 항목별 비용은 해당 기능을 처음 쓸 때만 발생
+
+실행 예:
+    python startup_bench.py
+    python startup_bench.py --runs 5 --only import,domestic,warm_up
+    python startup_bench.py --json startup_report.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# 항목별 첫 호출 (자식 프로세스에서 import utils 직후 실행)
+SCENARIOS = {
+    'import': "pass",
+    'llm': "utils.get_llm_client()",
+    'general_rules': "utils.get_general_rules()",
+    'domestic': "utils.HSDataManager().search_domestic('플라스틱 용기')",
+    'overseas': "utils.HSDataManager().search_overseas_group('plastic container', 3)",
+    'tariff': "utils.get_tariff_info_for_codes(['3923'])",
+    'notes': "utils.lookup_hscode('3923', utils.MANUAL_NOTES_JSON)",
+    'warm_up': "utils.warm_up(utils.HSDataManager())",
+}
+
+CHILD_TEMPLATE = """
+import json, time
+start = time.perf_counter()
+import utils
+imported = time.perf_counter()
+{call}
+done = time.perf_counter()
+print(json.dumps({{'import': imported - start, 'first_call': done - imported}}))
+"""
+
+
+def child_env():
+    """자식 프로세스 환경 (검색 캐시 끔, API 키가 없으면 더미 값 - 클라이언트 생성만 하고 호출하지 않음)"""
+    env = dict(os.environ)
+    env['HS_RETRIEVAL_CACHE_SIZE'] = '0'
+    env.setdefault('GOOGLE_API_KEY', 'startup-bench')
+    return env
+
+
+def measure_scenario(name, runs=3):
+    """
+    새 프로세스에서 import utils + 첫 호출 시간 측정
+    Returns:
+        {'import': 중앙값(초), 'first_call': 중앙값(초)}
+    """
+    samples = []
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, '-c', CHILD_TEMPLATE.format(call=SCENARIOS[name])],
+                                   capture_output=True, text=True, env=child_env())
+        if completed.returncode != 0:
+            raise RuntimeError(f"{name} failed: {completed.stderr.strip().splitlines()[-1:]}")
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return {key: statistics.median(sample[key] for sample in samples) for key in ('import', 'first_call')}
+
+
+def measure_importtime(module='utils', top=15):
+    """
+    python -X importtime 결과에서 누적 import 시간 상위 모듈
+    Returns:
+        (전체 누적 시간(초), [(모듈, 누적 시간(초)), ...])
+    """
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               capture_output=True, text=True, env=child_env())
+    modules = []
+    total = 0.0
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        seconds = int(cumulative) / 1e6
+        modules.append((name.strip(), seconds))
+        if name.strip() == module:
+            total = seconds
+    modules.sort(key=lambda item: item[1], reverse=True)
+    return total, [item for item in modules if item[0] != module][:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="utils import 및 항목별 첫 호출 시간 측정")
+    parser.add_argument('--runs', type=int, default=3, help="항목별 반복 횟수 (중앙값 사용)")
+    parser.add_argument('--only', help="측정할 항목 (쉼표 구분, 기본: 전체)")
+    parser.add_argument('--top', type=int, default=15, help="출력할 import 비용 상위 모듈 수")
+    parser.add_argument('--json', help="결과를 저장할 JSON 경로")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(',') if args.only else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+
+    total, modules = measure_importtime('utils', args.top)
+    print(f"=== import utils (-X importtime): {total * 1000:.0f}ms ===")
+    for name, seconds in modules:
+        print(f"  {name:<40}{seconds * 1000:>8.1f}ms")
+
+    results = {}
+    print(f"\n{'scenario':<16}{'import(ms)':>12}{'first call(ms)':>16}")
+    for name in names:
+        results[name] = measure_scenario(name, args.runs)
+        print(f"{name:<16}{results[name]['import'] * 1000:>12.0f}{results[name]['first_call'] * 1000:>16.0f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'importtime': total, 'modules': modules, 'scenarios': results}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+관세율표 조회용 열 단위 배열 저장소
+- 품목분류표_제작/hstable_pre.py 가 만든 knowledge/hstable.npz (품목번호 정렬 배열 + 관세율구분별 관세율)를 로드
+- 품목번호는 10자리로 0을 채운 정수와 원래 자릿수로 저장하여 np.searchsorted 이진 탐색으로 여러 코드를 한 번에 조회
+- 품명은 중복 제거된 UTF-8 바이트 배열에서 필요할 때만 디코딩 (pickle 미사용)
+- npz(비압축 zip)의 각 배열을 파일 위치 그대로 memory-map 하므로 여러 프로세스가 같은 페이지 캐시를 공유
+  (프로세스 추가 시 배열 복사/파싱 없음)
+- npz 파일이 없으면 지식 DB(HS_KNOWLEDGE_DB) 또는 knowledge/hstable.json 으로 같은 배열을 한 번 만들어 사용 (관세율 정보 없음)
+"""
+import json
+import os
+import threading
+import zipfile
+
+import numpy as np
+
+from knowledge_db import get_knowledge_db
+from retrieval_cache import file_version
+
+TARIFF_NPZ = 'knowledge/hstable.npz'
+TARIFF_JSON = 'knowledge/hstable.json'
+CODE_DIGITS = 10
+
+# 품목번호 후보 검증 신뢰도
+# - 관세율표에 같은 번호가 있으면 1.0, 관세율표 번호의 앞부분이면(예: '392310' → 3923100000) 0.9
+# - 둘 다 아니면 8/6/4자리로 줄여 가며 유효한 앞부분을 찾고, 줄인 자릿수에 따라 낮은 신뢰도
+EXACT_CONFIDENCE = 1.0
+PREFIX_CONFIDENCE = 0.9
+TRUNCATED_CONFIDENCE = {8: 0.7, 6: 0.6, 4: 0.4}
+
+
+def normalize_code(code):
+    """품목번호 → 숫자만 남긴 문자열 (예: '39.23' → '3923')"""
+    return ''.join(ch for ch in str(code or '') if ch in '0123456789')[:CODE_DIGITS]
+
+
+class TariffStore:
+    """
+    정렬된 관세율표 배열
+    - 정렬 키: 10자리 품목번호 * 100 + 자릿수 (같은 번호면 짧은 코드(호/소호)가 먼저)
+    """
+
+    def __init__(self, codes, digits, korean_idx, english_idx, strings_blob, strings_offsets,
+                 rate_names=(), rates=None, source=''):
+        self.codes = np.asarray(codes, dtype=np.int64)
+        self.digits = np.asarray(digits, dtype=np.uint8)
+        self.keys = self.codes * 100 + self.digits
+        self.korean_idx = np.asarray(korean_idx)
+        self.english_idx = np.asarray(english_idx)
+        self._blob = np.asarray(strings_blob, dtype=np.uint8)
+        self._offsets = np.asarray(strings_offsets, dtype=np.int64)
+        self.rate_names = [str(name) for name in rate_names]
+        self.rates = rates if rates is not None else np.empty((len(self.codes), 0), dtype=np.float32)
+        self.source = source
+        self.version = file_version(source) if source else ''
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def load_npz(cls, path=TARIFF_NPZ, mmap=True):
+        """npz 로드 (mmap=True면 배열을 복사하지 않고 파일에 memory-map)"""
+        data = mmap_npz(path) if mmap else None
+        if data is None:
+            with np.load(path, allow_pickle=False) as loaded:
+                data = {name: loaded[name] for name in loaded.files}
+        return cls(data['codes'], data['digits'], data['korean_idx'], data['english_idx'],
+                   data['strings_blob'], data['strings_offsets'],
+                   data['rate_names'].tolist(), data['rates'], source=path)
+
+    @classmethod
+    def from_records(cls, records, source=''):
+        """hstable.json 형식 레코드 목록으로 생성 (관세율 없음)"""
+        rows = []
+        for item in records:
+            code = normalize_code(item.get('품목번호', ''))
+            if code:
+                rows.append((int(code.ljust(CODE_DIGITS, '0')), len(code),
+                             str(item.get('한글품명') or ''), str(item.get('영문품명') or '')))
+        rows.sort(key=lambda row: (row[0], row[1]))
+
+        strings = {}
+        for _, _, korean, english in rows:
+            strings.setdefault(korean, len(strings))
+            strings.setdefault(english, len(strings))
+        encoded = [value.encode('utf-8') for value in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(value) for value in encoded])
+
+        return cls([row[0] for row in rows], [row[1] for row in rows],
+                   [strings[row[2]] for row in rows], [strings[row[3]] for row in rows],
+                   np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets, source=source)
+
+    @classmethod
+    def load_json(cls, path=TARIFF_JSON):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_records(json.load(f), source=path)
+
+    def _string(self, index):
+        return bytes(self._blob[self._offsets[index]:self._offsets[index + 1]]).decode('utf-8')
+
+    def rows(self):
+        """(품목번호, 한글품명, 영문품명)을 품목번호 순서로 반환 (품명은 필요할 때 디코딩)"""
+        blob = memoryview(self._blob)
+        offsets = self._offsets.tolist()
+        for row, (korean, english) in enumerate(zip(self.korean_idx.tolist(), self.english_idx.tolist())):
+            yield (self.code(row),
+                   str(blob[offsets[korean]:offsets[korean + 1]], 'utf-8'),
+                   str(blob[offsets[english]:offsets[english + 1]], 'utf-8'))
+
+    def find_exact(self, codes):
+        """
+        품목번호가 정확히 일치하는 행 번호 (없으면 -1)
+        Args:
+            codes: 품목번호 목록 ('3923.10-1000' 등 구분자 허용)
+        Returns:
+            np.ndarray (int64)
+        """
+        normalized = [normalize_code(code) for code in codes]
+        wanted = np.array([int(c.ljust(CODE_DIGITS, '0')) * 100 + len(c) if c else -1 for c in normalized],
+                          dtype=np.int64)
+        positions = np.searchsorted(self.keys, wanted)
+        clipped = np.minimum(positions, len(self.keys) - 1)
+        found = (positions < len(self.keys)) & (self.keys[clipped] == wanted)
+        return np.where(found, clipped, -1)
+
+    def find_prefix(self, prefixes):
+        """
+        품목번호가 접두어로 시작하는 첫 번째 행 번호 (없으면 -1)
+        - 접두어 범위 [접두어000..., 접두어999...]를 이진 탐색
+        """
+        normalized = [normalize_code(prefix) for prefix in prefixes]
+        low = np.array([int(p.ljust(CODE_DIGITS, '0')) * 100 if p else -1 for p in normalized], dtype=np.int64)
+        high = np.array([int(p.ljust(CODE_DIGITS, '9')) * 100 + 99 if p else -1 for p in normalized], dtype=np.int64)
+        start = np.searchsorted(self.keys, low, side='left')
+        end = np.searchsorted(self.keys, high, side='right')
+        return np.where(end > start, start, -1)
+
+    def validate(self, codes):
+        """
+        품목번호 후보 검증 (관세율표에 있는 호/소호/세번과 그 앞부분만 인정)
+        Args:
+            codes: 품목번호 후보 목록 (4자리 이상)
+        Returns:
+            [(정규화된 품목번호 또는 None, 신뢰도), ...] (유효하지 않으면 (None, 0.0))
+        """
+        normalized = [normalize_code(code) for code in codes]
+        exact_rows = self.find_exact(normalized)
+        prefix_rows = self.find_prefix(normalized)
+        results = []
+        for code, exact_row, prefix_row in zip(normalized, exact_rows, prefix_rows):
+            if len(code) < 4:
+                results.append((None, 0.0))
+            elif exact_row >= 0:
+                results.append((code, EXACT_CONFIDENCE))
+            elif prefix_row >= 0:
+                results.append((code, PREFIX_CONFIDENCE))
+            else:
+                lengths = [length for length in TRUNCATED_CONFIDENCE if length < len(code)]
+                rows = self.find_prefix([code[:length] for length in lengths]) if lengths else []
+                results.append(next(((code[:length], TRUNCATED_CONFIDENCE[length])
+                                     for length, row in zip(lengths, rows) if row >= 0), (None, 0.0)))
+        return results
+
+    def code(self, row):
+        return str(int(self.codes[row])).zfill(CODE_DIGITS)[:int(self.digits[row])]
+
+    def rates_for(self, row):
+        """관세율구분별 관세율 (값이 없는 구분은 제외)"""
+        if row < 0 or not self.rate_names:
+            return {}
+        values = self.rates[row]
+        return {name: float(value) for name, value in zip(self.rate_names, values) if not np.isnan(value)}
+
+    def record(self, row):
+        """행 번호 → {'품목번호', '한글품명', '영문품명', 'rates'} (row가 -1이면 None)"""
+        if row < 0:
+            return None
+        return {
+            '품목번호': self.code(row),
+            '한글품명': self._string(self.korean_idx[row]),
+            '영문품명': self._string(self.english_idx[row]),
+            'rates': self.rates_for(row),
+        }
+
+
+_NPY_HEADER_READERS = {
+    (1, 0): np.lib.format.read_array_header_1_0,
+    (2, 0): np.lib.format.read_array_header_2_0,
+}
+
+
+def mmap_npz(path):
+    """
+    비압축 npz의 배열들을 파일 위치 그대로 memory-map
+    Returns:
+        {이름: np.memmap} (압축된 항목이 있으면 None → 일반 로드 사용)
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED or not info.filename.endswith('.npy'):
+                return None
+            # 로컬 파일 헤더(30바이트 + 파일명 + extra) 다음이 .npy 데이터
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype='<u2')
+            f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            read_header = _NPY_HEADER_READERS.get(np.lib.format.read_magic(f))
+            if read_header is None:
+                return None
+            shape, fortran_order, dtype = read_header(f)
+            if dtype.hasobject:
+                return None
+            arrays[info.filename[:-4]] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                                   order='F' if fortran_order else 'C')
+    return arrays
+
+
+_store_lock = threading.Lock()
+_store_instance = None
+
+
+def get_tariff_store():
+    """
+    관세율표 배열 저장소 (프로세스당 한 번만 로드)
+    - knowledge/hstable.npz 가 있으면 memory-map 으로 사용
+    - 없으면 지식 DB의 관세율표, DB도 없으면 knowledge/hstable.json 으로 생성
+    """
+    global _store_instance
+    if _store_instance is None:
+        with _store_lock:
+            if _store_instance is None:
+                db = get_knowledge_db()
+                if os.path.exists(TARIFF_NPZ):
+                    _store_instance = TariffStore.load_npz(TARIFF_NPZ)
+                elif db is not None:
+                    _store_instance = TariffStore.from_records(db.tariff_rows())
+                    _store_instance.version = f"db:{db.meta.get('built_at', '')}"
+                else:
+                    print(f"Warning: {TARIFF_NPZ} not found, building tariff store from {TARIFF_JSON} (no rates)")
+                    _store_instance = TariffStore.load_json(TARIFF_JSON)
+    return _store_instance
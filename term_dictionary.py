@@ -0,0 +1,218 @@
+"""
+한영 품명 용어 사전 (해외 분류사례 검색 질의 확장용)
+- 관세율표(hstable.json)의 같은 행에 있는 한글품명/영문품명 단어 쌍의 동시 출현 횟수로 대응어를 추출 (오프라인 빌드)
+  - 점수: Dice 계수 2 * 동시 출현 / (한글 단어 출현 + 영어 단어 출현), 최소 동시 출현 횟수/점수 이상인 쌍만 사용
+  - 단어마다 최고 점수의 RELATIVE_SCORE배 이상인 상위 MAX_TRANSLATIONS개 대응어만 저장 (한→영, 영→한 양방향)
+- 영어 단어는 casefold 해서 저장 (분류사례 키워드 색인도 casefold, knowledge_db.extract_keywords)
+  - 관세율표 영문품명은 대부분 복수형('plastics')이므로 질의 확장 시 단수형도 추가하고, 조회 시 복수형으로도 찾음
+- 한글 단어는 끝의 조사를 떼고 사용 ('용기에' → '용기', 사전 추출과 질의 조회에 같은 규칙) → 딕셔너리 한 번 조회
+- 관세율표의 반복되는 품명 쌍('밀폐용기에 넣은 것' 등)은 한 번만 셈
+- knowledge/term_dict.json 이 없으면 지식 DB 또는 hstable.json 으로 처음 사용할 때 한 번 만들어 사용
+
+빌드 / 확인:
+    python term_dictionary.py build --out knowledge/term_dict.json
+    python term_dictionary.py show 플라스틱 용기 bracelet
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+
+from knowledge_db import get_knowledge_db
+
+TERM_DICT_JSON = 'knowledge/term_dict.json'
+TARIFF_JSON = 'knowledge/hstable.json'
+
+MIN_PAIR_COUNT = 2
+MIN_DICE = 0.3
+MAX_TRANSLATIONS = 3
+RELATIVE_SCORE = 0.6
+# 단어 끝에서 뗄 조사 (긴 것부터 확인, 남는 부분이 2자 이상일 때만)
+KOREAN_PARTICLES = ('으로서', '으로써', '에서의', '에서', '으로', '에는', '에의', '로서', '로써',
+                    '에', '의', '을', '를', '은', '는', '과', '와', '로')
+
+# 품명의 구분 문자 (가운뎃점은 \w 로 취급되므로 따로 처리)
+KOREAN_SEPARATORS = re.compile(r'[ㆍ·\W_]+')
+ENGLISH_WORD = re.compile(r'[A-Za-z]{3,}')
+KOREAN_STOPWORDS = {
+    '기타', '그', '밖의', '것', '것으로서', '것으로', '제외한', '포함한', '및', '또는', '그러한', '이와', '유사한',
+    '해당', '따로', '분류되지', '않은', '이상', '이하', '초과', '미만', '있는', '없는', '것을', '것은', '등',
+}
+ENGLISH_STOPWORDS = {
+    'the', 'and', 'for', 'with', 'other', 'others', 'not', 'than', 'its', 'their', 'whether', 'but', 'excluding',
+    'including', 'elsewhere', 'specified', 'included', 'thereof', 'such', 'those', 'which', 'containing', 'from',
+    'this', 'that', 'use', 'used', 'are', 'more', 'less', 'exceeding', 'nes',
+}
+
+
+def strip_particle(word):
+    """한글 단어 끝의 조사 제거 ('플라스틱으로' → '플라스틱')"""
+    for particle in KOREAN_PARTICLES:
+        if word.endswith(particle) and len(word) - len(particle) >= 2:
+            return word[:-len(particle)]
+    return word
+
+
+def korean_terms(text):
+    """한글품명 → 조사를 뗀 한글 단어 집합 (2자 이상, 불용어 제외)"""
+    words = {strip_particle(word) for word in KOREAN_SEPARATORS.split(text or '') if not word.isascii()}
+    return {word for word in words if len(word) >= 2 and word not in KOREAN_STOPWORDS}
+
+
+def english_terms(text):
+    """영문품명 → casefold 한 영어 단어 집합 (3자 이상, 불용어 제외)"""
+    return {word.casefold() for word in ENGLISH_WORD.findall(text or '')} - ENGLISH_STOPWORDS
+
+
+def english_variants(word):
+    """영어 단어와 단수/복수형 ('plastics' → ['plastics', 'plastic'])"""
+    if word.endswith('s') and not word.endswith('ss') and len(word) > 4:
+        return [word, word[:-1]]
+    return [word, word + 's']
+
+
+def mine_terms(rows, min_count=MIN_PAIR_COUNT, min_dice=MIN_DICE, max_translations=MAX_TRANSLATIONS):
+    """
+    (한글품명, 영문품명) 목록 → 양방향 대응어
+    Returns:
+        ({한글 단어: [영어 단어, ...]}, {영어 단어: [한글 단어, ...]}) - 대응어는 점수 높은 순
+    """
+    korean_count, english_count, pair_count = Counter(), Counter(), Counter()
+    for korean, english in dict.fromkeys(rows):
+        korean_words, english_words = korean_terms(korean), english_terms(english)
+        if not korean_words or not english_words:
+            continue
+        korean_count.update(korean_words)
+        english_count.update(english_words)
+        pair_count.update((k, e) for k in korean_words for e in english_words)
+
+    ko_en, en_ko = {}, {}
+    for (k, e), count in pair_count.items():
+        if count < min_count:
+            continue
+        dice = 2 * count / (korean_count[k] + english_count[e])
+        if dice >= min_dice:
+            ko_en.setdefault(k, []).append((dice, e))
+            en_ko.setdefault(e, []).append((dice, k))
+
+    def top(candidates):
+        selected = {}
+        for term, pairs in sorted(candidates.items()):
+            pairs.sort(key=lambda pair: (-pair[0], pair[1]))
+            selected[term] = [word for dice, word in pairs[:max_translations] if dice >= pairs[0][0] * RELATIVE_SCORE]
+        return selected
+    return top(ko_en), top(en_ko)
+
+
+class TermDictionary:
+    """
+    한영 대응어 조회
+    Attributes:
+        ko_en: {한글 단어: [영어 단어, ...]}
+        en_ko: {영어 단어(casefold): [한글 단어, ...]}
+    """
+
+    def __init__(self, ko_en, en_ko, source=''):
+        self.ko_en = ko_en
+        self.en_ko = en_ko
+        self.source = source
+
+    @classmethod
+    def from_rows(cls, rows, source=''):
+        return cls(*mine_terms(rows), source=source)
+
+    @classmethod
+    def load(cls, path=TERM_DICT_JSON):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['ko_en'], data['en_ko'], source=path)
+
+    def save(self, path=TERM_DICT_JSON):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'built_at': datetime.now().isoformat(timespec='seconds'), 'source': self.source,
+                       'ko_en': self.ko_en, 'en_ko': self.en_ko}, f, ensure_ascii=False)
+
+    def translate(self, word):
+        """
+        질의 단어의 대응어
+        - 영어: casefold 후 조회, 없으면 단수/복수형으로 조회
+        - 한글: 그대로, 없으면 조사를 떼고 조회 ('플라스틱으로' → '플라스틱')
+        Returns:
+            대응어 리스트 (없으면 빈 리스트)
+        """
+        if word.isascii():
+            return next((self.en_ko[variant] for variant in english_variants(word.casefold())
+                         if variant in self.en_ko), [])
+        return self.ko_en.get(word) or self.ko_en.get(strip_particle(word), [])
+
+    def expand(self, keywords):
+        """키워드 목록 + 대응어 (영어 대응어는 단수/복수형 포함, 순서 유지, 중복 제거)"""
+        expanded = dict.fromkeys(keywords)
+        for keyword in keywords:
+            for translation in self.translate(keyword):
+                expanded.update(dict.fromkeys(english_variants(translation) if translation.isascii() else [translation]))
+        return list(expanded)
+
+
+def tariff_name_rows(path=TARIFF_JSON):
+    """관세율표 (한글품명, 영문품명) 목록 (지식 DB가 있으면 DB, 없으면 hstable.json)"""
+    db = get_knowledge_db()
+    if db is not None:
+        records = db.tariff_rows()
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+    return [(item.get('한글품명', ''), item.get('영문품명', '')) for item in records]
+
+
+_dictionary_lock = threading.Lock()
+_dictionary_instance = None
+
+
+def get_term_dictionary():
+    """
+    한영 용어 사전 (프로세스당 한 번만 로드)
+    - knowledge/term_dict.json 이 있으면 로드, 없으면 관세율표에서 추출
+    """
+    global _dictionary_instance
+    if _dictionary_instance is None:
+        with _dictionary_lock:
+            if _dictionary_instance is None:
+                if os.path.exists(TERM_DICT_JSON):
+                    _dictionary_instance = TermDictionary.load(TERM_DICT_JSON)
+                else:
+                    print(f"Warning: {TERM_DICT_JSON} not found, mining term dictionary from tariff names")
+                    _dictionary_instance = TermDictionary.from_rows(tariff_name_rows(), source=TARIFF_JSON)
+    return _dictionary_instance
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="한영 품명 용어 사전 빌드/확인")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="관세율표에서 사전 추출")
+    build.add_argument('--tariff', default=TARIFF_JSON, help="관세율표 JSON")
+    build.add_argument('--out', default=TERM_DICT_JSON, help="저장할 사전 JSON 경로")
+    show = sub.add_parser('show', help="단어별 대응어 확인")
+    show.add_argument('words', nargs='+', help="조회할 단어")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        with open(args.tariff, 'r', encoding='utf-8') as f:
+            rows = [(item.get('한글품명', ''), item.get('영문품명', '')) for item in json.load(f)]
+        dictionary = TermDictionary.from_rows(rows, source=args.tariff)
+        dictionary.save(args.out)
+        print(f"{args.out}: 한→영 {len(dictionary.ko_en)}개, 영→한 {len(dictionary.en_ko)}개 (관세율표 {len(rows)}행)")
+        return 0
+
+    dictionary = get_term_dictionary()
+    for word in args.words:
+        print(f"{word}: {', '.join(dictionary.translate(word)) or '-'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
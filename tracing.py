@@ -0,0 +1,410 @@
+"""
+구조화된 추적(tracing)과 지표(metrics)
+- span: 검색, LLM 호출, 요약, Head Agent, 화면 표시 등 단계별 소요 시간을 중첩 구조로 기록
+- span 속성: model, prompt_chars/prompt_tokens, cache_hit, group_id 등
+- 추적 결과는 JSONL로 내보내고, 지표는 Prometheus 텍스트 형식으로 제공 (q_type/stage별 지연 시간 히스토그램)
+
+사용 예:
+    from tracing import span, configure_tracing
+    configure_tracing(jsonl_path='traces.jsonl')
+    with span('request', q_type='hs_classification'):
+        with span('retrieval', group_id=0):
+            ...
+
+환경 변수:
+    HS_TRACE_FILE  : 지정 시 해당 경로에 span을 JSONL로 기록
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 현재 실행 중인 span (스레드/컨텍스트별)
+_current_span = contextvars.ContextVar('hs_current_span', default=None)
+
+# 지연 시간 히스토그램 구간 (초)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0, 120.0)
+
+
+def estimate_tokens(text):
+    """
+    프롬프트 토큰 수 추정 (호출 전 크기 판단용)
+    - 영문/숫자(ASCII)는 약 4자당 1토큰, 한글 등은 약 1.5자당 1토큰으로 계산
+    """
+    if not text:
+        return 0
+    text = str(text)
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    other_chars = len(text) - ascii_chars
+    return int(ascii_chars / 4 + other_chars / 1.5) + 1
+
+
+class Span:
+    """하나의 처리 구간"""
+
+    def __init__(self, name, trace, parent=None, attributes=None):
+        self.name = name
+        self.trace = trace
+        self.parent = parent
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.end = None
+        self.status = 'ok'
+        self.thread = threading.current_thread().name
+
+    @property
+    def duration(self):
+        return (self.end or time.time()) - self.start
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent.span_id if self.parent else None,
+            'name': self.name,
+            'start': self.start,
+            'end': self.end,
+            'duration': round(self.duration, 6),
+            'status': self.status,
+            'thread': self.thread,
+            'attributes': self.attributes,
+        }
+
+
+class Trace:
+    """한 요청에 속한 span 모음 (루트 span 종료 시 지표 기록)"""
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.root = None
+        self.spans = []
+        self.finished = False
+        self.lock = threading.Lock()
+
+    @property
+    def q_type(self):
+        if self.root is None:
+            return 'unknown'
+        return str(self.root.attributes.get('q_type', 'unknown'))
+
+
+class _NullSpan:
+    """추적을 끈 경우 사용하는 빈 span (소요 시간만 계산)"""
+    attributes = {}
+
+    def __init__(self):
+        self.start = time.time()
+
+    @property
+    def duration(self):
+        return time.time() - self.start
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+
+class Histogram:
+    """Prometheus 형식 누적 히스토그램"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def quantile(self, q):
+        """구간 경계 기준 근사 분위수 (p50/p95 확인용)"""
+        if not self.total:
+            return 0.0
+        target = q * self.total
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= target:
+                return bound
+        return float('inf')
+
+
+class MetricsRegistry:
+    """q_type/stage별 지연 시간 히스토그램과 카운터"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = defaultdict(Histogram)  # (metric, labels) -> Histogram
+        self.counters = defaultdict(float)        # (metric, labels) -> 값
+
+    @staticmethod
+    def _labels(labels):
+        return tuple(sorted(labels.items()))
+
+    def observe(self, metric, value, **labels):
+        with self.lock:
+            self.histograms[(metric, self._labels(labels))].observe(value)
+
+    def inc(self, metric, value=1, **labels):
+        with self.lock:
+            self.counters[(metric, self._labels(labels))] += value
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        """q_type/stage별 요약 (건수, 평균, 근사 p50/p95)"""
+        result = {}
+        with self.lock:
+            for (metric, labels), hist in self.histograms.items():
+                key = metric + '{' + ','.join(f'{k}={v}' for k, v in labels) + '}'
+                result[key] = {
+                    'count': hist.total,
+                    'mean': hist.sum / hist.total if hist.total else 0.0,
+                    'p50': hist.quantile(0.50),
+                    'p95': hist.quantile(0.95),
+                }
+        return result
+
+    def render_prometheus(self):
+        """Prometheus 텍스트 노출 형식 문자열"""
+        def fmt_labels(labels, extra=None):
+            items = list(labels) + (extra or [])
+            if not items:
+                return ''
+            return '{' + ','.join(f'{k}="{str(v).replace(chr(34), "")}"' for k, v in items) + '}'
+
+        lines = []
+        with self.lock:
+            by_metric = defaultdict(list)
+            for (metric, labels), hist in self.histograms.items():
+                by_metric[metric].append((labels, hist))
+            for metric in sorted(by_metric):
+                lines.append(f'# TYPE {metric} histogram')
+                for labels, hist in sorted(by_metric[metric]):
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        lines.append(f'{metric}_bucket{fmt_labels(labels, [("le", bound)])} {count}')
+                    lines.append(f'{metric}_bucket{fmt_labels(labels, [("le", "+Inf")])} {hist.total}')
+                    lines.append(f'{metric}_sum{fmt_labels(labels)} {hist.sum:.6f}')
+                    lines.append(f'{metric}_count{fmt_labels(labels)} {hist.total}')
+
+            counters = defaultdict(list)
+            for (metric, labels), value in self.counters.items():
+                counters[metric].append((labels, value))
+            for metric in sorted(counters):
+                lines.append(f'# TYPE {metric} counter')
+                for labels, value in sorted(counters[metric]):
+                    lines.append(f'{metric}{fmt_labels(labels)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+class JsonlTraceExporter:
+    """종료된 span을 한 줄에 하나씩 JSON으로 기록"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def export(self, spans):
+        lines = [json.dumps(s.to_dict(), ensure_ascii=False, default=str) for s in spans]
+        with self.lock:
+            self.file.write('\n'.join(lines) + '\n')
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ListTraceExporter:
+    """종료된 span을 메모리에 모으는 exporter (벤치마크/분석용)"""
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def export(self, spans):
+        with self.lock:
+            self.spans.extend(spans)
+
+
+class Tracer:
+    """span 생성과 exporter/지표 기록 관리"""
+
+    def __init__(self):
+        self.enabled = True
+        self.exporters = []
+        self.metrics = MetricsRegistry()
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+        return exporter
+
+    def remove_exporter(self, exporter):
+        if exporter in self.exporters:
+            self.exporters.remove(exporter)
+
+    def start_span(self, name, **attributes):
+        parent = _current_span.get()
+        trace = parent.trace if parent is not None else Trace()
+        span_obj = Span(name, trace, parent, attributes)
+        if trace.root is None:
+            trace.root = span_obj
+        return span_obj
+
+    def finish_span(self, span_obj):
+        span_obj.end = time.time()
+        trace = span_obj.trace
+        with trace.lock:
+            trace.spans.append(span_obj)
+            is_root = span_obj is trace.root
+            late = trace.finished
+            if is_root:
+                trace.finished = True
+                spans = list(trace.spans)
+                trace.spans.clear()
+            elif late:
+                # 루트 종료 후 끝난 span (취소되지 않은 백그라운드 작업 등)
+                spans = [span_obj]
+                trace.spans.clear()
+            else:
+                return
+
+        q_type = trace.q_type
+        for s in spans:
+            self.metrics.observe('hs_stage_latency_seconds', s.duration, q_type=q_type, stage=s.name)
+            if s.attributes.get('cache_hit') is not None:
+                self.metrics.inc('hs_cache_lookups_total', 1, stage=s.name, hit=str(bool(s.attributes['cache_hit'])).lower())
+        if is_root and span_obj.name == 'request':
+            self.metrics.observe('hs_request_latency_seconds', span_obj.duration, q_type=q_type)
+        for exporter in list(self.exporters):
+            try:
+                exporter.export(spans)
+            except Exception as e:
+                print(f"Trace export error: {e}")
+
+    def span(self, name, **attributes):
+        return _SpanContext(self, name, attributes)
+
+
+class _SpanContext:
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span = None
+        self.token = None
+
+    def __enter__(self):
+        if not self.tracer.enabled:
+            return _NullSpan()
+        self.span = self.tracer.start_span(self.name, **self.attributes)
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is None:
+            return False
+        if exc_type is not None:
+            self.span.status = 'error'
+            self.span.set_attribute('error', f"{exc_type.__name__}: {exc}")
+        _current_span.reset(self.token)
+        self.tracer.finish_span(self.span)
+        return False
+
+
+# 프로세스 전역 tracer
+TRACER = Tracer()
+
+
+def span(name, **attributes):
+    """현재 span의 하위 span 생성 (with 문으로 사용)"""
+    return TRACER.span(name, **attributes)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def set_attributes(**attributes):
+    """현재 span에 속성 추가 (span 밖에서는 무시)"""
+    current = _current_span.get()
+    if current is not None:
+        current.set_attributes(**attributes)
+
+
+def add_root_attributes(**values):
+    """현재 요청(루트 span)의 숫자 속성에 값 누적 (요청별 LLM 사용량 합계 등, span 밖에서는 무시)"""
+    current = _current_span.get()
+    if current is None or current.trace.root is None:
+        return
+    root = current.trace.root
+    with current.trace.lock:
+        for key, value in values.items():
+            root.attributes[key] = root.attributes.get(key, 0) + value
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """현재 추적 컨텍스트를 유지한 채 스레드 풀에 작업 제출 (하위 span이 부모에 연결되도록)"""
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
+
+
+def configure_tracing(jsonl_path=None, enabled=True):
+    """추적 설정 (jsonl_path 지정 시 JSONL exporter 추가)"""
+    TRACER.enabled = enabled
+    if jsonl_path:
+        return TRACER.add_exporter(JsonlTraceExporter(jsonl_path))
+    return None
+
+
+def render_metrics():
+    """Prometheus 텍스트 형식 지표"""
+    return TRACER.metrics.render_prometheus()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host='0.0.0.0'):
+    """/metrics 엔드포인트를 제공하는 별도 HTTP 서버를 백그라운드 스레드로 실행 (Streamlit 앱용)"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='hs-metrics', daemon=True).start()
+    return server
+
+
+# 환경 변수로 JSONL 추적 파일 지정
+if os.getenv('HS_TRACE_FILE'):
+    configure_tracing(os.getenv('HS_TRACE_FILE'))
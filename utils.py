@@ -1,19 +1,106 @@
+import contextvars
 import json
 import re
 import os
-import requests
+import threading
 import time
 from typing import Dict, List, Any
 from collections import defaultdict
 from difflib import SequenceMatcher
-from google import genai
-from google.genai import types
 from dotenv import load_dotenv
-
-# 환경 변수 로드 (.env 파일에서 API 키 등 설정값 로드)
-load_dotenv()
-GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-client = genai.Client(api_key=GOOGLE_API_KEY)
+from progress import ensure_sink, StageStart, StageEnd, GroupResult, CandidateList
+from tracing import TRACER, span, set_attributes, estimate_tokens, submit_with_context
+from model_router import ROUTER, record_call
+from knowledge_db import get_knowledge_db, record_key
+from knowledge_index import KnowledgeIndex, CORPUS_FILTERS, domestic_group_sources, domestic_sources
+from retrieval_cache import cached_retrieval, normalize_query, file_version
+from notes_segmenter import NotesIndex
+from term_dictionary import get_term_dictionary, TERM_DICT_JSON
+from answer_cache import ANSWER_CACHE, context_dependent
+from general_rules import parse_rules, select_rules, format_rules
+from group_merge import (GROUP_OUTPUT_SCHEMA, GROUP_OUTPUT_INSTRUCTION, structured_enabled, context_references,
+                         parse_group_output, format_group_output, merge_group_outputs, compact_summary,
+                         agreed_code, agreed_answer)
+
+# import 시점에는 파일/네트워크 작업을 하지 않음 - 각 항목은 처음 필요할 때 로드 (warm_up()으로 미리 로드 가능)
+# google-genai, numpy(tariff_store) 등 import 비용이 큰 모듈도 사용하는 함수 안에서 import
+GENERAL_RULES_JSON = 'knowledge/통칙_grouped.json'
+MANUAL_NOTES_JSON = 'knowledge/grouped_11_end.json'
+# 해설서 내용이 이 글자 수를 넘을 때만 LLM으로 요약
+MANUAL_SUMMARY_CHARS = 1000
+# 해설서 병렬 검색 경로별 제한 시간(초) - 넘으면 그때까지의 결과로 종합
+PARALLEL_PATH_TIMEOUT = float(os.getenv('HS_PARALLEL_PATH_TIMEOUT', '10'))
+# Multi-Agent 그룹 분석 요청당 시간 예산(초) - 질문 유형별 HS_GROUP_DEADLINE_<Q_TYPE>, 없으면 이 값 (0이면 제한 없음)
+GROUP_DEADLINE = float(os.getenv('HS_GROUP_DEADLINE', '45'))
+
+# 현재 답변이 일부 결과만으로 만들어졌는지 표시 (제한 시간 초과 등, 이런 답변은 답변 캐시에 저장하지 않음)
+_partial_answer = contextvars.ContextVar('hs_partial_answer', default=None)
+
+_env_lock = threading.Lock()
+_env_loaded = False
+
+def load_env():
+    """환경 변수 로드 (.env 파일에서 API 키 등 설정값 로드, 프로세스당 한 번)"""
+    global _env_loaded
+    if not _env_loaded:
+        with _env_lock:
+            if not _env_loaded:
+                load_dotenv()
+                _env_loaded = True
+
+# Gemini 클라이언트 (첫 LLM 호출 때 생성, 부하 테스트 등에서는 utils.client에 가짜 클라이언트를 넣어 대체)
+client = None
+_client_lock = threading.Lock()
+
+def get_llm_client():
+    """Gemini 클라이언트 (처음 호출 시 생성, 스레드 안전)"""
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                from google import genai
+                load_env()
+                with span('init.llm'):
+                    client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
+    return client
+
+def call_gemini(call_site, contents, config=None, model=None):
+    """
+    Gemini 호출 공통 함수
+    - 모델은 호출 위치별 정책(model_router.py)으로 선택: 프롬프트 토큰 추정치, 최근 지연 시간, 오류 시 대체 모델 재시도
+    - 호출 위치(call_site), 모델, 선택 이유, 프롬프트 크기, 토큰 사용량을 'llm.<call_site>' span에 기록
+    - 실제 사용량(usage_metadata)은 요청별(루트 span)/일별(USAGE_LEDGER)로 누적
+    Args:
+        model: 지정 시 정책 대신 이 모델만 사용
+    """
+    prompt_tokens_est = estimate_tokens(contents)
+    candidates = [(model, 'explicit')] if model else ROUTER.candidates(call_site, prompt_tokens_est)
+    llm_client = get_llm_client()
+    for attempt, (model_name, reason) in enumerate(candidates):
+        with span(f'llm.{call_site}', call_site=call_site, model=model_name, route=reason, attempt=attempt,
+                  prompt_chars=len(str(contents)), prompt_tokens_est=prompt_tokens_est) as llm_span:
+            start = time.time()
+            try:
+                if config is not None:
+                    response = llm_client.models.generate_content(model=model_name, contents=contents, config=config)
+                else:
+                    response = llm_client.models.generate_content(model=model_name, contents=contents)
+            except Exception as e:
+                record_call(model_name, call_site, 0, 0, time.time() - start, error=True, fallback=attempt > 0)
+                if attempt == len(candidates) - 1:
+                    raise
+                # 다음 대체 모델로 재시도
+                llm_span.set_attributes(error=f"{type(e).__name__}: {e}", retry_model=candidates[attempt + 1][0])
+                print(f"LLM call {call_site} failed on {model_name}, retrying with {candidates[attempt + 1][0]}: {e}")
+                continue
+            usage = getattr(response, 'usage_metadata', None)
+            prompt_tokens = getattr(usage, 'prompt_token_count', None)
+            output_tokens = getattr(usage, 'candidates_token_count', None)
+            llm_span.set_attributes(prompt_tokens=prompt_tokens, output_tokens=output_tokens,
+                                    output_chars=len(response.text or ''))
+            record_call(model_name, call_site, prompt_tokens, output_tokens, time.time() - start,
+                        fallback=attempt > 0)
+        return response
 
 class HSDataManager:
     """
@@ -21,67 +108,114 @@ class HSDataManager:
     - HS 분류 사례, 위원회 결정, 협의회 결정 등의 데이터를 로드하고 관리
     - 키워드 기반 검색 기능 제공
     - 관련 컨텍스트 생성 기능 제공
+    - SQLite 지식 DB(knowledge_db.py, HS_KNOWLEDGE_DB)가 있으면 메모리 로드 없이 DB에서 검색
+    - 메모리 검색 시 요청마다 시작 시점의 스냅샷을 사용하므로 파일 갱신(reload) 중에도 결과가 섞이지 않음
+    - 국내(분류사례/위원회/협의회)와 해외(미국/EU) 분류사례는 각각 처음 검색할 때 로드
     """
     
-    def __init__(self):
-        """HSDataManager 초기화"""
-        self.data = {}  # 모든 HS 관련 데이터를 저장하는 딕셔너리
-        self.search_index = defaultdict(list)  # 키워드 기반 검색을 위한 인덱스
-        self.load_all_data()  # 모든 데이터 파일 로드
-        self.build_search_index()  # 검색 인덱스 구축
-    
-    def load_all_data(self):
+    def __init__(self, db=None, knowledge_dir='knowledge', query_expansion=True):
         """
-        모든 HS 데이터 파일을 로드하는 메서드
-        - HS분류사례_part1~10.json 파일 로드
-        - HS위원회.json, HS협의회.json 파일 로드
-        - hs_classification_data_us.json 파일 로드 (미국 관세청 품목분류 사례)
-        - hs_classification_data_eu.json 파일 로드 (EU 관세청 품목분류 사례)
+        HSDataManager 초기화 (분류사례 파일은 아직 로드하지 않음)
+        Args:
+            query_expansion: 해외 분류사례 검색 시 한영 용어 사전(term_dictionary.py)으로 질의 확장
         """
-        # HS분류사례 파트 로드 (1~10)
-        for i in range(1, 11):
-            try:
-                with open(f'knowledge/HS분류사례_part{i}.json', 'r', encoding='utf-8') as f:
-                    self.data[f'HS분류사례_part{i}'] = json.load(f)
-            except FileNotFoundError:
-                print(f'Warning: HS분류사례_part{i}.json not found')
-        
-        # 기타 JSON 파일 로드 (위원회, 협의회 결정)
-        other_files = ['knowledge/HS위원회.json', 'knowledge/HS협의회.json']
-        for file in other_files:
-            try:
-                with open(file, 'r', encoding='utf-8') as f:
-                    self.data[file.replace('.json', '')] = json.load(f)
-            except FileNotFoundError:
-                print(f'Warning: {file} not found')
-        
-        # 미국 관세청 품목분류 사례 로드
-        try:
-            with open('knowledge/hs_classification_data_us.json', 'r', encoding='utf-8') as f:
-                self.data['hs_classification_data_us'] = json.load(f)
-        except FileNotFoundError:
-            print('Warning: hs_classification_data_us.json not found')
-        
-        # EU 관세청 품목분류 사례 로드
-        try:
-            with open('knowledge/hs_classification_data_eu.json', 'r', encoding='utf-8') as f:
-                self.data['hs_classification_data_eu'] = json.load(f)
-        except FileNotFoundError:
-            print('Warning: hs_classification_data_eu.json not found')
+        load_env()
+        self.db = db if db is not None else get_knowledge_db()
+        self.knowledge_dir = knowledge_dir
+        self.query_expansion = query_expansion
+        # 분류사례 키워드 인덱스 {'domestic' | 'overseas': KnowledgeIndex} (세그먼트 + 스냅샷, knowledge_index.py)
+        self._indexes = {}
+        self._index_locks = {corpus: threading.Lock() for corpus in CORPUS_FILTERS}
+        self._watch_interval = 0
+    
+    def _index(self, corpus):
+        """
+        국내/해외 분류사례 인덱스 (처음 호출 시 파일 탐색/로드 및 검색 인덱스 구축, 스레드 안전)
+        Args:
+            corpus: 'domestic' 또는 'overseas'
+        """
+        index = self._indexes.get(corpus)
+        if index is None:
+            with self._index_locks[corpus]:
+                index = self._indexes.get(corpus)
+                if index is None:
+                    with span(f'init.{corpus}_corpus'):
+                        index = KnowledgeIndex(self.knowledge_dir, source_filter=CORPUS_FILTERS[corpus])
+                    if self._watch_interval > 0:
+                        index.start_watcher(self._watch_interval)
+                    self._indexes[corpus] = index
+        return index
+    
+    def ensure_loaded(self, *corpora):
+        """분류사례 미리 로드 (인자가 없으면 국내/해외 모두, DB 사용 시 무시)"""
+        if self.db is None:
+            for corpus in corpora or CORPUS_FILTERS:
+                self._index(corpus)
+    
+    @property
+    def data(self):
+        """현재 스냅샷의 {source: items} (국내 + 해외, DB 사용 시 빈 딕셔너리)"""
+        if self.db is not None:
+            return {}
+        return {source: items for corpus in CORPUS_FILTERS
+                for source, items in self._index(corpus).snapshot.data.items()}
+    
+    def _corpus_version(self, *corpora):
+        """분류사례 데이터 버전 (파일 상태 해시, DB 사용 시 빌드 시각) - 검색 캐시 키에 포함"""
+        if self.db is not None:
+            return f"db:{self.db.meta.get('built_at', '')}"
+        return '+'.join(self._index(corpus).snapshot.fingerprint for corpus in corpora)
+    
+    @property
+    def corpus_version(self):
+        """로드된 분류사례의 데이터 버전 (상태 확인용, 로드를 일으키지 않음)"""
+        if self.db is not None:
+            return self._corpus_version()
+        return '+'.join(f"{corpus}:{self._indexes[corpus].snapshot.fingerprint}"
+                        for corpus in CORPUS_FILTERS if corpus in self._indexes)
+    
+    def _sources(self, snapshot=None):
+        """분류사례 source 목록 (파일 탐색 순서)"""
+        if self.db is not None:
+            return list(self.db.source_counts)
+        return list(snapshot.data if snapshot is not None else self.data)
+    
+    def provenance(self, item: Dict[str, Any]) -> List[str]:
+        """
+        같은 사례(reference_id, 없으면 내용 해시)가 들어 있는 모든 source
+        - 로드 시 중복 제거로 검색 결과에는 처음 나온 source만 나오므로 나머지 출처 확인용
+        Returns:
+            source 목록 (중복이 없으면 빈 리스트)
+        """
+        key = record_key(item)
+        if self.db is not None:
+            places = self.db.case_provenance(key)
+        else:
+            places = [place for index in list(self._indexes.values())
+                      for place in index.snapshot.provenance.get(key, [])]
+        return [source for source, _ in places]
     
-    def build_search_index(self):
+    def _also_in(self, result: Dict[str, Any]) -> str:
+        """검색 결과와 같은 사례가 있는 다른 출처 표시 (없으면 빈 문자열)"""
+        others = [source for source in self.provenance(result['item']) if source != result['source']]
+        return f" [동일 사례: {', '.join(dict.fromkeys(others))}]" if others else ""
+    
+    def reload(self):
         """
-        검색 인덱스 구축 메서드
-        - 각 데이터 항목에서 키워드를 추출
-        - 추출된 키워드를 인덱스에 저장하여 빠른 검색 가능
+        knowledge 폴더의 분류사례 파일 변경 반영 (로드된 인덱스만, 새 파일/바뀐 파일만 인덱싱)
+        Returns:
+            {corpus: 변경 요약 딕셔너리} (DB 사용 시 None)
         """
-        for source, items in self.data.items():
-            for item in items:
-                # 품목명에서 키워드 추출
-                keywords = self._extract_keywords(str(item))
-                # 각 키워드에 대해 해당 아이템 참조 저장
-                for keyword in keywords:
-                    self.search_index[keyword].append((source, item))
+        if self.db is not None:
+            return None
+        return {corpus: index.reload() for corpus, index in list(self._indexes.items())}
+    
+    def start_watcher(self, interval: float = 60.0):
+        """interval초마다 분류사례 파일 변경 확인 (아직 로드되지 않은 인덱스는 로드할 때 시작, DB 사용 시 무시)"""
+        if self.db is None and interval > 0:
+            self._watch_interval = interval
+            for index in list(self._indexes.values()):
+                index.start_watcher(interval)
     
     def _extract_keywords(self, text: str) -> List[str]:
         """
@@ -91,11 +225,27 @@ class HSDataManager:
         Returns:
             추출된 키워드 리스트
         """
-        # 특수문자 제거 및 공백 기준 분리
-        words = re.sub(r'[^\w\s]', ' ', text).split()
+        # 특수문자 제거, casefold (영문 대문자 분류사례와 일치) 및 공백 기준 분리
+        words = re.sub(r'[^\w\s]', ' ', text).casefold().split()
         # 중복 제거 및 길이 2 이상인 단어만 선택
         return list(set(word for word in words if len(word) >= 2))
     
+    def _query_key(self, query: str) -> tuple:
+        """검색 캐시용 정규화 질의 (검색 결과는 키워드 집합에만 의존)"""
+        return normalize_query(self._extract_keywords(query))
+    
+    def _overseas_keywords(self, query: str) -> List[str]:
+        """
+        해외 분류사례 검색 키워드 (영문 사례가 대부분이므로 한영 용어 사전으로 대응어 추가)
+        - 예: '플라스틱 용기' → ['플라스틱', '용기', 'plastics', 'plastic', 'containers', 'container']
+        """
+        keywords = self._extract_keywords(query)
+        if not self.query_expansion:
+            return keywords
+        return get_term_dictionary().expand(keywords)
+    
+    @cached_retrieval('search', lambda self, query, max_results=5:
+                      (self._query_key(query), max_results, self._corpus_version(*CORPUS_FILTERS)))
     def search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
         """
         쿼리와 관련된 가장 연관성 높은 항목들을 검색하는 메서드
@@ -106,13 +256,18 @@ class HSDataManager:
             검색 결과 리스트 (출처와 항목 정보 포함)
         """
         query_keywords = self._extract_keywords(query)
+        if self.db is not None:
+            return [{'source': source, 'item': item}
+                    for source, item in self.db.search_cases(query_keywords, None, max_results)]
+        snapshots = [self._index(corpus).snapshot for corpus in CORPUS_FILTERS]
         results = defaultdict(int)
         
-        # 각 키워드에 대해 매칭되는 항목 찾기
+        # 각 키워드에 대해 매칭되는 항목 찾기 (국내 → 해외 순서)
         for keyword in query_keywords:
-            for source, item in self.search_index.get(keyword, []):
-                # 가중치 계산 (키워드 매칭 횟수 기반)
-                results[(source, str(item))] += 1
+            for snapshot in snapshots:
+                for source, item in snapshot.postings(keyword):
+                    # 가중치 계산 (키워드 매칭 횟수 기반)
+                    results[(source, str(item))] += 1
         
         # 가중치 기준 정렬
         sorted_results = sorted(results.items(), key=lambda x: x[1], reverse=True)
@@ -123,23 +278,22 @@ class HSDataManager:
             for (source, item_str), _ in sorted_results[:max_results]
         ]
     
+    @cached_retrieval('search_domestic_group', lambda self, query, group_idx, max_results=3:
+                      (self._query_key(query), group_idx, max_results, self._corpus_version('domestic')))
     def search_domestic_group(self, query: str, group_idx: int, max_results: int = 3) -> List[Dict[str, Any]]:
         """국내 HS 분류 데이터 그룹별 검색 메서드"""
         query_keywords = self._extract_keywords(query)
         results = defaultdict(int)
+        snapshot = self._index('domestic').snapshot if self.db is None else None
 
-        # 그룹별 데이터 소스 정의 (5개 그룹)
-        group_sources = [
-            ['HS분류사례_part1', 'HS분류사례_part2'],  # 그룹1
-            ['HS분류사례_part3', 'HS분류사례_part4'],  # 그룹2
-            ['HS분류사례_part5', 'HS분류사례_part6'],  # 그룹3
-            ['HS분류사례_part7', 'HS분류사례_part8'],  # 그룹4
-            ['HS분류사례_part9', 'HS분류사례_part10', 'knowledge/HS위원회', 'knowledge/HS협의회']  # 그룹5
-        ]
-        sources = group_sources[group_idx]
+        # 그룹별 데이터 소스 (5개 그룹: part1~2, 3~4, 5~6, 7~8, 9~10 + 위원회/협의회, part11부터는 그룹1부터 다시 배정)
+        sources = domestic_group_sources(self._sources(snapshot))[group_idx]
+        if self.db is not None:
+            return [{'source': source, 'item': item}
+                    for source, item in self.db.search_cases(query_keywords, sources, max_results)]
 
         for keyword in query_keywords:
-            for source, item in self.search_index.get(keyword, []):
+            for source, item in snapshot.postings(keyword):
                 if source in sources:
                     results[(source, str(item))] += 1
 
@@ -154,36 +308,44 @@ class HSDataManager:
         results = self.search_domestic_group(query, group_idx)
         context = []
         for result in results:
-            context.append(f"출처: {result['source']} (국내 관세청)\n항목: {json.dumps(result['item'], ensure_ascii=False)}")
+            context.append(f"출처: {result['source']} (국내 관세청){self._also_in(result)}\n항목: {json.dumps(result['item'], ensure_ascii=False)}")
         return "\n\n".join(context)
 
+    @cached_retrieval('search_overseas_group', lambda self, query, group_idx, max_results=3:
+                      (normalize_query(self._overseas_keywords(query)), group_idx, max_results,
+                       self._corpus_version('overseas')))
     def search_overseas_group(self, query: str, group_idx: int, max_results: int = 3) -> List[Dict[str, Any]]:
-        """해외 HS 분류 데이터 그룹별 검색 메서드"""
-        query_keywords = self._extract_keywords(query)
+        """해외 HS 분류 데이터 그룹별 검색 메서드 (한영 용어 사전으로 확장한 키워드 사용)"""
+        query_keywords = self._overseas_keywords(query)
         results = defaultdict(int)
+        snapshot = self._index('overseas').snapshot if self.db is None else None
         
         # 해외 데이터를 그룹별로 분할 처리
         if group_idx < 3:  # 그룹 0,1,2는 미국 데이터
             target_source = 'hs_classification_data_us'
             # 미국 데이터를 3등분
-            us_data = self.data.get(target_source, [])
-            chunk_size = len(us_data) // 3
+            us_count = self._source_count(target_source, snapshot)
+            chunk_size = us_count // 3
             start_idx = group_idx * chunk_size
-            end_idx = start_idx + chunk_size if group_idx < 2 else len(us_data)
-            target_items = us_data[start_idx:end_idx]
+            end_idx = start_idx + chunk_size if group_idx < 2 else us_count
         else:  # 그룹 3,4는 EU 데이터
             target_source = 'hs_classification_data_eu'
             # EU 데이터를 2등분
-            eu_data = self.data.get(target_source, [])
-            chunk_size = len(eu_data) // 2
+            eu_count = self._source_count(target_source, snapshot)
+            chunk_size = eu_count // 2
             eu_group_idx = group_idx - 3  # 0 or 1
             start_idx = eu_group_idx * chunk_size
-            end_idx = start_idx + chunk_size if eu_group_idx < 1 else len(eu_data)
-            target_items = eu_data[start_idx:end_idx]
+            end_idx = start_idx + chunk_size if eu_group_idx < 1 else eu_count
+        
+        if self.db is not None:
+            return [{'source': source, 'item': item}
+                    for source, item in self.db.search_cases(query_keywords, [target_source], max_results,
+                                                             (start_idx, end_idx))]
+        target_items = snapshot.data.get(target_source, [])[start_idx:end_idx]
         
         # 해당 그룹 데이터에서만 검색
         for keyword in query_keywords:
-            for source, item in self.search_index.get(keyword, []):
+            for source, item in snapshot.postings(keyword):
                 if source == target_source and item in target_items:
                     results[(source, str(item))] += 1
         
@@ -193,6 +355,15 @@ class HSDataManager:
             for (source, item_str), _ in sorted_results[:max_results]
         ]
 
+    def _source_count(self, source: str, snapshot=None) -> int:
+        """데이터 소스별 항목 수"""
+        if self.db is not None:
+            return self.db.source_counts.get(source, 0)
+        if snapshot is None:
+            corpus = next((corpus for corpus, accepts in CORPUS_FILTERS.items() if accepts(source)), 'overseas')
+            snapshot = self._index(corpus).snapshot
+        return snapshot.source_count(source)
+
     def get_overseas_context_group(self, query: str, group_idx: int) -> str:
         """해외 HS 분류 관련 컨텍스트(그룹별)를 생성하는 메서드"""
         results = self.search_overseas_group(query, group_idx)
@@ -207,26 +378,29 @@ class HSDataManager:
             else:
                 country = "해외 관세청"
                 
-            context.append(f"출처: {result['source']} ({country})\n항목: {json.dumps(result['item'], ensure_ascii=False)}")
+            context.append(f"출처: {result['source']} ({country}){self._also_in(result)}\n항목: {json.dumps(result['item'], ensure_ascii=False)}")
         
         return "\n\n".join(context)
     
+    @cached_retrieval('search_domestic', lambda self, query, max_results=5:
+                      (self._query_key(query), max_results, self._corpus_version('domestic')))
     def search_domestic(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
         """국내 HS 분류 데이터에서만 검색하는 메서드"""
         query_keywords = self._extract_keywords(query)
         results = defaultdict(int)
+        snapshot = self._index('domestic').snapshot if self.db is None else None
         
-        # 국내 데이터 소스만 필터링
-        domestic_sources = [
-            'HS분류사례_part1', 'HS분류사례_part2', 'HS분류사례_part3', 'HS분류사례_part4', 'HS분류사례_part5',
-            'HS분류사례_part6', 'HS분류사례_part7', 'HS분류사례_part8', 'HS분류사례_part9', 'HS분류사례_part10',
-            'knowledge/HS위원회', 'knowledge/HS협의회'
-        ]
+        # 국내 데이터 소스만 필터링 (HS분류사례_part*, 위원회, 협의회)
+        sources = domestic_sources(self._sources(snapshot))
+        
+        if self.db is not None:
+            return [{'source': source, 'item': item}
+                    for source, item in self.db.search_cases(query_keywords, sources, max_results)]
         
         for keyword in query_keywords:
-            for source, item in self.search_index.get(keyword, []):
+            for source, item in snapshot.postings(keyword):
                 # 국내 데이터 소스만 포함
-                if source in domestic_sources:
+                if source in sources:
                     results[(source, str(item))] += 1
         
         sorted_results = sorted(results.items(), key=lambda x: x[1], reverse=True)
@@ -242,7 +416,7 @@ class HSDataManager:
         context = []
         
         for result in results:
-            context.append(f"출처: {result['source']} (국내 관세청)\n항목: {json.dumps(result['item'], ensure_ascii=False)}")
+            context.append(f"출처: {result['source']} (국내 관세청){self._also_in(result)}\n항목: {json.dumps(result['item'], ensure_ascii=False)}")
         
         return "\n\n".join(context)
     
@@ -259,7 +433,7 @@ class HSDataManager:
         context = []
         
         for result in results:
-            context.append(f"출처: {result['source']}\n항목: {json.dumps(result['item'], ensure_ascii=False)}")
+            context.append(f"출처: {result['source']}{self._also_in(result)}\n항목: {json.dumps(result['item'], ensure_ascii=False)}")
         
         return "\n\n".join(context)
     
@@ -278,40 +452,90 @@ HS_PATTERN = re.compile(
     flags=re.IGNORECASE
 )
 
+# 연도로 보이는 숫자 (예: '2024년') - HS 코드 후보에서 제외
+YEAR_SUFFIX = re.compile(r'\s*(?:년|年)')
+
+def validate_hs_codes(text):
+    """
+    텍스트의 HS 코드 후보를 관세율표(tariff_store.py)로 검증
+    - 후보: HS_PATTERN에 맞는 4자리 이상 숫자 (숫자만 남겨 표준화, 뒤에 '년'이 붙은 연도는 제외)
+    - 관세율표에 없는 번호(연도, 수량, 모델명 등)는 confidence 0.0으로 표시 → 해설서/관세율표 조회, 요약 LLM 호출 전에 제외
+    Returns:
+        [{'raw': 원문, 'code': 정규화된 코드 또는 None, 'confidence': 신뢰도}, ...] (원문 순서, 같은 원문은 한 번)
+    """
+    candidates = []
+    for match in HS_PATTERN.finditer(text):
+        raw = match.group(1)
+        if YEAR_SUFFIX.match(text, match.end()) or raw in candidates:
+            continue
+        if len(re.sub(r'\D', '', raw)) >= 4:
+            candidates.append(raw)
+    if not candidates:
+        return []
+    
+    try:
+        from tariff_store import get_tariff_store
+        checked = get_tariff_store().validate(candidates)
+    except Exception as e:
+        # 관세율표를 사용할 수 없으면 검증 없이 숫자만 남긴 후보 사용
+        print(f"Warning: HS code validation unavailable ({e})")
+        checked = [(re.sub(r'\D', '', raw), 0.5) for raw in candidates]
+    return [{'raw': raw, 'code': code, 'confidence': confidence}
+            for raw, (code, confidence) in zip(candidates, checked)]
+
+def tariff_code_match(code):
+    """
+    HS 코드 하나의 관세율표 검증 결과 (tariff_store.validate)
+    Returns:
+        'exact' (관세율표에 같은 번호), 'prefix' (관세율표 번호의 앞부분), 'truncated' (줄인 앞부분만 유효),
+        'invalid' (없는 번호), 'unavailable' (관세율표를 사용할 수 없음)
+    """
+    try:
+        from tariff_store import get_tariff_store, EXACT_CONFIDENCE, PREFIX_CONFIDENCE
+        checked, confidence = get_tariff_store().validate([code])[0]
+    except Exception as e:
+        print(f"Warning: HS code validation unavailable ({e})")
+        return 'unavailable'
+    if checked is None:
+        return 'invalid'
+    return {EXACT_CONFIDENCE: 'exact', PREFIX_CONFIDENCE: 'prefix'}.get(confidence, 'truncated')
+
 def extract_hs_codes(text):
     """
     여러 HS 코드를 추출하고, 중복 제거 및 숫자만 남겨 표준화
-    개선사항:
-    - 단어 경계(\b) 제거로 더 유연한 매칭
-    - 숫자만 있는 경우도 처리 가능
-    - 최소 4자리 숫자 체크 추가
+    - 관세율표에 있는 호/소호/세번(또는 그 앞부분)만 반환 (validate_hs_codes)
     """
-    matches = HS_PATTERN.findall(text)
     hs_codes = []
-    
-    for raw in matches:
-        # 숫자만 남기기
-        code = re.sub(r'\D', '', raw)
-        # 최소 4자리이고 중복이 아닌 경우만 추가
-        if len(code) >= 4 and code not in hs_codes:
-            hs_codes.append(code)
-    
-    # 만약 위 패턴으로 찾지 못하고, 입력이 4자리 이상의 숫자로만 구성된 경우
-    if not hs_codes:
-        # 순수 숫자만 있는 경우 체크
-        numbers_only = re.findall(r'\d{4,}', text)
-        for num in numbers_only:
-            if num not in hs_codes:
-                hs_codes.append(num)
-    
+    for candidate in validate_hs_codes(text):
+        if candidate['code'] and candidate['code'] not in hs_codes:
+            hs_codes.append(candidate['code'])
     return hs_codes
 
+_json_cache = {}
+_json_cache_lock = threading.Lock()
+
+def load_knowledge_json(json_file):
+    """
+    knowledge JSON 파일 로드 (처음 필요할 때 한 번 읽고, 파일이 바뀌면 다시 읽음, 스레드 안전)
+    - 반환 객체는 여러 요청이 공유하므로 수정하지 말 것
+    """
+    version = file_version(json_file)
+    cached = _json_cache.get(json_file)
+    if cached is None or cached[0] != version:
+        with _json_cache_lock:
+            cached = _json_cache.get(json_file)
+            if cached is None or cached[0] != version:
+                with span('init.knowledge_json', file=json_file):
+                    with open(json_file, 'r', encoding='utf-8') as file:
+                        cached = (version, json.load(file))
+                _json_cache[json_file] = cached
+    return cached[1]
+
 def extract_and_store_text(json_file):
     """JSON 파일에서 head1과 text를 추출하여 변수에 저장"""
     try:
         # JSON 파일 읽기
-        with open(json_file, 'r', encoding='utf-8') as file:
-            data = json.load(file)
+        data = load_knowledge_json(json_file)
         
         # 데이터를 변수에 저장
         extracted_data = []
@@ -326,19 +550,148 @@ def extract_and_store_text(json_file):
         print(f"오류 발생: {e}")
         return []
 
-# 통칙 데이터 로드 (재사용을 위한 전역 변수)
-general_explanation = extract_and_store_text('knowledge/통칙_grouped.json')
+_general_rules = (None, None)  # (통칙 파일 버전, {번호: 규칙})
+_general_rules_lock = threading.Lock()
+
+def get_general_rules():
+    """통칙 규칙별 구간과 요약 (general_rules.py, 파일이 바뀌면 다시 분할)"""
+    global _general_rules
+    version = file_version(GENERAL_RULES_JSON)
+    if _general_rules[0] != version:
+        with _general_rules_lock:
+            if _general_rules[0] != version:
+                with span('init.general_rules'):
+                    _general_rules = (version, parse_rules(load_knowledge_json(GENERAL_RULES_JSON)))
+    return _general_rules[1]
+
+def manual_version():
+    """해설서 데이터 버전 (검색 캐시 키용)"""
+    db = get_knowledge_db()
+    if db is not None:
+        return f"db:{db.meta.get('built_at', '')}"
+    return file_version(MANUAL_NOTES_JSON)
+
+_notes_index = (None, None)  # (해설서 버전, NotesIndex)
+_notes_index_lock = threading.Lock()
+
+def get_notes_index():
+    """해설서 부/류/호/소호 구간 색인 (notes_segmenter.py, 해설서 데이터가 바뀌면 다시 생성)"""
+    global _notes_index
+    version = manual_version()
+    if _notes_index[0] != version:
+        with _notes_index_lock:
+            if _notes_index[0] != version:
+                db = get_knowledge_db()
+                groups = db.notes() if db is not None else load_knowledge_json(MANUAL_NOTES_JSON)
+                with span('init.notes_index'):
+                    _notes_index = (version, NotesIndex.build(groups))
+    return _notes_index[1]
+
+_manual_search_texts = (None, None)  # (해설서 버전, [(그룹, 소문자 검색 텍스트)])
+_manual_search_texts_lock = threading.Lock()
+
+def get_manual_search_texts():
+    """해설서 직접 검색용 (그룹, 'header1 header2 text' 소문자) 목록 (지식 DB가 없을 때, 요청마다 다시 만들지 않음)"""
+    global _manual_search_texts
+    version = file_version(MANUAL_NOTES_JSON)
+    if _manual_search_texts[0] != version:
+        with _manual_search_texts_lock:
+            if _manual_search_texts[0] != version:
+                with span('init.manual_search_texts'):
+                    _manual_search_texts = (version, [
+                        (item, f"{item.get('header1', '')} {item.get('header2', '')} {item.get('text', '')}".lower())
+                        for item in load_knowledge_json(MANUAL_NOTES_JSON)])
+    return _manual_search_texts[1]
+
+def lookup_hs_sections(hs_code):
+    """
+    HS 코드에 필요한 해설서 구간만 조회 (페이지 그룹 전체 대신 부/류 주·총설, 호 또는 소호 본문)
+    - 구간 색인에서 찾지 못한 항목은 lookup_hscode의 페이지 그룹 텍스트 사용
+    Returns:
+        [(구분, 텍스트), ...] (예: [('부 해설', ...), ('류 해설', ...), ('소호 해설', ...)])
+    """
+    try:
+        excerpt = get_notes_index().excerpt(hs_code)
+    except Exception as e:
+        print(f"Notes index error: {e}")
+        excerpt = {'part': None, 'chapter': None, 'heading': None}
+    
+    fallback = None
+    if None in excerpt.values():
+        fallback = lookup_hscode(hs_code, MANUAL_NOTES_JSON)
+    
+    sections = []
+    for i, (name, label) in enumerate([('part', '부 해설'), ('chapter', '류 해설'), ('heading', '호 해설')]):
+        piece = excerpt[name]
+        if piece:
+            sections.append((f"{piece['level']} 해설", piece['text']))
+        elif fallback and fallback[i] and fallback[i].get('text'):
+            sections.append((label, fallback[i]['text']))
+    return sections
+
+WARM_UP_SUBSYSTEMS = ('llm', 'general_rules', 'domestic', 'overseas', 'tariff', 'notes')
+
+def warm_up(hs_manager=None, subsystems=WARM_UP_SUBSYSTEMS):
+    """
+    지연 초기화 항목 미리 로드 (서버 시작 직후 백그라운드 등에서 호출하면 첫 질문 지연이 줄어듦)
+    Args:
+        hs_manager: 분류사례('domestic', 'overseas')를 로드할 HSDataManager (없으면 분류사례는 건너뜀)
+        subsystems: 로드할 항목 (llm, general_rules, domestic, overseas, tariff, notes)
+    Returns:
+        {항목: 소요 시간(초)} (실패한 항목은 제외)
+    """
+    def load_tariff():
+        from tariff_store import get_tariff_store
+        get_tariff_store()
+
+    def load_notes():
+        get_notes_index()
+
+    def load_overseas():
+        hs_manager.ensure_loaded('overseas')
+        get_term_dictionary()
+
+    loaders = {
+        'llm': get_llm_client,
+        'general_rules': get_general_rules,
+        'domestic': lambda: hs_manager.ensure_loaded('domestic'),
+        'overseas': load_overseas,
+        'tariff': load_tariff,
+        'notes': load_notes,
+    }
+    timings = {}
+    for name in subsystems:
+        if name not in loaders:
+            raise ValueError(f"Unknown subsystem: {name}")
+        if name in ('domestic', 'overseas') and hs_manager is None:
+            continue
+        start = time.time()
+        try:
+            with span(f'warm_up.{name}'):
+                loaders[name]()
+        except Exception as e:
+            print(f"Warning: warm-up of {name} failed: {e}")
+            continue
+        timings[name] = time.time() - start
+    return timings
 
 def lookup_hscode(hs_code, json_file):
-    """HS 코드에 대한 해설 정보를 조회하는 함수"""
+    """HS 코드에 대한 해설 정보를 조회하는 함수 (지식 DB가 있으면 인덱스로 조회)"""
     try:
-        with open(json_file, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-        
         # 각 설명 유형별 초기값 설정
         part_explanation = {"text": "해당 부에 대한 설명을 찾을 수 없습니다."}
         chapter_explanation = {"text": "해당 류에 대한 설명을 찾을 수 없습니다."}
         sub_explanation = {"text": "해당 호에 대한 설명을 찾을 수 없습니다."}
+        
+        db = get_knowledge_db()
+        if db is not None:
+            chapter_explanation = db.note_by_header2(f"제{int(hs_code[:2])}류") or chapter_explanation
+            hs_4digit = hs_code[:4]
+            sub_explanation = db.note_by_header2(f"{hs_4digit[:2]}.{hs_4digit[2:]}") or sub_explanation
+            part_explanation = db.note_by_part(chapter_explanation.get('header1'))
+            return part_explanation, chapter_explanation, sub_explanation
+        
+        data = load_knowledge_json(json_file)
 
         # 1) 류(類) key: "제00류"
         chapter_key = f"제{int(hs_code[:2])}류"
@@ -359,21 +712,29 @@ def lookup_hscode(hs_code, json_file):
         print(f"HS 코드 조회 오류: {e}")
         return ({"text": "오류가 발생했습니다."}, {"text": "오류가 발생했습니다."}, {"text": "오류가 발생했습니다."})
 
-def get_hs_explanations(hs_codes):
+def get_hs_explanations(hs_codes, user_input=''):
     """여러 HS 코드에 대한 해설을 취합하는 함수 (마크다운 형식)"""
     all_explanations = ""
+
+    # 통칙은 코드마다 반복하지 않고, 코드 구성/질문에 맞는 규칙만 맨 앞에 한 번 표시
+    try:
+        rules = get_general_rules()
+        rule_numbers = select_rules(hs_codes, user_input, rules)
+    except Exception as e:
+        print(f"Warning: failed to load general rules: {e}")
+        rules, rule_numbers = {}, []
+    if rule_numbers:
+        all_explanations += "\n\n# 📋 해설서 통칙\n\n"
+        for number in rule_numbers:
+            all_explanations += f"### {rules[number]['title']}\n{rules[number]['statute']}\n\n"
+        all_explanations += "---\n"
+
     for hs_code in hs_codes:
-        explanation, type_explanation, number_explanation = lookup_hscode(hs_code, 'knowledge/grouped_11_end.json')
+        with span('retrieval.manual', hs_code=hs_code):
+            explanation, type_explanation, number_explanation = lookup_hscode(hs_code, 'knowledge/grouped_11_end.json')
 
         if explanation and type_explanation and number_explanation:
             all_explanations += f"\n\n# HS 코드 {hs_code} 해설\n\n"
-            all_explanations += f"## 📋 해설서 통칙\n\n"
-            
-            # 통칙 내용을 리스트 형태로 정리
-            if general_explanation:
-                for i, rule in enumerate(general_explanation[:5], 1):  # 처음 5개만 표시
-                    all_explanations += f"### 통칙 {i}\n{rule}\n\n"
-            
             all_explanations += f"## 📂 부(部) 해설\n\n{explanation['text']}\n\n"
             all_explanations += f"## 📚 류(類) 해설\n\n{type_explanation['text']}\n\n"
             all_explanations += f"## 📝 호(號) 해설\n\n{number_explanation['text']}\n\n"
@@ -382,27 +743,24 @@ def get_hs_explanations(hs_codes):
     return all_explanations
 
 def get_tariff_info_for_codes(hs_codes):
-    """HS코드들에 대한 품목분류표 정보 수집"""
+    """HS코드들에 대한 품목분류표 정보 수집 (관세율표 배열이 있으면 관세율 포함)"""
     tariff_info = {}
     
     try:
-        with open('knowledge/hstable.json', 'r', encoding='utf-8') as f:
-            tariff_data = json.load(f)
-        
-        for code in hs_codes:
-            # 4자리 HS코드로 매칭 (예: 3923 또는 39.23)
-            code_4digit = code[:4] if len(code) >= 4 else code
-            code_with_dot = f"{code_4digit[:2]}.{code_4digit[2:]}"
-            
-            for item in tariff_data:
-                item_code = item.get('품목번호', '')
-                if item_code.startswith(code_4digit) or item_code.startswith(code_with_dot):
-                    tariff_info[code] = {
-                        'korean_name': item.get('한글품명', ''),
-                        'english_name': item.get('영문품명', ''),
-                        'full_code': item_code
-                    }
-                    break
+        # 4자리 HS코드로 품명 매칭, 관세율은 사용자가 제시한 코드와 정확히 일치하는 행 기준
+        from tariff_store import get_tariff_store
+        store = get_tariff_store()
+        heading_rows = store.find_prefix([code[:4] for code in hs_codes])
+        exact_rows = store.find_exact(hs_codes)
+        for code, heading_row, exact_row in zip(hs_codes, heading_rows, exact_rows):
+            item = store.record(heading_row)
+            if item:
+                tariff_info[code] = {
+                    'korean_name': item['한글품명'],
+                    'english_name': item['영문품명'],
+                    'full_code': item['품목번호'],
+                    'rates': store.rates_for(exact_row) or item['rates']
+                }
     except Exception as e:
         print(f"Tariff table loading error: {e}")
     
@@ -414,20 +772,17 @@ def get_manual_info_for_codes(hs_codes, logger):
     
     for code in hs_codes:
         try:
-            # lookup_hscode 함수 재사용
-            part_exp, chapter_exp, sub_exp = lookup_hscode(code, 'knowledge/grouped_11_end.json')
+            # 코드에 필요한 구간만 조회 (부/류 주·총설, 호 또는 소호)
+            with span('retrieval.manual', hs_code=code):
+                sections = lookup_hs_sections(code)
             
             # 해설서 내용 조합
             full_content = ""
-            if part_exp and part_exp.get('text'):
-                full_content += f"부 해설: {part_exp['text']}\n\n"
-            if chapter_exp and chapter_exp.get('text'):
-                full_content += f"류 해설: {chapter_exp['text']}\n\n"
-            if sub_exp and sub_exp.get('text'):
-                full_content += f"호 해설: {sub_exp['text']}\n\n"
+            for label, text in sections:
+                full_content += f"{label}: {text}\n\n"
             
             # 1000자 초과 시 요약
-            if len(full_content) > 1000:
+            if len(full_content) > MANUAL_SUMMARY_CHARS:
                 logger.log_actual("AI", f"Summarizing manual content for HS{code}...")
                 summary_prompt = f"""다음 HS 해설서 내용을 1000자 이내로 핵심 내용만 요약해주세요:
 
@@ -444,10 +799,7 @@ HS코드: {code}
 간결하고 정확하게 요약해주세요."""
                 
                 try:
-                    summary_response = client.models.generate_content(
-                        model="gemini-2.0-flash",
-                        contents=summary_prompt
-                    )
+                    summary_response = call_gemini('manual_summary', summary_prompt)
                     manual_info[code] = {
                         'content': clean_text(summary_response.text),
                         'summary_used': True
@@ -474,17 +826,17 @@ HS코드: {code}
     
     return manual_info
 
-def prepare_general_rules():
-    """HS 분류 통칙 준비"""
+def prepare_general_rules(hs_codes=(), user_input=''):
+    """
+    HS 분류 통칙 준비 (비교할 코드/질문에 맞는 규칙의 조문 요약만, 규칙마다 한 번)
+    - 예: 여러 호에 걸친 비교 → 통칙 제1호, 제3호 / 같은 호 안의 소호 비교 → 통칙 제1호, 제6호
+    """
     try:
-        with open('knowledge/통칙_grouped.json', 'r', encoding='utf-8') as f:
-            rules_data = json.load(f)
-        
-        rules_text = "HS 분류 통칙:\n\n"
-        for i, rule in enumerate(rules_data[:6], 1):  # 통칙 1~6
-            rules_text += f"통칙 {i}: {rule.get('text', '')}\n\n"
+        rules = get_general_rules()
+        rule_numbers = select_rules(hs_codes, user_input, rules)
+        set_attributes(rules=','.join(str(number) for number in rule_numbers))
         
-        return rules_text
+        return "HS 분류 통칙:\n\n" + format_rules(rules, rule_numbers) + "\n\n"
     except Exception as e:
         return "통칙 정보를 로드할 수 없습니다."
 
@@ -523,11 +875,13 @@ def analyze_user_provided_codes(user_input, hs_codes, tariff_info, manual_info,
 """
     
     for code in hs_codes:
+        rates = tariff_info.get(code, {}).get('rates')
+        rate_line = f"\n- 관세율: {', '.join(f'{name} {value:g}%' for name, value in rates.items())}" if rates else ""
         analysis_prompt += f"""
 === HS코드 {code} ===
 품목분류표 정보:
 - 국문품명: {tariff_info.get(code, {}).get('korean_name', 'N/A')}
-- 영문품명: {tariff_info.get(code, {}).get('english_name', 'N/A')}
+- 영문품명: {tariff_info.get(code, {}).get('english_name', 'N/A')}{rate_line}
 
 해설서 정보:
 {manual_info.get(code, {}).get('content', 'N/A')}
@@ -559,27 +913,39 @@ def analyze_user_provided_codes(user_input, hs_codes, tariff_info, manual_info,
     
     # Gemini AI 분석 수행
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=analysis_prompt
-        )
+        response = call_gemini('user_codes_analysis', analysis_prompt)
         return clean_text(response.text)
     except Exception as e:
+        mark_partial_answer('error')
         return f"AI 분석 중 오류가 발생했습니다: {str(e)}"
 
 class TariffTableSearcher:
     def __init__(self):
-        self.tariff_data = []
-        self.load_tariff_table()
+        self._store = None
+        self._loaded = False  # 관세율표는 첫 검색 때 로드
     
     def load_tariff_table(self):
-        """관세율표 데이터 로드"""
+        """
+        관세율표 데이터 로드
+        - 프로세스 공유 관세율표 배열(tariff_store.py, hstable.npz memory-map)을 사용하므로 인스턴스마다 복사하지 않음
+        """
+        from tariff_store import get_tariff_store
         try:
-            with open('knowledge/hstable.json', 'r', encoding='utf-8') as f:
-                self.tariff_data = json.load(f)
+            self._store = get_tariff_store()
         except FileNotFoundError:
             print("Warning: hstable.json not found")
-            self.tariff_data = []
+            self._store = None
+        self._loaded = True
+    
+    @property
+    def store(self):
+        if not self._loaded:
+            self.load_tariff_table()
+        return self._store
+    
+    @property
+    def version(self):
+        return self.store.version if self.store is not None else ''
     
     def calculate_similarity(self, query, text):
         """텍스트 유사도 계산"""
@@ -587,23 +953,48 @@ class TariffTableSearcher:
             return 0.0
         return SequenceMatcher(None, query.lower(), text.lower()).ratio()
     
+    # 유사도는 질의 문자열 전체(소문자)로 계산하므로 키워드 집합이 아닌 소문자 질의를 키로 사용
+    @cached_retrieval('search_by_tariff_table', lambda self, query, top_n=10:
+                      (query.lower(), top_n, self.version))
     def search_by_tariff_table(self, query, top_n=10):
-        """관세율표에서 유사도 기반 HS코드 후보 검색"""
+        """
+        관세율표에서 유사도 기반 HS코드 후보 검색
+        - 유사도 계산(SequenceMatcher.ratio)이 CPU 시간의 대부분이므로, 상한값(quick_ratio)이
+          현재 상위 top_n번째 유사도 이하인 품명은 계산하지 않음 (결과는 전체 계산과 같음)
+        """
+        import heapq
         candidates = []
-        
-        for item in self.tariff_data:
-            hs_code = item.get('품목번호', '')
-            korean_name = item.get('한글품명', '')
-            english_name = item.get('영문품명', '')
-            
+        if self.store is None:
+            return candidates
+        
+        query = query.lower()
+        matcher = SequenceMatcher(None, query, '')
+        top_scores = []  # 지금까지의 상위 top_n 유사도 (min-heap)
+        
+        def bounded_similarity(text, threshold):
+            """유사도, 상한값이 threshold 이하이면 0.0"""
+            if not query or not text:
+                return 0.0
+            matcher.set_seq2(text.lower())
+            if matcher.real_quick_ratio() <= threshold or matcher.quick_ratio() <= threshold:
+                return 0.0
+            return matcher.ratio()
+        
+        for hs_code, korean_name, english_name in self.store.rows():
+            # 최소 임계값 0.1, 후보가 top_n개 모이면 top_n번째 유사도 (같은 유사도는 먼저 나온 품목이 앞)
+            threshold = max(0.1, top_scores[0]) if 0 < top_n <= len(top_scores) else 0.1
             # 한글품명과 영문품명에서 유사도 계산
-            korean_sim = self.calculate_similarity(query, korean_name)
-            english_sim = self.calculate_similarity(query, english_name)
+            korean_sim = bounded_similarity(korean_name, threshold)
+            english_sim = bounded_similarity(english_name, threshold)
             
             # 최고 유사도 사용
             max_similarity = max(korean_sim, english_sim)
             
-            if max_similarity > 0.1:  # 최소 임계값
+            if max_similarity > threshold:
+                if len(top_scores) < top_n:
+                    heapq.heappush(top_scores, max_similarity)
+                else:
+                    heapq.heappushpop(top_scores, max_similarity)
                 candidates.append({
                     'hs_code': hs_code,
                     'korean_name': korean_name,
@@ -617,33 +1008,88 @@ class TariffTableSearcher:
         return candidates[:top_n]
 
 class ParallelHSSearcher:
-    def __init__(self, hs_manager):
+    # 경로 1의 후보별 해설서 조회 동시 실행 수
+    MANUAL_LOOKUP_WORKERS = 4
+
+    def __init__(self, hs_manager, path_timeout=None):
         self.hs_manager = hs_manager
         self.tariff_searcher = TariffTableSearcher()
+        self.path_timeout = PARALLEL_PATH_TIMEOUT if path_timeout is None else path_timeout
     
-    def parallel_search(self, query, logger, ui_container=None):
-        """병렬적 HS코드 검색"""
-        
-        # 경로 1: 관세율표 → 해설서 (2단계)
+    def parallel_search(self, query, logger, prefetch=None):
+        """
+        병렬적 HS코드 검색 (prefetch: 관세율표 후보를 미리 검색한 QueryPrefetch)
+        - 경로 1(관세율표 → 해설서)과 경로 2(해설서 직접 검색)를 동시에 실행
+        - 경로별 제한 시간(path_timeout)이 지나면 기다리지 않고 종합
+          (경로 1은 그때까지 조회된 후보, 경로 2는 결과 없음)
+        """
+        from concurrent.futures import ThreadPoolExecutor, wait
+        
+        def path1():
+            with span('retrieval.tariff_to_manual') as path_span:
+                results = self.tariff_to_manual_search(query, logger, prefetch, deadline, path1_partial, path1_lock)
+                path_span.set_attribute('results', len(results))
+            return results
+        
+        def path2():
+            with span('retrieval.direct_manual') as path_span:
+                results = self.direct_manual_search(query, logger)
+                path_span.set_attribute('results', len(results))
+            return results
+        
+        deadline = time.time() + self.path_timeout
+        # 경로 1 스레드가 제한 시간 직후에도 후보를 추가할 수 있으므로 path1_lock을 잡고 읽고 씀
+        path1_partial, path1_lock = {}, threading.Lock()
         logger.log_actual("SEARCH", "Path 1: Tariff Table → Manual search starting...")
-        path1_results = self.tariff_to_manual_search(query, logger)
-        
-        # 경로 2: 해설서 직접 검색 (기존 방법)
         logger.log_actual("SEARCH", "Path 2: Direct manual search starting...")
-        path2_results = self.direct_manual_search(query, logger)
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            path1_future = submit_with_context(executor, path1)
+            path2_future = submit_with_context(executor, path2)
+            wait([path1_future, path2_future], timeout=self.path_timeout)
+        finally:
+            # 제한 시간을 넘긴 경로는 백그라운드에서 끝나도록 두고 기다리지 않음
+            executor.shutdown(wait=False)
+        
+        if path1_future.done():
+            path1_results = path1_future.result()
+        else:
+            with path1_lock:
+                path1_results = [path1_partial[i] for i in sorted(path1_partial)]
+            logger.log_actual("ERROR", "Path 1 timed out", f"using {len(path1_results)} partial results after {self.path_timeout:.1f}s")
+        if path2_future.done():
+            path2_results = path2_future.result()
+        else:
+            path2_results = []
+            logger.log_actual("ERROR", "Path 2 timed out", f"no results after {self.path_timeout:.1f}s")
+        set_attributes(path1_timed_out=not path1_future.done(), path2_timed_out=not path2_future.done())
+        if not (path1_future.done() and path2_future.done()):
+            mark_partial_answer('parallel_path_timeout')
         
         # 결과 종합
         logger.log_actual("AI", "Consolidating parallel search results...")
-        final_results = self.consolidate_results(path1_results, path2_results, logger)
+        with span('consolidation'):
+            final_results = self.consolidate_results(path1_results, path2_results, logger)
         
         return final_results
     
-    def tariff_to_manual_search(self, query, logger):
-        """경로 1: 관세율표 → 해설서"""
+    def tariff_to_manual_search(self, query, logger, prefetch=None, deadline=None, partial=None, partial_lock=None):
+        """
+        경로 1: 관세율표 → 해설서
+        - 후보별 해설서 조회는 스레드 풀에서 동시에 실행 (해설서 구간 색인은 프로세스 공유)
+        - deadline(time.time() 기준)이 지나면 그때까지 조회된 후보만 반환
+        - partial: 조회된 후보를 {후보 순번: 결과}로 채울 딕셔너리 (경로 전체가 제한 시간을 넘기면 호출한 쪽에서 사용)
+        - partial_lock: partial을 읽고 쓸 때 잡는 Lock (호출한 쪽이 다른 스레드에서 partial을 읽을 때 전달)
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
+        partial = {} if partial is None else partial
+        partial_lock = threading.Lock() if partial_lock is None else partial_lock
         # 1단계: 관세율표에서 HS코드 후보 선정
-        tariff_start = time.time()
-        hs_candidates = self.tariff_searcher.search_by_tariff_table(query, top_n=15)
-        tariff_time = time.time() - tariff_start
+        with span('retrieval.tariff_table') as tariff_span:
+            hs_candidates = prefetched(prefetch, 'tariff_candidates',
+                                       lambda: self.tariff_searcher.search_by_tariff_table(query, top_n=15))
+            tariff_span.set_attribute('candidates', len(hs_candidates))
+        tariff_time = tariff_span.duration
         
         logger.log_actual("DATA", f"Tariff table search completed", 
                          f"{len(hs_candidates)} candidates in {tariff_time:.2f}s")
@@ -656,22 +1102,36 @@ class ParallelHSSearcher:
         logger.log_actual("INFO", f"Top HS candidates from tariff", 
                          f"{', '.join(candidate_codes[:5])}...")
         
-        # 2단계: 해당 HS코드들을 해설서에서 검색
+        # 2단계: 해당 HS코드들을 해설서에서 검색 (후보별 동시 조회)
         manual_start = time.time()
-        manual_results = []
-        
-        for candidate in hs_candidates[:10]:
-            hs_code = candidate['hs_code']
-            # 해설서에서 해당 HS코드 관련 내용 검색
-            manual_content = self.search_manual_by_hs_code(hs_code, query)
-            if manual_content:
-                manual_results.append({
-                    'hs_code': hs_code,
-                    'tariff_similarity': candidate['similarity'],
-                    'tariff_name': candidate['korean_name'],
-                    'manual_content': manual_content,
-                    'source': 'tariff_to_manual'
-                })
+        candidates = hs_candidates[:10]
+        executor = ThreadPoolExecutor(max_workers=self.MANUAL_LOOKUP_WORKERS)
+        futures = {submit_with_context(executor, self.search_manual_by_hs_code, candidate['hs_code'], query): i
+                   for i, candidate in enumerate(candidates)}
+        timeout = max(0.0, deadline - time.time()) if deadline is not None else None
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                i = futures[future]
+                manual_content = future.result()
+                if manual_content:
+                    result = {
+                        'hs_code': candidates[i]['hs_code'],
+                        'tariff_similarity': candidates[i]['similarity'],
+                        'tariff_name': candidates[i]['korean_name'],
+                        'manual_content': manual_content,
+                        'source': 'tariff_to_manual'
+                    }
+                    with partial_lock:
+                        partial[i] = result
+        except FutureTimeoutError:
+            logger.log_actual("ERROR", "Manual lookup for candidates timed out",
+                              f"{sum(future.done() for future in futures)}/{len(candidates)} candidates looked up")
+            mark_partial_answer('manual_lookup_timeout')
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        # 후보 순서(관세율표 유사도 순) 유지
+        with partial_lock:
+            manual_results = [partial[i] for i in sorted(partial)]
         
         manual_time = time.time() - manual_start
         logger.log_actual("SUCCESS", f"Manual search for candidates completed", 
@@ -679,23 +1139,20 @@ class ParallelHSSearcher:
         
         return manual_results
     
+    @cached_retrieval('search_manual_by_hs_code', lambda self, hs_code, query: (hs_code, manual_version()))
     def search_manual_by_hs_code(self, hs_code, query):
         """특정 HS코드에 대한 해설서 내용 검색"""
         try:
-            explanation, type_explanation, number_explanation = lookup_hscode(hs_code, 'knowledge/grouped_11_end.json')
-            
             content = ""
-            if explanation and explanation.get('text'):
-                content += f"부 해설: {explanation['text']}\n"
-            if type_explanation and type_explanation.get('text'):
-                content += f"류 해설: {type_explanation['text']}\n"
-            if number_explanation and number_explanation.get('text'):
-                content += f"호 해설: {number_explanation['text']}\n"
+            for label, text in lookup_hs_sections(hs_code):
+                content += f"{label}: {text}\n"
                 
             return content if content else None
         except:
             return None
     
+    @cached_retrieval('direct_manual_search', lambda self, query, logger:
+                      (normalize_query(self.extract_keywords_from_query(query)), manual_version()))
     def direct_manual_search(self, query, logger):
         """경로 2: 해설서 직접 검색"""
         manual_start = time.time()
@@ -703,35 +1160,39 @@ class ParallelHSSearcher:
         # 해설서 데이터에서 직접 검색
         direct_results = []
         try:
-            with open('knowledge/grouped_11_end.json', 'r', encoding='utf-8') as f:
-                manual_data = json.load(f)
-            
             # 쿼리 키워드 추출
             query_keywords = self.extract_keywords_from_query(query)
             
+            db = get_knowledge_db()
+            if db is not None:
+                # 지식 DB의 FTS5 trigram 색인으로 검색 (점수 규칙은 아래 메모리 검색과 동일)
+                direct_results = [{
+                    'hs_codes': self.extract_hs_from_header(item.get('header2', '')),
+                    'content': item,
+                    'match_score': score,
+                    'text_content': item.get('text', ''),
+                    'source': 'direct_manual'
+                } for item, score in db.search_notes(query_keywords, 10)]
+                manual_data = []
+            else:
+                # 소문자 검색 텍스트는 프로세스 공유 (해설서가 바뀔 때만 다시 만듦)
+                manual_data = get_manual_search_texts()
+            
             # 해설서 텍스트에서 매칭되는 항목 찾기
-            for item in manual_data:
-                text_content = item.get('text', '')
-                header1 = item.get('header1', '')
-                header2 = item.get('header2', '')
-                
+            lowered_keywords = [keyword.lower() for keyword in query_keywords]
+            for item, full_text in manual_data:
                 # 텍스트 내용과 헤더에서 키워드 매칭
-                match_score = 0
-                full_text = f"{header1} {header2} {text_content}".lower()
-                
-                for keyword in query_keywords:
-                    if keyword.lower() in full_text:
-                        match_score += 1
+                match_score = sum(1 for keyword in lowered_keywords if keyword in full_text)
                 
                 if match_score > 0:
                     # HS코드 추출 (header2에서)
-                    hs_codes = self.extract_hs_from_header(header2)
+                    hs_codes = self.extract_hs_from_header(item.get('header2', ''))
                     
                     direct_results.append({
                         'hs_codes': hs_codes,
                         'content': item,
                         'match_score': match_score,
-                        'text_content': text_content,
+                        'text_content': item.get('text', ''),
                         'source': 'direct_manual'
                     })
             
@@ -830,7 +1291,8 @@ class ParallelHSSearcher:
                     result_details[hs_code] = {
                         'hs_code': hs_code,
                         'tariff_name': '',
-                        'manual_content': str(result['content']),
+                        # 검색된 페이지 그룹 전체 대신 해당 코드의 해설서 구간 사용
+                        'manual_content': self.search_manual_by_hs_code(hs_code, '') or str(result['content']),
                         'path1_score': 0,
                         'path2_score': score,
                         'sources': ['direct_manual']
@@ -881,143 +1343,99 @@ class ParallelHSSearcher:
         
         return context
 
-def handle_hs_manual_with_user_codes(user_input, context, hs_manager, logger, ui_container=None):
-    """사용자 제시 HS코드 기반 해설서 분석"""
-    import streamlit as st
-    
-    # UI 컨테이너가 제공된 경우 분석 과정 표시
-    if ui_container:
-        with ui_container:
-            st.info("🔍 **사용자 제시 HS코드 분석 시작**")
-            progress_bar = st.progress(0, text="HS코드 추출 중...")
-            analysis_container = st.container()
+def handle_hs_manual_with_user_codes(user_input, context, hs_manager, sink=None):
+    """사용자 제시 HS코드 기반 해설서 분석 (진행 상황은 sink로 전달)"""
+    sink = ensure_sink(sink)
+    sink.emit(StageStart('user_codes', "🔍 **사용자 제시 HS코드 분석 시작**", 0.0))
     
     # 1단계: 사용자 제시 HS코드 추출
-    logger.log_actual("INFO", "Extracting user-provided HS codes...")
-    extracted_codes = extract_hs_codes(user_input)
+    sink.emit(StageStart('extract_codes', "HS코드 추출 중...", 0.0))
+    sink.log_actual("INFO", "Extracting user-provided HS codes...")
+    candidates = validate_hs_codes(user_input)
+    rejected = [candidate['raw'] for candidate in candidates if not candidate['code']]
+    if rejected:
+        sink.log_actual("INFO", "Ignored numbers not in tariff table", ', '.join(rejected))
+    confidence = {}
+    for candidate in candidates:
+        if candidate['code'] and candidate['code'] not in confidence:
+            confidence[candidate['code']] = candidate['confidence']
+    extracted_codes = list(confidence)
     
     if not extracted_codes:
-        logger.log_actual("ERROR", "No HS codes found in user input")
-        if ui_container:
-            progress_bar.progress(1.0, text="분석 완료!")
-            st.error("❌ **HS코드를 찾을 수 없습니다**")
-            st.info("💡 **사용법**: '3923, 3924, 3926 중에서 플라스틱 용기를 분류해주세요' 형태로 질문하세요")
+        sink.log_actual("ERROR", "No HS codes found in user input")
+        sink.emit(StageEnd('extract_codes', "❌ **HS코드를 찾을 수 없습니다**\n\n"
+                           "💡 **사용법**: '3923, 3924, 3926 중에서 플라스틱 용기를 분류해주세요' 형태로 질문하세요",
+                           1.0, status='error'))
+        mark_partial_answer('error')
         return "HS코드를 찾을 수 없습니다. 분석할 HS코드를 포함하여 질문해주세요."
     
-    logger.log_actual("SUCCESS", f"Found {len(extracted_codes)} HS codes", f"{', '.join(extracted_codes)}")
-    
-    if ui_container:
-        progress_bar.progress(0.2, text=f"{len(extracted_codes)}개 HS코드 발견...")
-        with analysis_container:
-            st.success(f"✅ **{len(extracted_codes)}개 HS코드 발견**: {', '.join(extracted_codes)}")
+    sink.log_actual("SUCCESS", f"Found {len(extracted_codes)} HS codes",
+                    ', '.join(f"{code} ({confidence[code]:.1f})" for code in extracted_codes))
+    sink.emit(StageEnd('extract_codes', f"✅ **{len(extracted_codes)}개 HS코드 발견**: {', '.join(extracted_codes)}", 0.2))
     
     # 2단계: 각 HS코드별 품목분류표 정보 수집
-    logger.log_actual("INFO", "Collecting tariff table information...")
-    tariff_info = get_tariff_info_for_codes(extracted_codes)
-    
-    if ui_container:
-        progress_bar.progress(0.4, text="품목분류표 정보 수집 중...")
+    sink.emit(StageStart('tariff_info', "품목분류표 정보 수집 중...", 0.4))
+    sink.log_actual("INFO", "Collecting tariff table information...")
+    with span('retrieval.tariff_info', codes=len(extracted_codes)):
+        tariff_info = get_tariff_info_for_codes(extracted_codes)
     
     # 3단계: 각 HS코드별 해설서 정보 수집 및 요약
-    logger.log_actual("INFO", "Collecting and summarizing manual information...")
-    manual_info = get_manual_info_for_codes(extracted_codes, logger)
-    
-    if ui_container:
-        progress_bar.progress(0.6, text="해설서 정보 수집 및 요약 중...")
-        
-        # 수집된 정보 표시
-        with analysis_container:
-            st.markdown("### 📊 **HS코드별 상세 정보**")
-            
-            for code in extracted_codes:
-                st.markdown(f"#### 🔢 **HS코드: {code}**")
-                
-                col1, col2 = st.columns([1, 1])
-                with col1:
-                    if code in tariff_info:
-                        st.write(f"**📋 국문품명**: {tariff_info[code].get('korean_name', 'N/A')}")
-                        st.write(f"**📋 영문품명**: {tariff_info[code].get('english_name', 'N/A')}")
-                
-                with col2:
-                    if code in manual_info:
-                        st.write(f"**📚 해설서**: 수집 완료")
-                        if manual_info[code].get('summary_used'):
-                            st.write(f"**🤖 요약**: 적용됨")
-                
-                st.divider()
+    sink.emit(StageStart('manual_info', "해설서 정보 수집 및 요약 중...", 0.6))
+    sink.log_actual("INFO", "Collecting and summarizing manual information...")
+    with span('summarization', candidates=len(extracted_codes)):
+        manual_info = get_manual_info_for_codes(extracted_codes, sink)
+    
+    # 수집된 정보 전달
+    sink.emit(CandidateList('user_codes', [
+        {
+            'hs_code': code,
+            'confidence': confidence[code],
+            'korean_name': tariff_info.get(code, {}).get('korean_name'),
+            'english_name': tariff_info.get(code, {}).get('english_name'),
+            'manual_collected': code in manual_info,
+            'summary_used': manual_info.get(code, {}).get('summary_used', False),
+        }
+        for code in extracted_codes
+    ], user_input))
     
     # 4단계: 통칙 준비
-    logger.log_actual("INFO", "Preparing general rules...")
-    general_rules = prepare_general_rules()
-    
-    if ui_container:
-        progress_bar.progress(0.8, text="최종 AI 분석 준비 중...")
+    sink.log_actual("INFO", "Preparing general rules...")
+    with span('retrieval.general_rules'):
+        general_rules = prepare_general_rules(extracted_codes, user_input)
     
     # 5단계: 최종 AI 분석
-    logger.log_actual("AI", "Starting final AI analysis...")
+    sink.emit(StageStart('final_analysis', "최종 AI 분석 준비 중...", 0.8))
+    sink.log_actual("AI", "Starting final AI analysis...")
     final_answer = analyze_user_provided_codes(user_input, extracted_codes, tariff_info, manual_info, general_rules, context)
     
-    if ui_container:
-        progress_bar.progress(1.0, text="분석 완료!")
-        st.success("🧠 **AI 전문가 분석이 완료되었습니다**")
-        st.info("📋 **아래에서 최종 답변을 확인하세요**")
-    
-    logger.log_actual("SUCCESS", "User-provided codes analysis completed", f"{len(final_answer)} chars")
+    sink.log_actual("SUCCESS", "User-provided codes analysis completed", f"{len(final_answer)} chars")
+    sink.emit(StageEnd('user_codes', "🧠 **AI 전문가 분석이 완료되었습니다**", 1.0))
     return final_answer
 
-def handle_hs_manual_with_parallel_search(user_input, context, hs_manager, logger, ui_container=None):
-    """병렬 검색을 활용한 HS 해설서 분석"""
-    import streamlit as st
-    
-    # UI 컨테이너가 제공된 경우 분석 과정 표시
-    if ui_container:
-        with ui_container:
-            st.info("🔍 **HS 해설서 병렬 분석 시작**")
-            progress_bar = st.progress(0, text="병렬 검색 진행 중...")
-            analysis_container = st.container()
+def handle_hs_manual_with_parallel_search(user_input, context, hs_manager, sink=None, prefetch=None):
+    """병렬 검색을 활용한 HS 해설서 분석 (진행 상황은 sink로 전달, prefetch: AI자동분류 중 미리 검색한 결과)"""
+    sink = ensure_sink(sink)
+    sink.emit(StageStart('parallel_manual', "🔍 **HS 해설서 병렬 분석 시작**", 0.0))
     
     # 병렬 검색 수행
+    sink.emit(StageStart('parallel_search', "병렬 검색 진행 중...", 0.0))
     parallel_searcher = ParallelHSSearcher(hs_manager)
-    search_results = parallel_searcher.parallel_search(user_input, logger, ui_container)
-    
-    # UI 업데이트 - 병렬 검색 결과 먼저 표시
-    if ui_container:
-        progress_bar.progress(0.6, text="병렬 검색 결과 분석 중...")
-        
-        # 1단계: 후보 코드 선정 과정 표시
-        with analysis_container:
-            st.success("✅ **병렬 검색 완료**")
-            st.markdown("### 🎯 **상위 HS코드 후보 선정**")
-            
-            for i, result in enumerate(search_results, 1):
-                confidence_color = "🟢" if result['confidence'] == 'HIGH' else "🟡"
-                st.markdown(f"{confidence_color} **후보 {i}: HS코드 {result['hs_code']}** (신뢰도: {result['confidence']})")
-                
-                col1, col2 = st.columns([1, 2])
-                with col1:
-                    st.write(f"**최종점수**: {result['final_score']:.3f}")
-                    st.write(f"**검색경로**: {', '.join(result['sources'])}")
-                with col2:
-                    if result['tariff_name']:
-                        st.write(f"**관세율표 품목명**: {result['tariff_name']}")
-                    if result['manual_content']:
-                        st.write(f"**📖 해설서 원문**: 발견됨 (요약 예정)")
-                
-                st.divider()
+    search_results = parallel_searcher.parallel_search(user_input, sink, prefetch)
     
-    # 결과를 컨텍스트로 변환
-    enhanced_context = parallel_searcher.create_enhanced_context(search_results)
+    # 1단계: 후보 코드 선정 결과 전달
+    sink.emit(StageEnd('parallel_search', progress=0.6))
+    sink.emit(CandidateList('search', [dict(result) for result in search_results], user_input))
     
     # 각 후보의 해설서 내용 요약 (5회 API 호출)
-    if ui_container:
-        progress_bar.progress(0.7, text="해설서 내용 요약 중...")
-    
-    logger.log_actual("AI", "Starting manual content summarization...")
-    summary_start = time.time()
-    
-    for i, result in enumerate(search_results):
-        if result['manual_content']:
-            summary_prompt = f"""다음 HS 해설서 내용을 1000자 이내로 핵심 내용만 요약해주세요:
+    sink.emit(StageStart('manual_summary', "해설서 내용 요약 중...", 0.7))
+    sink.log_actual("AI", "Starting manual content summarization...")
+    with span('summarization', candidates=len(search_results)) as summary_span:
+        for i, result in enumerate(search_results):
+            if result['manual_content'] and len(result['manual_content']) <= MANUAL_SUMMARY_CHARS:
+                # 코드별 구간만 가져오므로 짧은 내용은 요약 없이 그대로 사용
+                result['manual_summary'] = result['manual_content']
+            elif result['manual_content']:
+                summary_prompt = f"""다음 HS 해설서 내용을 1000자 이내로 핵심 내용만 요약해주세요:
 
 HS코드: {result['hs_code']}
 해설서 원문:
@@ -1031,68 +1449,27 @@ HS코드: {result['hs_code']}
 
 간결하고 정확하게 요약해주세요."""
             
-            try:
-                summary_response = client.models.generate_content(
-                    model="gemini-2.0-flash",
-                    contents=summary_prompt
-                )
-                result['manual_summary'] = clean_text(summary_response.text)
-                logger.log_actual("SUCCESS", f"HS코드 {result['hs_code']} 해설서 요약 완료", f"{len(result['manual_summary'])} chars")
-            except Exception as e:
-                logger.log_actual("ERROR", f"HS코드 {result['hs_code']} 요약 실패: {str(e)}")
-                result['manual_summary'] = result['manual_content'][:1000] + "..." if len(result['manual_content']) > 1000 else result['manual_content']
-        else:
-            result['manual_summary'] = ""
+                try:
+                    summary_response = call_gemini('parallel_summary', summary_prompt)
+                    result['manual_summary'] = clean_text(summary_response.text)
+                    sink.log_actual("SUCCESS", f"HS코드 {result['hs_code']} 해설서 요약 완료", f"{len(result['manual_summary'])} chars")
+                except Exception as e:
+                    sink.log_actual("ERROR", f"HS코드 {result['hs_code']} 요약 실패: {str(e)}")
+                    mark_partial_answer('summary_error')
+                    result['manual_summary'] = result['manual_content'][:1000] + "..." if len(result['manual_content']) > 1000 else result['manual_content']
+            else:
+                result['manual_summary'] = ""
     
-    summary_time = time.time() - summary_start
-    logger.log_actual("SUCCESS", f"Manual content summarization completed", f"{summary_time:.2f}s")
+    summary_time = summary_span.duration
+    sink.log_actual("SUCCESS", f"Manual content summarization completed", f"{summary_time:.2f}s")
 
-    # 2단계: 해설서 요약 완료 후 업데이트된 정보 표시
-    if ui_container:
-        with analysis_container:
-            st.success("✅ **해설서 내용 요약 완료**")
-            st.markdown("### 📚 **해설서 요약 결과**")
-            
-            for i, result in enumerate(search_results, 1):
-                confidence_color = "🟢" if result['confidence'] == 'HIGH' else "🟡"
-                st.markdown(f"{confidence_color} **후보 {i}: HS코드 {result['hs_code']}** (신뢰도: {result['confidence']})")
-                
-                col1, col2 = st.columns([1, 2])
-                with col1:
-                    st.write(f"**최종점수**: {result['final_score']:.3f}")
-                    st.write(f"**검색경로**: {', '.join(result['sources'])}")
-                with col2:
-                    if result['tariff_name']:
-                        st.write(f"**관세율표 품목명**: {result['tariff_name']}")
-                    if result.get('manual_summary'):
-                        st.write(f"**📖 해설서 요약**:")
-                        st.text(result['manual_summary'][:300] + "...")
-                    elif result['manual_content']:
-                        st.write(f"**📖 해설서**: 요약 실패 (원문 사용)")
-                
-                st.divider()
-        
-        progress_bar.progress(0.9, text="AI 전문가 분석 준비 중...")
+    # 2단계: 해설서 요약 완료 후 업데이트된 후보 정보 전달
+    sink.emit(CandidateList('summary', [dict(result) for result in search_results], user_input))
+    sink.emit(StageStart('final_analysis', "AI 전문가 분석 준비 중...", 0.9))
     
-    # HS 해설서 분석 결과를 세션 상태에 저장 (채팅 기록에서 보기 위해)
-    if ui_container:
-        import streamlit as st
-        if 'hs_manual_analysis_results' not in st.session_state:
-            st.session_state.hs_manual_analysis_results = []
-        
-        # 현재 분석 결과 저장
-        current_analysis = {
-            'timestamp': time.time(),
-            'search_results': search_results,
-            'query': user_input
-        }
-        st.session_state.hs_manual_analysis_results.append(current_analysis)
-        
-        # 최대 5개까지만 보관 (메모리 절약)
-        if len(st.session_state.hs_manual_analysis_results) > 5:
-            st.session_state.hs_manual_analysis_results.pop(0)
-    
-    logger.log_actual("INFO", f"Enhanced context prepared", f"{len(enhanced_context)} chars")
+    # 결과를 컨텍스트로 변환 (요약이 끝난 뒤에 만들어야 해설서 요약이 포함됨)
+    enhanced_context = parallel_searcher.create_enhanced_context(search_results)
+    sink.log_actual("INFO", f"Enhanced context prepared", f"{len(enhanced_context)} chars")
     
     # HS 해설서 분석 전용 컨텍스트
     manual_context = """당신은 HS 해설서 및 관세율표 전문 분석가입니다.
@@ -1149,28 +1526,377 @@ HS코드: {result['hs_code']}
 """
     
     # Gemini 처리
-    logger.log_actual("AI", "Processing with enhanced parallel search context...")
+    sink.log_actual("AI", "Processing with enhanced parallel search context...")
     ai_processing_start = time.time()
     
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt
-    )
+    response = call_gemini('parallel_final', prompt)
     
     ai_processing_time = time.time() - ai_processing_start
     final_answer = clean_text(response.text)
     
-    logger.log_actual("SUCCESS", "Gemini processing completed", 
+    sink.log_actual("SUCCESS", "Gemini processing completed", 
                      f"{ai_processing_time:.2f}s, input: {len(prompt)} chars, output: {len(final_answer)} chars")
     
-    # UI 최종 완료 표시
-    if ui_container:
-        progress_bar.progress(1.0, text="분석 완료!")
-        st.success("🧠 **AI 전문가 분석이 완료되었습니다**")
-        st.info("📋 **패널을 접고 아래에서 최종 답변을 확인하세요**")
+    # 최종 완료 알림
+    sink.emit(StageEnd('parallel_manual', "🧠 **AI 전문가 분석이 완료되었습니다**", 1.0))
     
     return final_answer
 
+class QueryPrefetch:
+    """
+    AI자동분류 모드 추측 실행 (질문 유형 분류 LLM 호출과 동시에 로컬 검색을 미리 수행)
+    - 국내 분류사례 그룹별 검색, 관세율표 후보 검색, HS 코드 추출은 분류 결과와 무관하므로 분류 중에 실행
+    - 선택된 처리 함수는 take()로 미리 계산된 결과를 가져가고, 가져가지 않은 작업은 finish()에서 버림
+      (시작 전 작업은 취소, 실행 중인 국내 검색은 그룹 사이에서 중단)
+    - 절약 시간: 가져간 작업마다 (작업 실행 시간 - take()에서 기다린 시간)
+    """
+    DOMESTIC_GROUPS = 5
+    TARIFF_TOP_N = 15
+
+    def __init__(self, user_input, hs_manager, workers=4):
+        self.user_input = user_input
+        self.hs_manager = hs_manager
+        self.workers = workers
+        self.futures = {}
+        self.used = {}
+        self._executor = None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    def tasks(self):
+        """{작업 이름: 계산 함수} (처리 함수에서 같은 이름으로 take)"""
+        tasks = {}
+        for i in range(self.DOMESTIC_GROUPS):
+            tasks[f'domestic_group{i}'] = (lambda i=i: self._domestic_group(i))
+        tasks['tariff_candidates'] = lambda: TariffTableSearcher().search_by_tariff_table(
+            self.user_input, top_n=self.TARIFF_TOP_N)
+        tasks['hs_codes'] = lambda: extract_hs_codes(self.user_input)
+        return tasks
+
+    def _domestic_group(self, i):
+        if self._cancelled.is_set():
+            return None
+        return self.hs_manager.get_domestic_context_group(self.user_input, i)
+
+    def _run(self, name, compute):
+        with span(f'prefetch.{name}') as task_span:
+            value = compute()
+        return value, task_span.duration
+
+    def start(self):
+        from concurrent.futures import ThreadPoolExecutor
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='prefetch')
+        self.futures = {name: submit_with_context(self._executor, self._run, name, compute)
+                        for name, compute in self.tasks().items()}
+        return self
+
+    def take(self, name, compute):
+        """
+        미리 계산된 결과 (작업이 없거나 실패/중단되었으면 compute() 실행)
+        """
+        with self._lock:
+            future = self.futures.pop(name, None)
+        if future is None:
+            return compute()
+        wait_start = time.time()
+        try:
+            value, duration = future.result()
+        except Exception as e:
+            print(f"Warning: prefetch {name} failed: {e}")
+            return compute()
+        if value is None:
+            return compute()
+        wait = time.time() - wait_start
+        self.used[name] = max(0.0, duration - wait)
+        set_attributes(prefetched=True)
+        return value
+
+    def finish(self):
+        """
+        가져가지 않은 작업 버리기
+        Returns:
+            {'used': {작업 이름: 절약 시간}, 'discarded': [작업 이름], 'saved': 총 절약 시간}
+        """
+        self._cancelled.set()
+        with self._lock:
+            discarded, self.futures = list(self.futures), {}
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        saved = sum(self.used.values())
+        for name in self.used:
+            TRACER.metrics.inc('hs_prefetch_total', 1, task=name.rstrip('0123456789'), result='used')
+        for name in discarded:
+            TRACER.metrics.inc('hs_prefetch_total', 1, task=name.rstrip('0123456789'), result='discarded')
+        TRACER.metrics.inc('hs_prefetch_saved_seconds_total', saved)
+        set_attributes(prefetch_used=len(self.used), prefetch_discarded=len(discarded), prefetch_saved=round(saved, 3))
+        return {'used': dict(self.used), 'discarded': discarded, 'saved': saved}
+
+
+def prefetched(prefetch, name, compute):
+    """prefetch(QueryPrefetch 또는 None)에 미리 계산된 결과가 있으면 사용, 없으면 compute()"""
+    return prefetch.take(name, compute) if prefetch is not None else compute()
+
+
+def describe_prefetch(stats):
+    """finish() 결과 → 로그 문자열"""
+    used = ', '.join(f"{name} {saved:.2f}s" for name, saved in stats['used'].items()) or '-'
+    return f"saved {stats['saved']:.2f}s (used: {used}; discarded: {len(stats['discarded'])})"
+
+
+# 최종 답변 캐시를 사용하는 질문 유형 (웹검색은 최신 정보가 필요하고, 해설서 원문은 LLM 호출이 없으므로 제외)
+ANSWER_CACHE_QTYPES = ('hs_classification', 'overseas_hs', 'hs_manual', 'hs_manual_codes')
+
+def answer_corpus_version(q_type, hs_manager):
+    """질문 유형의 답변이 의존하는 지식 데이터 버전 (바뀌면 캐시된 답변 무효화)"""
+    if q_type == 'hs_classification':
+        return hs_manager._corpus_version('domestic')
+    if q_type == 'overseas_hs':
+        return f"{hs_manager._corpus_version('overseas')}|terms:{file_version(TERM_DICT_JSON)}"
+    version = f"{manual_version()}|tariff:{TariffTableSearcher().version}"
+    if q_type == 'hs_manual_codes':
+        version += f"|rules:{file_version(GENERAL_RULES_JSON)}"
+    return version
+
+def answer_retrieval_signature(q_type, user_input, hs_manager):
+    """
+    유사 질문 판단용 로컬 검색 결과 집합 (검색 결과는 검색 캐시에 남아 이후 처리에서 재사용)
+    - 국내/해외: 상위 분류사례 ID, 해설서: 관세율표 후보 HS 코드
+    """
+    if q_type == 'hs_classification':
+        return {record_key(result['item']) for result in hs_manager.search_domestic(user_input, 10)}
+    if q_type == 'overseas_hs':
+        return {record_key(result['item']) for i in range(5) for result in hs_manager.search_overseas_group(user_input, i)}
+    return {candidate['hs_code'] for candidate in TariffTableSearcher().search_by_tariff_table(user_input, top_n=15)}
+
+def answer_with_cache(q_type, user_input, hs_manager, compute, sink=None, extra=None):
+    """
+    최종 답변 캐시를 거쳐 답변 생성 (answer_cache.py)
+    Args:
+        compute: 캐시에 없을 때 답변을 만드는 함수 (처리 함수 호출)
+        extra: 답변과 함께 저장할 값을 돌려주는 함수 (Streamlit 분석 과정 등, 캐시 적중 시 cached['extra'])
+    Returns:
+        (답변, cached) - cached: 캐시 적중 시 {'query', 'match', 'similarity', 'created_at', 'extra', ...}, 아니면 None
+    """
+    sink = ensure_sink(sink)
+    if q_type not in ANSWER_CACHE_QTYPES or not ANSWER_CACHE.enabled:
+        return compute(), None
+    reason = context_dependent(user_input)
+    if reason:
+        # 지시어가 가리키는 물품은 세션마다 다르므로 다른 세션과 답변을 공유하지 않음
+        ANSWER_CACHE.bypass(q_type)
+        set_attributes(answer_cache='bypass')
+        sink.log_actual("INFO", "Answer cache bypassed", reason)
+        return compute(), None
+    with span('answer_cache.lookup', q_type=q_type):
+        version = answer_corpus_version(q_type, hs_manager)
+        signature = answer_retrieval_signature(q_type, user_input, hs_manager) if ANSWER_CACHE.retrieval_similarity > 0 else None
+        cached = ANSWER_CACHE.lookup(q_type, user_input, version, signature)
+    set_attributes(answer_cache=f"hit_{cached['match']}" if cached else 'miss')
+    if cached is not None:
+        sink.log_actual("SUCCESS", "Answer cache hit", f"{cached['match']} ({cached['similarity']:.2f}): {cached['query']}")
+        return cached['answer'], cached
+    
+    partial = []
+    token = _partial_answer.set(partial)
+    try:
+        answer = compute()
+    finally:
+        _partial_answer.reset(token)
+    if partial:
+        # 제한 시간 등으로 일부 결과만 반영된 답변, 오류 안내는 저장하지 않음 (다음 질문은 다시 분석)
+        sink.log_actual("INFO", "Answer not cached", f"partial: {', '.join(partial)}")
+        return answer, None
+    ANSWER_CACHE.store(q_type, user_input, version, answer, signature, extra() if extra else None)
+    return answer, None
+
+
+def mark_partial_answer(reason):
+    """현재 답변이 일부 결과만으로 만들어졌거나 오류 안내임을 표시 (answer_with_cache가 캐시에 저장하지 않음)"""
+    partial = _partial_answer.get()
+    if partial is not None and reason not in partial:
+        partial.append(reason)
+    set_attributes(partial_answer=reason)
+
+
+def group_deadline(q_type):
+    """질문 유형별 Multi-Agent 그룹 분석 시간 예산 (초, 0이면 제한 없음)"""
+    return float(os.getenv(f'HS_GROUP_DEADLINE_{q_type.upper()}', GROUP_DEADLINE))
+
+
+def run_group_agents(agent_type, q_type, process_single_group, sink, groups=5, workers=3):
+    """
+    Multi-Agent 그룹 분석 병렬 실행 (요청당 시간 예산 적용)
+    - 예산(group_deadline(q_type))이 지나면 끝나지 않은 그룹은 기다리지 않음
+      (시작 전 그룹은 취소, 실행 중인 LLM 호출은 백그라운드에서 끝나고 결과는 버림)
+    - 끝난 그룹이 하나도 없으면 첫 그룹이 끝날 때까지는 기다림
+    - 실패한 그룹(LLM 호출/검색 오류)도 생략 그룹으로 처리 (모든 그룹이 실패했을 때만 첫 오류를 다시 발생)
+    - 생략 그룹이 있으면 mark_partial_answer로 표시 (최종 답변 캐시에 저장하지 않음)
+    - 예산 초과 횟수/생략 그룹 수/절약 시간은 hs_group_deadline_* 지표와 group_agents span 속성으로 기록
+      (절약 시간: 생략한 그룹 중 가장 늦게 끝난 시각 - 종합 시작 시각, 취소된 그룹은 0으로 보므로 최소값)
+    Args:
+        process_single_group: 그룹 번호 → (그룹 번호, 답변, 시작 시각, 처리 시간)
+    Returns:
+        ({그룹 번호: 답변}, 생략된 그룹 번호 목록(시간 초과 + 실패), 적용한 예산, 실패한 그룹 번호 목록)
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    budget = group_deadline(q_type)
+    deadline = time.time() + budget if budget > 0 else None
+    results, failed = {}, {}
+    with span('group_agents', groups=groups, workers=workers, deadline=budget) as group_span:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = {submit_with_context(executor, process_single_group, i): i for i in range(groups)}
+            pending = set(futures)
+            while pending:
+                remaining = deadline - time.time() if deadline is not None and results else None
+                if remaining is not None and remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        group_id, answer, start_time, processing_time = future.result()
+                    except Exception as e:
+                        # 실패한 그룹은 빼고 나머지 그룹 결과로 종합
+                        failed[futures[future]] = e
+                        sink.log_actual("ERROR", f"Group {futures[future] + 1} failed", str(e))
+                        continue
+                    results[group_id] = answer
+
+                    # 완료된 순서대로 그룹 결과 전달
+                    sink.emit(GroupResult(agent_type, group_id, answer, start_time.strftime('%H:%M:%S'),
+                                          processing_time, len(results), groups))
+        finally:
+            # 예산을 넘긴 그룹은 기다리지 않음 (시작 전 작업 취소)
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        timed_out = sorted(futures[future] for future in pending)
+        group_span.set_attributes(groups_completed=len(results), groups_omitted=len(timed_out),
+                                  groups_failed=len(failed))
+    if not results and failed:
+        raise next(iter(failed.values()))
+    TRACER.metrics.inc('hs_group_deadline_total', 1, q_type=q_type, result='cut' if timed_out else 'met')
+    if timed_out:
+        TRACER.metrics.inc('hs_group_deadline_omitted_total', len(timed_out), q_type=q_type)
+        sink.log_actual("ERROR", "Group deadline reached",
+                        f"groups {', '.join(str(i + 1) for i in timed_out)} omitted after {budget:.1f}s")
+        _record_deadline_savings(q_type, list(pending))
+        mark_partial_answer('group_deadline')
+    if failed:
+        TRACER.metrics.inc('hs_group_failed_total', len(failed), q_type=q_type)
+        mark_partial_answer('group_error')
+    return results, sorted(timed_out + list(failed)), budget, sorted(failed)
+
+
+def _record_deadline_savings(q_type, futures):
+    """생략한 그룹이 모두 끝나면 (가장 늦게 끝난 시각 - 현재 시각)을 절약 시간으로 기록"""
+    cut_at = time.time()
+    lock = threading.Lock()
+    state = {'left': len(futures), 'latest': cut_at}
+
+    def on_done(_future):
+        with lock:
+            state['left'] -= 1
+            state['latest'] = max(state['latest'], time.time())
+            if state['left']:
+                return
+        TRACER.metrics.inc('hs_group_deadline_saved_seconds_total', state['latest'] - cut_at, q_type=q_type)
+
+    for future in futures:
+        future.add_done_callback(on_done)
+
+
+def deadline_notice(omitted, budget, failed=(), total=5):
+    """그룹을 생략하고 종합한 답변 앞에 붙일 안내 문구 (시간 예산 초과 / 오류로 실패한 그룹)"""
+    def names(group_ids):
+        return ', '.join(f"그룹{i + 1}" for i in group_ids)
+
+    timed_out = [i for i in omitted if i not in failed]
+    reasons = []
+    if timed_out:
+        reasons.append(f"응답 시간 제한({budget:g}초)으로 {names(timed_out)}의 분석이 끝나기 전에")
+    if failed:
+        reasons.append(f"오류로 {names(failed)}의 분석 결과를 받지 못해")
+    return (f"> {'⏱️' if timed_out else '⚠️'} {total}개 그룹 중 {', '.join(reasons)} "
+            f"나머지 {total - len(omitted)}개 그룹 결과로 종합했습니다. 해당 그룹의 분류사례는 검토되지 않았습니다.\n\n")
+
+
+def call_group_agent(prompt, relevant):
+    """
+    그룹 에이전트 LLM 호출 (HS_GROUP_STRUCTURED이면 JSON 구조화 출력, group_merge.py)
+    Args:
+        relevant: 그룹에 제공한 관련 데이터 (인용한 reference_id 확인용)
+    Returns:
+        (화면 표시용 답변, 구조화 결과 또는 None, 제공한 사례 {reference_id: {'hs_code', 'name'}})
+    """
+    if not structured_enabled():
+        return clean_text(call_gemini('group_agent', prompt).text), None, {}
+    from google.genai import types
+    config = types.GenerateContentConfig(response_mime_type='application/json', response_schema=GROUP_OUTPUT_SCHEMA)
+    references = context_references(relevant)
+    response = call_gemini('group_agent', prompt + GROUP_OUTPUT_INSTRUCTION, config)
+    output = parse_group_output(response.text, references)
+    set_attributes(structured=output is not None)
+    if output is None:
+        return clean_text(response.text), None, references
+    return format_group_output(output), output, references
+
+
+def synthesize_group_answers(expert_context, label, q_type, user_input, results, outputs, references, omitted, sink):
+    """
+    그룹 결과를 종합하여 최종 답변 생성
+    - 구조화 출력: 로컬 투표 병합 → 그룹 결과가 일치하고 그 코드가 관세율표에 있으면(exact/prefix) 고정 템플릿 답변
+      (Head Agent 호출 없음), 아니면 투표 결과와 그룹별 후보/근거 사례 요약만 Head Agent에 전달
+    - 자유 형식 답변(HS_GROUP_STRUCTURED=0): 그룹 답변을 이어 붙여 Head Agent에 전달
+    Args:
+        results: {그룹 번호: 화면 표시용 답변} (제한 시간 안에 성공한 그룹)
+        outputs: {그룹 번호: 구조화 결과 또는 None}
+        references: {그룹 번호: 제공한 사례}
+    """
+    group_ids = sorted(results)
+    if structured_enabled():
+        structured = {i: outputs.get(i) for i in group_ids}
+        with span('group_merge', groups=len(group_ids)) as merge_span:
+            merged = merge_group_outputs(structured)
+            merge_span.set_attributes(agreed=merged['agreed'], votes=len(merged['votes']), voters=merged['voters'],
+                                      unstructured=len(merged['unstructured']))
+            if merged['agreed']:
+                # LLM이 낸 코드는 관세율표에 있는 번호(또는 그 앞부분)일 때만 그대로 답변에 사용
+                code = agreed_code(merged)
+                match = tariff_code_match(code)
+                merge_span.set_attribute('agreed_code_match', match)
+        if merged['agreed']:
+            if match in ('exact', 'prefix'):
+                TRACER.metrics.inc('hs_group_merge_total', 1, q_type=q_type, result='agreed')
+                sink.log_actual("SUCCESS", "Group agents agreed",
+                                f"{code} from {merged['voters']} groups, head agent skipped")
+                cases = {ref: case for i in group_ids for ref, case in references.get(i, {}).items()}
+                return agreed_answer(merged, cases)
+            TRACER.metrics.inc('hs_group_merge_total', 1, q_type=q_type, result='unvalidated')
+            sink.log_actual("INFO", "Agreed HS code not validated",
+                            f"{code} ({match}), sending compact summary to head agent")
+        else:
+            TRACER.metrics.inc('hs_group_merge_total', 1, q_type=q_type, result='head_agent')
+            sink.log_actual("AI", "Group agents disagree", f"{len(merged['votes'])} candidate subheadings, sending compact summary to head agent")
+        group_section = "그룹별 후보 HS코드, 신뢰도, 근거 사례(reference_id)를 요약했습니다.\n\n" + \
+            compact_summary(structured, merged, results) + "\n\n"
+    else:
+        group_section = "".join(f"[그룹{i+1} 답변]\n{results[i]}\n\n" for i in group_ids)
+
+    sink.emit(StageStart('head_agent', "Head AI 최종 분석 중...", 1.0))
+
+    # Head Agent가 그룹별 결과를 취합하여 최종 답변 생성
+    head_prompt = f"{expert_context}\n\n아래는 {label} 데이터 5개 그룹별 분석 결과입니다. 각 그룹의 답변을 종합하여 최종 전문가 답변을 작성하세요.\n\n"
+    if omitted:
+        head_prompt += f"(그룹{', 그룹'.join(str(i + 1) for i in omitted)}은 응답 시간 제한 또는 오류로 분석 결과가 없습니다. 해당 그룹의 사례는 검토되지 않았다는 점을 답변에 밝히세요.)\n\n"
+    head_prompt += group_section
+    head_prompt += f"\n사용자: {user_input}\n"
+    with span('head_agent', prompt_chars=len(head_prompt), groups=len(group_ids)):
+        head_response = call_gemini('head_agent', head_prompt)
+    
+    sink.emit(StageEnd('head_agent'))
+    return clean_text(head_response.text)
+
 # 질문 유형 분류 함수 (LLM 기반)
 def classify_question(user_input):
     """
@@ -1193,10 +1919,7 @@ def classify_question(user_input):
 아래 사용자 질문을 읽고, 반드시 위 다섯 가지 중 하나의 유형만 한글이 아닌 소문자 영문으로 답변하세요.
 질문: """ + user_input + """\n답변:"""
 
-    response = client.models.generate_content(
-        model="gemini-2.0-flash", # 또는 최신 모델로 변경 가능
-        contents=system_prompt,
-        )
+    response = call_gemini('classify', system_prompt)  # 모델은 model_router.py의 'classify' 정책
     answer = response.text.strip().lower()
     # 결과가 정확히 네 가지 중 하나인지 확인
     if answer in ["web_search", "hs_classification", "hs_manual", "overseas_hs", "hs_manual_raw"]:
@@ -1212,22 +1935,22 @@ def handle_web_search(user_input, context, hs_manager):
 사용자의 질문에 대해 최신 웹 정보를 검색하여 물품개요, 용도, 기술개발, 무역동향, 산업동향 등의 정보를 제공해주세요.
 국내 HS 분류 사례가 아닌 일반적인 시장 정보와 동향을 중심으로 답변해주세요."""
     
+    from google.genai import types
     grounding_tool = types.Tool(google_search=types.GoogleSearch())
     config = types.GenerateContentConfig(tools=[grounding_tool])
     
     prompt = f"{web_context}\n\n사용자: {user_input}\n"
     
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt,
-        config=config)
+    response = call_gemini('web_search', prompt, config)
     
     return clean_text(response.text)
 
-def handle_hs_classification_cases(user_input, context, hs_manager, ui_container=None):
-    """국내 HS 분류 사례 처리 (그룹별 Gemini + Head Agent)"""
-    import streamlit as st
+def handle_hs_classification_cases(user_input, context, hs_manager, sink=None, prefetch=None):
+    """
+    국내 HS 분류 사례 처리 (그룹별 Gemini 구조화 출력 + 투표 병합/Head Agent, prefetch: AI자동분류 중 미리 검색한 결과)
+    """
     from datetime import datetime
+    sink = ensure_sink(sink)
     
     # 국내 HS 분류사례 전용 컨텍스트
     domestic_context = """당신은 국내 관세청의 HS 품목분류 전문가입니다. 
@@ -1246,94 +1969,46 @@ def handle_hs_classification_cases(user_input, context, hs_manager, ui_container
 
 국내 관세청의 일관된 분류 기준을 우선시하여 답변해주세요."""
     
-    # UI 컨테이너가 제공된 경우 실시간 표시
-    if ui_container:
-        with ui_container:
-            st.info("🔍 **국내 HS 분류사례 분석 시작**")
-            progress_bar = st.progress(0, text="AI 그룹별 분석 진행 중...")
-            responses_container = st.container()
+    # 분석 시작 알림
+    sink.emit(StageStart('domestic_agents', "🔍 **국내 HS 분류사례 분석 시작**", 0.0))
     
-    # 병렬 처리용 함수
+    # 병렬 처리용 함수 (그룹별 구조화 결과와 제공한 사례는 outputs/references에 기록)
+    outputs, references = {}, {}
     def process_single_group(i):
-        relevant = hs_manager.get_domestic_context_group(user_input, i)
-        prompt = f"{domestic_context}\n\n관련 데이터 (국내 관세청, 그룹{i+1}):\n{relevant}\n\n사용자: {user_input}\n"
+        with span('group_agent', group_id=i, agent_type='domestic'):
+            with span('retrieval', group_id=i, corpus='domestic') as retrieval_span:
+                relevant = prefetched(prefetch, f'domestic_group{i}',
+                                      lambda: hs_manager.get_domestic_context_group(user_input, i))
+                retrieval_span.set_attribute('context_chars', len(relevant))
+            prompt = f"{domestic_context}\n\n관련 데이터 (국내 관세청, 그룹{i+1}):\n{relevant}\n\n사용자: {user_input}\n"
         
-        start_time = datetime.now()
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
-        end_time = datetime.now()
-        processing_time = (end_time - start_time).total_seconds()
+            start_time = datetime.now()
+            answer, outputs[i], references[i] = call_group_agent(prompt, relevant)
+            end_time = datetime.now()
+            processing_time = (end_time - start_time).total_seconds()
         
-        answer = clean_text(response.text)
-        return i, answer, start_time, processing_time
+            return i, answer, start_time, processing_time
     
-    # 5개 그룹 병렬 처리 (max_workers=3)
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    
-    if ui_container:
-        progress_bar.progress(0, text="병렬 AI 분석 시작...")
-    
-    results = {}
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        futures = [executor.submit(process_single_group, i) for i in range(5)]
-        
-        for future in as_completed(futures):
-            group_id, answer, start_time, processing_time = future.result()
-            results[group_id] = answer
-            
-            # session_state에 결과 저장
-            if ui_container:
-                analysis_result = {
-                    'type': 'domestic',
-                    'group_id': group_id,
-                    'answer': answer,
-                    'start_time': start_time.strftime('%H:%M:%S'),
-                    'processing_time': processing_time
-                }
-                st.session_state.ai_analysis_results.append(analysis_result)
-                
-                # 실시간 UI 업데이트 (완료된 순서대로)
-                with responses_container:
-                    st.success(f"🤖 **그룹 {group_id+1} AI 분석 완료** ({processing_time:.1f}초)")
-                    with st.container():
-                        st.write(f"⏰ {start_time.strftime('%H:%M:%S')}")
-                        st.markdown(f"**분석 결과:**")
-                        st.info(answer)
-                        st.divider()
-                
-                progress_bar.progress(len(results)/5, text=f"완료: {len(results)}/5 그룹")
+    # 5개 그룹 병렬 처리 (max_workers=3, 요청당 시간 예산이 지나면 끝난 그룹만으로 종합)
+    sink.emit(StageStart('group_agents', "병렬 AI 분석 시작...", 0.0))
+    results, omitted, budget, failed = run_group_agents('domestic', 'hs_classification', process_single_group, sink)
     
-    # 순서대로 정렬
-    group_answers = [results[i] for i in range(5)]
+    sink.emit(StageEnd('group_agents'))
 
-    if ui_container:
-        progress_bar.progress(1.0, text="Head AI 최종 분석 중...")
-        st.info("🧠 **Head AI가 모든 분석을 종합하는 중...**")
-
-    # Head Agent가 5개 부분 답변을 취합하여 최종 답변 생성
-    head_prompt = f"{domestic_context}\n\n아래는 국내 HS 분류 사례 데이터 5개 그룹별 분석 결과입니다. 각 그룹의 답변을 종합하여 최종 전문가 답변을 작성하세요.\n\n"
-    for idx, ans in enumerate(group_answers):
-        head_prompt += f"[그룹{idx+1} 답변]\n{ans}\n\n"
-    head_prompt += f"\n사용자: {user_input}\n"
-    head_response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=head_prompt
-    )
+    # 그룹 결과 종합 (일치하면 고정 템플릿, 아니면 Head Agent)
+    answer = synthesize_group_answers(domestic_context, '국내 HS 분류 사례', 'hs_classification', user_input, results, outputs, references,
+                                      omitted, sink)
+    sink.emit(StageEnd('domestic_agents', "✅ **모든 AI 분석이 완료되었습니다**", 1.0))
     
-    if ui_container:
-        progress_bar.progress(1.0, text="분석 완료!")
-        st.success("✅ **모든 AI 분석이 완료되었습니다**")
-        st.info("📋 **패널을 접고 아래에서 최종 답변을 확인하세요**")
-    
-    return clean_text(head_response.text)
+    if omitted:
+        return deadline_notice(omitted, budget, failed) + answer
+    return answer
 
 
-def handle_overseas_hs(user_input, context, hs_manager, ui_container=None):
-    """해외 HS 분류 사례 처리 (그룹별 Gemini + Head Agent)"""
-    import streamlit as st
+def handle_overseas_hs(user_input, context, hs_manager, sink=None):
+    """해외 HS 분류 사례 처리 (그룹별 Gemini 구조화 출력 + 투표 병합/Head Agent)"""
     from datetime import datetime
+    sink = ensure_sink(sink)
     
     # 해외 HS 분류사례 전용 컨텍스트
     overseas_context = """당신은 국제 HS 품목분류 전문가입니다.
@@ -1352,85 +2027,36 @@ def handle_overseas_hs(user_input, context, hs_manager, ui_container=None):
 
 글로벌 무역 관점에서 포괄적으로 분석해주세요."""
     
-    # UI 컨테이너가 제공된 경우 실시간 표시
-    if ui_container:
-        with ui_container:
-            st.info("🌍 **해외 HS 분류사례 분석 시작**")
-            progress_bar = st.progress(0, text="AI 그룹별 분석 진행 중...")
-            responses_container = st.container()
+    # 분석 시작 알림
+    sink.emit(StageStart('overseas_agents', "🌍 **해외 HS 분류사례 분석 시작**", 0.0))
     
-    # 병렬 처리용 함수
+    # 병렬 처리용 함수 (그룹별 구조화 결과와 제공한 사례는 outputs/references에 기록)
+    outputs, references = {}, {}
     def process_single_group(i):
-        relevant = hs_manager.get_overseas_context_group(user_input, i)
-        prompt = f"{overseas_context}\n\n관련 데이터 (해외 관세청, 그룹{i+1}):\n{relevant}\n\n사용자: {user_input}\n"
+        with span('group_agent', group_id=i, agent_type='overseas'):
+            with span('retrieval', group_id=i, corpus='overseas') as retrieval_span:
+                relevant = hs_manager.get_overseas_context_group(user_input, i)
+                retrieval_span.set_attribute('context_chars', len(relevant))
+            prompt = f"{overseas_context}\n\n관련 데이터 (해외 관세청, 그룹{i+1}):\n{relevant}\n\n사용자: {user_input}\n"
         
-        start_time = datetime.now()
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
-        end_time = datetime.now()
-        processing_time = (end_time - start_time).total_seconds()
+            start_time = datetime.now()
+            answer, outputs[i], references[i] = call_group_agent(prompt, relevant)
+            end_time = datetime.now()
+            processing_time = (end_time - start_time).total_seconds()
         
-        answer = clean_text(response.text)
-        return i, answer, start_time, processing_time
+            return i, answer, start_time, processing_time
     
-    # 5개 그룹 병렬 처리 (max_workers=3)
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    
-    if ui_container:
-        progress_bar.progress(0, text="병렬 AI 분석 시작...")
-    
-    results = {}
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        futures = [executor.submit(process_single_group, i) for i in range(5)]
-        
-        for future in as_completed(futures):
-            group_id, answer, start_time, processing_time = future.result()
-            results[group_id] = answer
-            
-            # session_state에 결과 저장
-            if ui_container:
-                analysis_result = {
-                    'type': 'overseas',
-                    'group_id': group_id,
-                    'answer': answer,
-                    'start_time': start_time.strftime('%H:%M:%S'),
-                    'processing_time': processing_time
-                }
-                st.session_state.ai_analysis_results.append(analysis_result)
-                
-                # 실시간 UI 업데이트 (완료된 순서대로)
-                with responses_container:
-                    st.success(f"🌐 **그룹 {group_id+1} AI 분석 완료** ({processing_time:.1f}초)")
-                    with st.container():
-                        st.write(f"⏰ {start_time.strftime('%H:%M:%S')}")
-                        st.markdown(f"**분석 결과:**")
-                        st.info(answer)
-                        st.divider()
-                
-                progress_bar.progress(len(results)/5, text=f"완료: {len(results)}/5 그룹")
+    # 5개 그룹 병렬 처리 (max_workers=3, 요청당 시간 예산이 지나면 끝난 그룹만으로 종합)
+    sink.emit(StageStart('group_agents', "병렬 AI 분석 시작...", 0.0))
+    results, omitted, budget, failed = run_group_agents('overseas', 'overseas_hs', process_single_group, sink)
     
-    # 순서대로 정렬
-    group_answers = [results[i] for i in range(5)]
+    sink.emit(StageEnd('group_agents'))
 
-    if ui_container:
-        progress_bar.progress(1.0, text="Head AI 최종 분석 중...")
-        st.info("🧠 **Head AI가 모든 분석을 종합하는 중...**")
-
-    # Head Agent가 5개 부분 답변을 취합하여 최종 답변 생성
-    head_prompt = f"{overseas_context}\n\n아래는 해외 HS 분류 사례 데이터 5개 그룹별 분석 결과입니다. 각 그룹의 답변을 종합하여 최종 전문가 답변을 작성하세요.\n\n"
-    for idx, ans in enumerate(group_answers):
-        head_prompt += f"[그룹{idx+1} 답변]\n{ans}\n\n"
-    head_prompt += f"\n사용자: {user_input}\n"
-    head_response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=head_prompt
-    )
-    
-    if ui_container:
-        progress_bar.progress(1.0, text="분석 완료!")
-        st.success("✅ **모든 AI 분석이 완료되었습니다**")
-        st.info("📋 **패널을 접고 아래에서 최종 답변을 확인하세요**")
+    # 그룹 결과 종합 (일치하면 고정 템플릿, 아니면 Head Agent)
+    answer = synthesize_group_answers(overseas_context, '해외 HS 분류 사례', 'overseas_hs', user_input, results, outputs, references,
+                                      omitted, sink)
+    sink.emit(StageEnd('overseas_agents', "✅ **모든 AI 분석이 완료되었습니다**", 1.0))
     
-    return clean_text(head_response.text)
\ No newline at end of file
+    if omitted:
+        return deadline_notice(omitted, budget, failed) + answer
+    return answer
\ No newline at end of file
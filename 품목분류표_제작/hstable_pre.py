@@ -53,6 +53,43 @@ def step6_export_json(df, path):
     df_json.to_json(path, orient='records', force_ascii=False, indent=4)
     print(f"  완료: '{path}'에 저장됨 ({len(df_json)}행)")
 
+def step7_export_npz(df, path):
+    # 런타임 조회용 열 단위 배열 파일 (tariff_store.py에서 로드)
+    # - codes: 10자리로 오른쪽 0 채운 정수, digits: 원래 자릿수 → (codes, digits) 순으로 정렬
+    # - 품명은 중복 제거 후 UTF-8 바이트 하나로 이어 붙이고 (strings_blob, strings_offsets) 행마다 번호만 저장
+    # - rates: 관세율구분별 관세율 (없으면 NaN)
+    import numpy as np
+    print("▶ Step 7: 관세율표 배열(.npz) 저장 시작")
+    code_str = df['품목번호'].astype(str).str.replace(r'\D', '', regex=True)
+    df = df[(code_str.str.len() > 0) & (code_str.str.len() <= 10)]
+    code_str = code_str[df.index]
+    digits = code_str.str.len().to_numpy(dtype=np.uint8)
+    codes = code_str.str.ljust(10, '0').astype('int64').to_numpy()
+    order = np.lexsort((digits, codes))
+
+    korean = df['한글품명'].fillna('').astype(str).to_numpy()[order]
+    english = df['영문품명'].fillna('').astype(str).to_numpy()[order]
+    strings = pd.Index(pd.unique(np.concatenate([korean, english])))
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+
+    rate_names = [c for c in df.columns if c not in ('품목번호', '영문품명', '한글품명')]
+    rates = df[rate_names].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)[order]
+
+    np.savez(
+        path,
+        codes=codes[order],
+        digits=digits[order],
+        korean_idx=strings.get_indexer(korean).astype(np.int32),
+        english_idx=strings.get_indexer(english).astype(np.int32),
+        strings_blob=np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        strings_offsets=offsets,
+        rate_names=np.array(rate_names, dtype=str),
+        rates=rates,
+    )
+    print(f"  완료: '{path}'에 저장됨 ({len(order)}행, 관세율 {len(rate_names)}종, 품명 {len(strings)}개)")
+
 if __name__ == "__main__":
     a = step1_load_a("./품목분류표_제작/HS별 관세율표.csv")
     b = step2_load_b("./품목분류표_제작/품목번호별 관세율(2025).xlsx")
@@ -61,5 +98,6 @@ if __name__ == "__main__":
     print(merged.head(20))
     step5_export(merged, "./knowledge/hstable.csv")
     step6_export_json(merged, "./knowledge/hstable.json")
+    step7_export_npz(merged, "./knowledge/hstable.npz")
     print("🎉 전체 프로세스 완료")
 